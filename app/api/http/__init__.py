@@ -10,12 +10,24 @@ from fastapi.responses import JSONResponse
 from starlette import status
 
 from config.logger import init_logger
-from config.settings import APP_NAME, BUILD_VERSION, SHOULD_RESET_DATABASE
-from repository.psql.connection import psql_db
+from config.settings import (
+    ADMIN_PROFILER_ENABLED,
+    ADMIN_TOKEN,
+    APP_NAME,
+    BUILD_VERSION,
+    DATABASE_POOL_WARMUP_SIZE,
+    METRICS_ENABLED,
+    SHOULD_RESET_DATABASE,
+)
+from repository.psql.connection import Database
 
+from .dependencies.container import container
 from .error_handler import register_exception_handlers
+from .metrics import MetricsStore
 from .router import (
     health,
+    metrics,
+    role,
     user,
 )
 
@@ -34,12 +46,18 @@ init_logger()
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     try:
+        database = container.resolve(Database)
         if SHOULD_RESET_DATABASE:
-            await psql_db.drop_all_tables()
-        await psql_db.create_all_tables()
+            await database.drop_all_tables()
+        await database.create_all_tables()
+        await database.warmup(DATABASE_POOL_WARMUP_SIZE)
+        if METRICS_ENABLED:
+            container.resolve(MetricsStore).start()
         yield
     finally:
         logger.info('Application is shutting down...')
+        # shuts the password hasher down, disposes of the database pools and writes the last metrics snapshot
+        await container.aclose()
 
 
 _fastapi = FastAPI(
@@ -54,7 +72,17 @@ _fastapi = FastAPI(
 register_exception_handlers(_fastapi)
 
 _fastapi.include_router(health.router)
+if METRICS_ENABLED:
+    _fastapi.include_router(metrics.router)
+if ADMIN_PROFILER_ENABLED:
+    if not ADMIN_TOKEN:
+        raise RuntimeError('ADMIN_PROFILER_ENABLED requires an ADMIN_TOKEN')
+    # imported only when enabled: a disabled profiler adds no route and loads nothing
+    from .router import admin
+
+    _fastapi.include_router(admin.router)
 _fastapi.include_router(user.router)
+_fastapi.include_router(role.router)
 
 
 @_fastapi.get('/', include_in_schema=False)
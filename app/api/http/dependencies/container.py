@@ -0,0 +1,163 @@
+from collections.abc import Callable
+
+from api.http.metrics import HttpMetrics, Labels, MetricsStore
+from config.logger import dropped_log_records
+from config.settings import (
+    METRICS_FLUSH_INTERVAL_SECONDS,
+    METRICS_MULTIPROCESS_DIR,
+    PASSWORD_HASH_ALGORITHM,
+    PASSWORD_HASH_EXECUTOR,
+    PASSWORD_HASH_MAX_CONCURRENCY,
+    PASSWORD_HASH_MAX_WORKERS,
+    PASSWORD_HASH_PARAMS,
+    ROLE_CACHE_ENABLED,
+    ROLE_CACHE_MAX_SIZE,
+    ROLE_CACHE_NEGATIVE_TTL_SECONDS,
+    ROLE_CACHE_TTL_SECONDS,
+    USER_CACHE_ENABLED,
+    USER_CACHE_MAX_BYTES,
+    USER_CACHE_MAX_ENTRIES,
+    USER_CACHE_TTL_SECONDS,
+)
+from core.protocol.repository.role import RoleRepository
+from core.protocol.repository.user import UserRepository
+from core.utility.hasher import AsyncPasswordHasher
+from core.utility.user import get_password_hash_backend
+from repository.cache.role import CachedRoleRepository, RoleCache
+from repository.cache.user import CachedUserRepository, UserCache
+from repository.psql.connection import Database, psql_db, query_recorder
+from repository.psql.dao.role import PsqlRoleRepository
+from repository.psql.dao.user import PsqlUserRepository
+from repository.psql.instrumentation import QueryRecorder
+from repository.psql.pool import PoolStats
+from repository.psql.session import SessionProvider
+from service.user import UserService
+from utility.cache import AsyncTTLCache
+from utility.metrics import HistogramSnapshot
+from utility.scope import Container
+
+# The object graph of the HTTP API. Everything here is stateless across requests, or shared on purpose
+# (pools, caches, the hasher's executor, metrics), so it is all process-scoped; per-request database state lives
+# in the task-scoped units of work that SessionProvider registers.
+container = Container()
+
+
+def _role_repository() -> RoleRepository:
+    role_repository = PsqlRoleRepository(container.resolve(SessionProvider))
+    return (
+        CachedRoleRepository(role_repository, container.resolve(RoleCache)) if ROLE_CACHE_ENABLED else role_repository
+    )
+
+
+def _user_repository() -> UserRepository:
+    user_repository = PsqlUserRepository(container.resolve(SessionProvider))
+    return (
+        CachedUserRepository(user_repository, container.resolve(UserCache)) if USER_CACHE_ENABLED else user_repository
+    )
+
+
+container.register(Database, lambda: psql_db, close=Database.dispose)
+container.register(SessionProvider, lambda: SessionProvider(container.resolve(Database), container))
+container.register(
+    AsyncPasswordHasher,
+    lambda: AsyncPasswordHasher(
+        executor_type=PASSWORD_HASH_EXECUTOR,
+        max_workers=PASSWORD_HASH_MAX_WORKERS,
+        max_concurrency=PASSWORD_HASH_MAX_CONCURRENCY,
+        backend=get_password_hash_backend(PASSWORD_HASH_ALGORITHM, **PASSWORD_HASH_PARAMS),
+    ),
+    close=AsyncPasswordHasher.shutdown,
+)
+container.register(
+    RoleCache,
+    lambda: AsyncTTLCache(
+        max_size=ROLE_CACHE_MAX_SIZE,
+        ttl=ROLE_CACHE_TTL_SECONDS,
+        negative_ttl=ROLE_CACHE_NEGATIVE_TTL_SECONDS,
+    ),
+)
+container.register(
+    UserCache,
+    lambda: UserCache(
+        max_entries=USER_CACHE_MAX_ENTRIES,
+        max_bytes=USER_CACHE_MAX_BYTES,
+        ttl=USER_CACHE_TTL_SECONDS,
+    ),
+)
+container.register(RoleRepository, _role_repository)
+container.register(UserRepository, _user_repository)
+container.register(
+    UserService,
+    lambda: UserService(
+        user_repository=container.resolve(UserRepository),
+        role_repository=container.resolve(RoleRepository),
+        password_hasher=container.resolve(AsyncPasswordHasher),
+    ),
+)
+container.register(QueryRecorder, lambda: query_recorder)
+
+
+def _connection_hold_seconds() -> dict[Labels, HistogramSnapshot]:
+    return {(): container.resolve(SessionProvider).hold_stats()}
+
+
+def _pool_stats() -> dict[Labels, PoolStats]:
+    return {(('pool', name),): stats for name, stats in container.resolve(Database).pool_stats_by_name().items()}
+
+
+def _pool_gauge(name: str) -> Callable[[], dict[Labels, float]]:
+    return lambda: {labels: getattr(stats, name) for labels, stats in _pool_stats().items()}
+
+
+def _pool_wait_seconds() -> dict[Labels, HistogramSnapshot]:
+    return {labels: stats.wait_seconds for labels, stats in _pool_stats().items() if stats.wait_seconds is not None}
+
+
+def _role_cache_counter(name: str) -> Callable[[], int]:
+    return lambda: getattr(container.resolve(RoleCache).stats(), name)
+
+
+def _role_cache_entries() -> dict[Labels, float]:
+    return {(): container.resolve(RoleCache).stats().size}
+
+
+def _password_hash_gauge(name: str) -> Callable[[], dict[Labels, float]]:
+    return lambda: {(): getattr(container.resolve(AsyncPasswordHasher), name)}
+
+
+def _http_metrics() -> HttpMetrics:
+    counters = {'log_records_dropped_total': dropped_log_records}
+    gauges = {
+        'db_pool_size': _pool_gauge('size'),
+        'db_pool_checked_in': _pool_gauge('checked_in'),
+        'db_pool_checked_out': _pool_gauge('checked_out'),
+        'db_pool_overflow': _pool_gauge('overflow'),
+        'password_hash_queue_depth': _password_hash_gauge('queue_depth'),
+        'password_hash_in_flight': _password_hash_gauge('in_flight'),
+    }
+    if ROLE_CACHE_ENABLED:
+        for name in ('hits', 'misses', 'loads', 'evictions'):
+            counters[f'role_cache_{name}_total'] = _role_cache_counter(name)
+        gauges['role_cache_entries'] = _role_cache_entries
+
+    return HttpMetrics(
+        queries=container.resolve(QueryRecorder),
+        counters=counters,
+        gauges=gauges,
+        histograms={
+            'db_connection_hold_seconds': _connection_hold_seconds,
+            'db_pool_wait_seconds': _pool_wait_seconds,
+        },
+    )
+
+
+container.register(HttpMetrics, _http_metrics)
+container.register(
+    MetricsStore,
+    lambda: MetricsStore(
+        container.resolve(HttpMetrics),
+        directory=METRICS_MULTIPROCESS_DIR,
+        interval=METRICS_FLUSH_INTERVAL_SECONDS,
+    ),
+    close=MetricsStore.close,
+)
@@ -1,23 +1,32 @@
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
 from typing import Annotated
 
-from fastapi import Depends
+from fastapi import Depends, Request
 
-from repository.psql.connection import psql_db
-from repository.psql.dao.role import PsqlRoleRepository
-from repository.psql.dao.user import PsqlUserRepository
+from repository.psql.session import READ_ONLY
 from service.user import UserService
 
+from .container import container
 
-async def get_user_service() -> AsyncGenerator[UserService]:
-    async with psql_db.async_session_maker() as session:
-        try:
-            yield UserService(
-                user_repository=PsqlUserRepository(session),
-                role_repository=PsqlRoleRepository(session),
-            )
-        finally:
-            await session.close()
+_READ_ONLY_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+@asynccontextmanager
+async def user_service_scope(read_only: bool = False) -> AsyncIterator[UserService]:
+    """Run a request scope with the UserService, for work that outlives the request dependencies
+    (e.g. a streaming response body, which is sent after dependencies with yield have exited).
+
+    Reads of a `read_only` scope go to a read replica, if any are configured. Sessions are only opened,
+    and connections only checked out, once a repository first reaches the database."""
+    async with container.scope({READ_ONLY: read_only}):
+        yield container.resolve(UserService)
+
+
+async def get_user_service(request: Request) -> AsyncGenerator[UserService]:
+    # safe methods never write, so they can read from a replica without missing their own writes
+    async with user_service_scope(read_only=request.method in _READ_ONLY_METHODS) as user_service:
+        yield user_service
 
 
 UserServiceDependency = Annotated[UserService, Depends(get_user_service)]
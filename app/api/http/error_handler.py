@@ -1,3 +1,5 @@
+from typing import Any
+
 from fastapi import FastAPI, Request
 from fastapi.exceptions import HTTPException as FastAPI_HTTPException
 from fastapi.exceptions import RequestValidationError
@@ -8,62 +10,69 @@ from starlette.exceptions import HTTPException as Starlette_HTTPException
 from core.enum.error import ErrorCode
 from core.error import DuplicateError, NotFoundError
 
+from .metrics import ERROR_CODE_STATE_KEY
+
+
+def _error_response(
+    request: Request,
+    status_code: int,
+    message: Any,
+    code: ErrorCode,
+    headers: dict[str, str] | None = None,
+) -> JSONResponse:
+    # counted by the metrics middleware once the response is sent
+    setattr(request.state, ERROR_CODE_STATE_KEY, code)
+    return JSONResponse(status_code=status_code, content={'message': message, 'code': code}, headers=headers)
+
 
 def register_exception_handlers(app: FastAPI) -> None:
     @app.exception_handler(Exception)
-    async def default_exception_handler(_: Request, exception: Exception):
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={
-                'message': 'internal error',
-                'code': ErrorCode.CORE_1000_UNEXPECTED_ERROR,
-            },
+    async def default_exception_handler(request: Request, exception: Exception):
+        return _error_response(
+            request,
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+            'internal error',
+            ErrorCode.CORE_1000_UNEXPECTED_ERROR,
         )
 
     @app.exception_handler(NotImplementedError)
-    async def not_implemented_exception_handler(_: Request, exception: NotImplementedError):
-        return JSONResponse(
-            status_code=status.HTTP_501_NOT_IMPLEMENTED,
-            content={
-                'message': 'not implemented',
-                'code': ErrorCode.CORE_1001_NOT_IMPLEMENTED,
-            },
+    async def not_implemented_exception_handler(request: Request, exception: NotImplementedError):
+        return _error_response(
+            request,
+            status.HTTP_501_NOT_IMPLEMENTED,
+            'not implemented',
+            ErrorCode.CORE_1001_NOT_IMPLEMENTED,
         )
 
     @app.exception_handler(RequestValidationError)
-    async def validation_exception_handler(_: Request, exc: RequestValidationError) -> JSONResponse:
-        return JSONResponse(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            content={
-                'message': str(exc),
-                'code': ErrorCode.API_2000_REQUEST_VALIDATION_FAILED,
-            },
+    async def validation_exception_handler(request: Request, exc: RequestValidationError) -> JSONResponse:
+        return _error_response(
+            request,
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            str(exc),
+            ErrorCode.API_2000_REQUEST_VALIDATION_FAILED,
         )
 
     @app.exception_handler(FastAPI_HTTPException)
     @app.exception_handler(Starlette_HTTPException)
-    async def http_exception_handler(_: Request, exception: FastAPI_HTTPException | Starlette_HTTPException):
-        return JSONResponse(
-            status_code=exception.status_code,
-            content={
-                'message': exception.detail,
-                'code': ErrorCode.API_2001_API_SERVICE_ERROR,
-            },
+    async def http_exception_handler(request: Request, exception: FastAPI_HTTPException | Starlette_HTTPException):
+        return _error_response(
+            request,
+            exception.status_code,
+            exception.detail,
+            ErrorCode.API_2001_API_SERVICE_ERROR,
+            headers=exception.headers,
         )
 
     @app.exception_handler(NotFoundError)
-    async def not_found_error_handler(_: Request, exception: NotFoundError):
-        return JSONResponse(
-            status_code=status.HTTP_404_NOT_FOUND,
-            content={'message': str(exception), 'code': ErrorCode.CORE_1002_NOT_FOUND},
-        )
+    async def not_found_error_handler(request: Request, exception: NotFoundError):
+        return _error_response(request, status.HTTP_404_NOT_FOUND, str(exception), ErrorCode.CORE_1002_NOT_FOUND)
 
     @app.exception_handler(DuplicateError)
-    async def duplicate_error_handler(_: Request, exception: DuplicateError):
-        return JSONResponse(
-            status_code=status.HTTP_409_CONFLICT,
-            content={
-                'message': str(exception),
-                'code': ErrorCode.CORE_1003_DUPLICATE_ERROR,
-            },
+    async def duplicate_error_handler(request: Request, exception: DuplicateError):
+        return _error_response(
+            request,
+            status.HTTP_409_CONFLICT,
+            str(exception),
+            ErrorCode.CORE_1003_DUPLICATE_ERROR,
         )
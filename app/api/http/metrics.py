@@ -0,0 +1,461 @@
+import asyncio
+import logging
+import marshal
+import os
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import perf_counter
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.enum.error import ErrorCode
+from repository.psql.instrumentation import QueryRecorder, QueryStats
+from utility.metrics import LATENCY_BUCKETS_SECONDS, Histogram, HistogramSnapshot
+
+logger = logging.getLogger(__name__)
+
+# requests no route matched share one label, so that arbitrary paths never become label values
+UNMATCHED_ROUTE = '<unmatched>'
+
+# `request.state` key the exception handlers put the error code of their response under
+ERROR_CODE_STATE_KEY = 'error_code'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_FILE_SUFFIX = '.metrics'
+_FILE_VERSION = 5
+
+# statements per request; a route whose requests climb these buckets is running a query per row somewhere
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# labels of one series of a metric, as (name, value) pairs, e.g. `(('pool', 'primary'),)`
+type Labels = tuple[tuple[str, str], ...]
+
+
+@dataclass
+class MetricsSnapshot:
+    requests: dict[tuple[str, str, int], int] = field(default_factory=dict)  # (method, route, status) -> count
+    in_flight: dict[str, int] = field(default_factory=dict)  # method -> requests being handled
+    latency: dict[tuple[str, str], HistogramSnapshot] = field(default_factory=dict)  # (method, route) -> seconds
+    errors: dict[int, int] = field(default_factory=dict)  # error code -> responses sent with it
+    # (method, route) -> database statements and time per request
+    db_statements: dict[tuple[str, str], HistogramSnapshot] = field(default_factory=dict)
+    db_seconds: dict[tuple[str, str], HistogramSnapshot] = field(default_factory=dict)
+    # repository operation -> (statements, rows, seconds)
+    db_operations: dict[str, tuple[int, int, float]] = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)  # other process counters, by metric name
+    # other process gauges and histograms, by metric name and labels
+    gauges: dict[tuple[str, Labels], float] = field(default_factory=dict)
+    histograms: dict[tuple[str, Labels], HistogramSnapshot] = field(default_factory=dict)
+
+    def merge(self, other: 'MetricsSnapshot', gauges: bool = True) -> None:
+        """Add `other` to this snapshot, its in-flight and other gauges only if `gauges`"""
+        for key, count in other.requests.items():
+            self.requests[key] = self.requests.get(key, 0) + count
+        if gauges:
+            for method, count in other.in_flight.items():
+                self.in_flight[method] = self.in_flight.get(method, 0) + count
+            for key, value in other.gauges.items():
+                self.gauges[key] = self.gauges.get(key, 0) + value
+        for mine, theirs in (
+            (self.latency, other.latency),
+            (self.db_statements, other.db_statements),
+            (self.db_seconds, other.db_seconds),
+            (self.histograms, other.histograms),
+        ):
+            for key, histogram in theirs.items():
+                mine[key] = histogram if key not in mine else mine[key].merge(histogram)
+        for code, count in other.errors.items():
+            self.errors[code] = self.errors.get(code, 0) + count
+        for operation, (statements, rows, seconds) in other.db_operations.items():
+            total_statements, total_rows, total_seconds = self.db_operations.get(operation, (0, 0, 0.0))
+            self.db_operations[operation] = (total_statements + statements, total_rows + rows, total_seconds + seconds)
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def dumps(self) -> bytes:
+        def histograms(snapshots: dict[tuple, HistogramSnapshot]) -> dict:
+            return {key: (h.buckets, h.counts, h.count, h.sum) for key, h in snapshots.items()}
+
+        return marshal.dumps(
+            (
+                _FILE_VERSION,
+                self.requests,
+                self.in_flight,
+                histograms(self.latency),
+                self.errors,
+                histograms(self.db_statements),
+                histograms(self.db_seconds),
+                self.db_operations,
+                self.counters,
+                self.gauges,
+                histograms(self.histograms),
+            )
+        )
+
+    @classmethod
+    def loads(cls, data: bytes) -> 'MetricsSnapshot':
+        version, *fields = marshal.loads(data)
+        if version != _FILE_VERSION:
+            raise ValueError(f'Unsupported metrics file version {version}')
+        requests, in_flight, latency, errors, db_statements, db_seconds, db_operations, counters, gauges, other = fields
+
+        def histograms(values: dict) -> dict[tuple, HistogramSnapshot]:
+            return {key: HistogramSnapshot(*histogram) for key, histogram in values.items()}
+
+        return cls(
+            requests=requests,
+            in_flight=in_flight,
+            latency=histograms(latency),
+            errors=errors,
+            db_statements=histograms(db_statements),
+            db_seconds=histograms(db_seconds),
+            db_operations=db_operations,
+            counters=counters,
+            gauges=gauges,
+            histograms=histograms(other),
+        )
+
+
+class _RouteSeries:
+    __slots__ = ('db_seconds', 'db_statements', 'latency', 'statuses')
+
+    def __init__(self):
+        self.statuses: dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS_SECONDS)
+        self.db_statements = Histogram(STATEMENT_BUCKETS)
+        self.db_seconds = Histogram(LATENCY_BUCKETS_SECONDS)
+
+
+class HttpMetrics:
+    """
+    Request counts, in-flight gauges, latencies and error codes of this process
+
+    They are only updated from the event loop thread, so plain dicts and ints are enough: recording a request
+    takes no lock and makes no system call. Other workers' metrics are merged in by MetricsStore at scrape time.
+
+    With a `queries` recorder, the database statements of each request are recorded per route as well, and the
+    recorder's totals per repository operation are part of the snapshot, as are the current values of `counters`
+    (metric name -> function reading it), for counters kept elsewhere in the process, and of `gauges` and
+    `histograms` (metric name -> function reading its values by labels), for those kept elsewhere.
+    """
+
+    def __init__(
+        self,
+        queries: QueryRecorder | None = None,
+        counters: Mapping[str, Callable[[], int]] | None = None,
+        gauges: Mapping[str, Callable[[], Mapping[Labels, float]]] | None = None,
+        histograms: Mapping[str, Callable[[], Mapping[Labels, HistogramSnapshot]]] | None = None,
+    ):
+        self.queries = queries
+        self.counters = dict(counters or {})
+        self.gauges = dict(gauges or {})
+        self.histograms = dict(histograms or {})
+        self.routes: dict[tuple[str, str], _RouteSeries] = {}
+        self.in_flight: dict[str, int] = {}
+        self.errors: dict[int, int] = {}
+
+    def record(
+        self,
+        method: str,
+        route: str,
+        status: int,
+        seconds: float,
+        error_code: int | None = None,
+        queries: QueryStats | None = None,
+    ) -> None:
+        series = self.routes.get((method, route))
+        if series is None:
+            series = self.routes[(method, route)] = _RouteSeries()
+        statuses = series.statuses
+        statuses[status] = statuses.get(status, 0) + 1
+        series.latency.observe(seconds)
+        if queries is not None:
+            series.db_statements.observe(queries.statements)
+            series.db_seconds.observe(queries.seconds)
+        if error_code is not None:
+            code = int(error_code)
+            self.errors[code] = self.errors.get(code, 0) + 1
+
+    def snapshot(self) -> MetricsSnapshot:
+        return MetricsSnapshot(
+            requests={
+                (method, route, status): count
+                for (method, route), series in self.routes.items()
+                for status, count in series.statuses.items()
+            },
+            in_flight=dict(self.in_flight),
+            latency={key: series.latency.snapshot() for key, series in self.routes.items()},
+            errors=dict(self.errors),
+            db_statements={
+                key: series.db_statements.snapshot() for key, series in self.routes.items() if self.queries is not None
+            },
+            db_seconds={
+                key: series.db_seconds.snapshot() for key, series in self.routes.items() if self.queries is not None
+            },
+            db_operations={}
+            if self.queries is None
+            else {
+                operation: (stats.statements, stats.rows, stats.seconds)
+                for operation, stats in self.queries.operations.items()
+            },
+            counters={name: read() for name, read in self.counters.items()},
+            gauges={(name, labels): value for name, read in self.gauges.items() for labels, value in read().items()},
+            histograms={
+                (name, labels): histogram
+                for name, read in self.histograms.items()
+                for labels, histogram in read().items()
+            },
+        )
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording every HTTP request in `metrics`
+
+    Requests are labelled with the template of the route that handled them (`/api/users/{user_id}`), read from
+    the scope after the router matched it. Wrap the whole application with it, outside of Starlette's own error
+    middleware, so that the 500 responses of unhandled exceptions are seen too.
+
+    When the metrics have a query recorder, the statements each request ran before its response started are
+    also sent in a `Server-Timing` header (`db;dur=<milliseconds>;desc="<statements>, <rows>"`).
+    """
+
+    def __init__(self, app: ASGIApp, metrics: HttpMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        in_flight = self.metrics.in_flight
+        in_flight[method] = in_flight.get(method, 0) + 1
+        status = 500  # unless a response is started
+        recorder = self.metrics.queries
+        queries, token = (None, None) if recorder is None else recorder.track_request()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if queries is not None:
+                    timing = (b'server-timing', queries.server_timing())
+                    message = {**message, 'headers': [*message.get('headers', ()), timing]}
+            await send(message)
+
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = perf_counter() - started
+            in_flight[method] -= 1
+            if token is not None:
+                recorder.untrack_request(token)
+            route = scope.get('route')
+            state = scope.get('state')
+            self.metrics.record(
+                method,
+                UNMATCHED_ROUTE if route is None else route.path,
+                status,
+                seconds,
+                None if state is None else state.get(ERROR_CODE_STATE_KEY),
+                queries,
+            )
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsStore:
+    """
+    Metrics of all the worker processes of a server, for a scrape that any one of them may serve
+
+    Each worker writes a snapshot of its own metrics to `<directory>/<pid>.metrics` every `interval` seconds and
+    when it stops, off the request path. A scrape merges the live metrics of the worker serving it with the other
+    workers' files, so those lag by up to `interval`. Counters of workers that exited are kept, so totals never go
+    backwards when a worker is replaced; their in-flight gauges are dropped.
+
+    The directory must be shared by the workers of one server only, and emptied before the server starts. Without
+    a directory, the store only reports the metrics of this process.
+    """
+
+    def __init__(self, metrics: HttpMetrics, directory: str | Path | None = None, interval: float = 1.0):
+        self.metrics = metrics
+        self.directory = Path(directory) if directory is not None else None
+        self.interval = interval
+        self.pid = os.getpid()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def path(self) -> Path | None:
+        return None if self.directory is None else self.directory / f'{self.pid}{_FILE_SUFFIX}'
+
+    def flush(self) -> None:
+        """Write this worker's snapshot, atomically so a concurrent scrape never reads a partial file"""
+        if self.path is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix('.tmp')
+        temporary.write_bytes(self.metrics.snapshot().dumps())
+        os.replace(temporary, self.path)
+
+    def collect(self) -> MetricsSnapshot:
+        """This worker's live metrics merged with the last snapshot written by every other worker"""
+        snapshot = self.metrics.snapshot()
+        if self.directory is None or not self.directory.is_dir():
+            return snapshot
+
+        for path in self.directory.glob(f'*{_FILE_SUFFIX}'):
+            if path == self.path or not path.stem.isdigit():
+                continue
+            try:
+                other = MetricsSnapshot.loads(path.read_bytes())
+            except (OSError, EOFError, ValueError, TypeError) as e:
+                logger.warning('Skipping metrics file %s: %s', path, e)
+                continue
+            snapshot.merge(other, gauges=_is_alive(int(path.stem)))
+        return snapshot
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.flush()
+            except OSError as e:
+                logger.error('Failed to write metrics file %s: %s', self.path, e)
+
+    def start(self) -> None:
+        """Start writing this worker's snapshots periodically, if there is a directory to write them to"""
+        if self.directory is not None and self._task is None:
+            self.flush()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.flush()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels: object) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + '}'
+
+
+def _error_code_name(code: int) -> str:
+    try:
+        return ErrorCode(code).name
+    except ValueError:
+        return str(code)
+
+
+def _histogram_lines(name: str, histogram: HistogramSnapshot, **labels: object) -> list[str]:
+    lines = []
+    cumulative = 0
+    for upper_bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts, strict=True):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels(**labels, le=upper_bound)} {cumulative}')
+    lines.append(f'{name}_sum{_labels(**labels)} {histogram.sum!r}')
+    lines.append(f'{name}_count{_labels(**labels)} {histogram.count}')
+    return lines
+
+
+def _render_histograms(name: str, description: str, histograms: dict[tuple[str, str], HistogramSnapshot]) -> list[str]:
+    lines = [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+    for (method, route), histogram in sorted(histograms.items()):
+        lines += _histogram_lines(name, histogram, method=method, route=route)
+    return lines
+
+
+def _render_families(snapshot: MetricsSnapshot) -> list[str]:
+    """The gauges and histograms kept by other components, each family under one TYPE line"""
+    lines = []
+    for kind, series in (('gauge', snapshot.gauges), ('histogram', snapshot.histograms)):
+        previous_name = None
+        for (name, labels), value in sorted(series.items()):
+            if name != previous_name:
+                lines.append(f'# TYPE {name} {kind}')
+                previous_name = name
+            if kind == 'gauge':
+                lines.append(f'{name}{_labels(**dict(labels))} {value!r}')
+            else:
+                lines += _histogram_lines(name, value, **dict(labels))
+    return lines
+
+
+def render_metrics(snapshot: MetricsSnapshot) -> str:
+    """`snapshot` in the Prometheus text exposition format"""
+    lines = [
+        '# HELP http_requests_total HTTP requests handled, by method, route template and status code.',
+        '# TYPE http_requests_total counter',
+    ]
+    for (method, route, status), count in sorted(snapshot.requests.items()):
+        lines.append(f'http_requests_total{_labels(method=method, route=route, status=status)} {count}')
+
+    lines += [
+        '# HELP http_requests_in_flight HTTP requests being handled, by method.',
+        '# TYPE http_requests_in_flight gauge',
+    ]
+    for method, count in sorted(snapshot.in_flight.items()):
+        lines.append(f'http_requests_in_flight{_labels(method=method)} {count}')
+
+    lines += _render_histograms(
+        'http_request_duration_seconds',
+        'Time to handle HTTP requests, by method and route template.',
+        snapshot.latency,
+    )
+
+    lines += [
+        '# HELP http_errors_total Error responses sent by the exception handlers, by error code.',
+        '# TYPE http_errors_total counter',
+    ]
+    for code, count in sorted(snapshot.errors.items()):
+        lines.append(f'http_errors_total{_labels(code=_error_code_name(code))} {count}')
+
+    lines += _render_histograms(
+        'http_request_db_statements',
+        'Database statements run per HTTP request, by method and route template.',
+        snapshot.db_statements,
+    )
+    lines += _render_histograms(
+        'http_request_db_duration_seconds',
+        'Time spent in database statements per HTTP request, by method and route template.',
+        snapshot.db_seconds,
+    )
+
+    for name, kind, index in (
+        ('db_statements_total', 'Database statements run', 0),
+        ('db_rows_total', 'Rows returned or affected by database statements', 1),
+        ('db_duration_seconds_total', 'Time spent in database statements', 2),
+    ):
+        lines += [f'# HELP {name} {kind}, by repository operation.', f'# TYPE {name} counter']
+        for operation, totals in sorted(snapshot.db_operations.items()):
+            lines.append(f'{name}{_labels(operation=operation)} {totals[index]!r}')
+
+    for name, value in sorted(snapshot.counters.items()):
+        lines += [f'# TYPE {name} counter', f'{name} {value}']
+
+    lines += _render_families(snapshot)
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,42 @@
+import re
+from uuid import uuid4
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utility.log import request_id
+
+REQUEST_ID_HEADER = b'x-request-id'
+
+# ids from callers are kept if they are short and plain enough to be logged as they are
+_VALID_REQUEST_ID = re.compile(r'[\w.:-]{1,128}')
+
+
+class RequestIdMiddleware:
+    """
+    Pure ASGI middleware giving every HTTP request an id: the caller's `X-Request-ID` if it sent a valid one, a new
+    one otherwise. The id is set in `utility.log.request_id` while the request is handled, so that it is attached
+    to the request's log records, and sent back in the response's `X-Request-ID` header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        current = next((value for name, value in scope['headers'] if name == REQUEST_ID_HEADER), b'').decode('latin-1')
+        if not _VALID_REQUEST_ID.fullmatch(current):
+            current = uuid4().hex
+
+        async def send_with_request_id(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                message = {**message, 'headers': [*message.get('headers', ()), (REQUEST_ID_HEADER, current.encode())]}
+            await send(message)
+
+        token = request_id.set(current)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,60 @@
+import asyncio
+import secrets
+from dataclasses import asdict
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from starlette import status
+
+from config.settings import ADMIN_PROFILE_MAX_SECONDS, ADMIN_TOKEN
+from utility.profiler import collapse, dump_tasks, sample_stacks
+
+# what the tasks of a worker wait on, recognized by where they are suspended
+TASK_CATEGORIES = {
+    'database': ('sqlalchemy/', 'asyncpg/', 'repository/psql/'),
+    'password_hash': ('core/utility/hasher.py',),
+}
+
+_profiling = asyncio.Lock()
+
+
+async def verify_admin_token(authorization: Annotated[str | None, Header()] = None) -> None:
+    scheme, _, token = (authorization or '').partition(' ')
+    if (
+        ADMIN_TOKEN is None
+        or scheme.lower() != 'bearer'
+        or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='invalid admin token',
+            headers={'WWW-Authenticate': 'Bearer'},
+        )
+
+
+router = APIRouter(prefix='/admin', tags=['Admin'], dependencies=[Depends(verify_admin_token)])
+
+
+@router.get('/profile', include_in_schema=False)
+async def profile(
+    seconds: Annotated[float, Query(gt=0, le=ADMIN_PROFILE_MAX_SECONDS)] = 5,
+    interval_ms: Annotated[float, Query(ge=1, le=1000)] = 5,
+    idle: bool = False,
+):
+    """Sample the stacks of this worker's threads for `seconds`, as collapsed stacks for a flame graph"""
+    if _profiling.locked():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='a profile is already running')
+    async with _profiling:
+        counts = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000, idle)
+    return PlainTextResponse(collapse(counts))
+
+
+@router.get('/tasks', include_in_schema=False)
+async def tasks():
+    """The pending asyncio tasks of this worker, by what they wait on"""
+    task_infos = dump_tasks(TASK_CATEGORIES)
+    summary: dict[str, int] = {}
+    for task_info in task_infos:
+        summary[task_info.category] = summary.get(task_info.category, 0) + 1
+    return {'summary': summary, 'tasks': [asdict(task_info) for task_info in task_infos]}
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from api.http.dependencies.container import container
+from api.http.metrics import CONTENT_TYPE, MetricsStore, render_metrics
+
+router = APIRouter(prefix='', tags=['Health'])
+
+
+@router.get('/metrics', include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(container.resolve(MetricsStore).collect()), media_type=CONTENT_TYPE)
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+
+from api.http.dependencies.user import UserServiceDependency
+from api.http.schema.role import AddRoleMembersRequestModel, AddRoleMembersResponseModel
+from core.type import IDType
+
+router = APIRouter(prefix='/roles', tags=['Roles'])
+
+
+@router.post('/{role_id}/members', response_model=AddRoleMembersResponseModel)
+async def add_role_members(role_id: IDType, request: AddRoleMembersRequestModel, user_service: UserServiceDependency):
+    added = await user_service.add_role_to_users(role_id, request.user_ids)
+
+    return AddRoleMembersResponseModel(added=added)
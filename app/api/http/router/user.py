@@ -1,26 +1,203 @@
-from fastapi import APIRouter
+from collections.abc import AsyncIterator
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
 from starlette import status
 
-from api.http.dependencies.user import UserServiceDependency
-from api.http.schema.user import CreateUserRequestModel, RetrieveUserModel, UpdateUserRequestModel
+from api.http.dependencies.user import UserServiceDependency, user_service_scope
+from api.http.schema.user import (
+    BulkCreateUsersResponseModel,
+    CreateUserRequestModel,
+    DeleteUsersRequestModel,
+    DeleteUsersResponseModel,
+    RetrieveUserModel,
+    UpdateUserRequestModel,
+    dump_bulk_create_users_result_json,
+    dump_user_json,
+    dump_user_summaries_json,
+)
+from config.settings import FAST_JSON_RESPONSES
+from core.constant.user import (
+    USER_BULK_CREATE_MAX_BYTES,
+    USER_BULK_CREATE_MAX_SIZE,
+    USER_EXPORT_BATCH_SIZE,
+    USER_PAGE_SIZE_DEFAULT,
+    USER_PAGE_SIZE_MAX,
+)
 from core.error import NotFoundError
+from core.model.user import User
 from core.type import IDType
 
 router = APIRouter(prefix='/users', tags=['Users'])
 
 
+def _user_response(user: User, status_code: int = status.HTTP_200_OK) -> RetrieveUserModel | Response:
+    # In the fast mode the response is serialized once from the core user, FastAPI does not validate a
+    # returned Response against the route's response_model, which still documents it.
+    if FAST_JSON_RESPONSES:
+        return Response(content=dump_user_json(user), status_code=status_code, media_type='application/json')
+    return RetrieveUserModel.from_core(user)
+
+
 @router.post('', response_model=RetrieveUserModel, status_code=status.HTTP_201_CREATED)
 async def create_user(request: CreateUserRequestModel, user_service: UserServiceDependency):
     user = await user_service.create_user(request.to_core())
 
-    return RetrieveUserModel.from_core(user)
+    return _user_response(user, status_code=status.HTTP_201_CREATED)
+
+
+_NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+_create_user_requests_adapter = TypeAdapter(list[CreateUserRequestModel])
+
+
+def _too_many_users() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f'At most {USER_BULK_CREATE_MAX_SIZE} users can be created at once',
+    )
+
+
+def _body_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f'A bulk create body is at most {USER_BULK_CREATE_MAX_BYTES} bytes',
+    )
+
+
+async def _read_body_chunks(request: Request) -> AsyncIterator[bytes]:
+    """The chunks of the body, failing once more than USER_BULK_CREATE_MAX_BYTES are received"""
+    content_length = request.headers.get('content-length', '')
+    if content_length.isdigit() and int(content_length) > USER_BULK_CREATE_MAX_BYTES:
+        raise _body_too_large()
+
+    # counted as well, since a chunked body has no length
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > USER_BULK_CREATE_MAX_BYTES:
+            raise _body_too_large()
+        yield chunk
+
+
+async def _read_ndjson_lines(request: Request) -> AsyncIterator[bytes]:
+    buffer = bytearray()
+    async for chunk in _read_body_chunks(request):
+        # only the new chunk is searched for line ends, so that a long line is not scanned again for each chunk
+        search_from = len(buffer)
+        buffer += chunk
+        line_start = 0
+        while (line_end := buffer.find(b'\n', search_from)) != -1:
+            yield bytes(buffer[line_start:line_end])
+            line_start = search_from = line_end + 1
+        del buffer[:line_start]
+    yield bytes(buffer)
+
+
+async def _read_create_user_requests(request: Request) -> list[CreateUserRequestModel]:
+    """Parse a bulk create body, either a JSON array of users or NDJSON with one user per line"""
+    if request.headers.get('content-type', '').split(';')[0].strip() != _NDJSON_MEDIA_TYPE:
+        body = bytearray()
+        async for chunk in _read_body_chunks(request):
+            body += chunk
+        try:
+            create_requests = _create_user_requests_adapter.validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**error, 'loc': ('body', *error['loc'])} for error in e.errors(include_url=False)]
+            ) from e
+        if len(create_requests) > USER_BULK_CREATE_MAX_SIZE:
+            raise _too_many_users()
+        return create_requests
+
+    # NDJSON is validated line by line as it arrives, so an oversized body is rejected without reading all of it
+    create_requests: list[CreateUserRequestModel] = []
+    errors: list[dict] = []
+    index = 0
+    async for line in _read_ndjson_lines(request):
+        if not line.strip():
+            continue
+        if index >= USER_BULK_CREATE_MAX_SIZE:
+            raise _too_many_users()
+        try:
+            create_requests.append(CreateUserRequestModel.model_validate_json(line))
+        except ValidationError as e:
+            errors.extend({**error, 'loc': ('body', index, *error['loc'])} for error in e.errors(include_url=False))
+        index += 1
+
+    if errors:
+        raise RequestValidationError(errors)
+    return create_requests
+
+
+_create_user_requests_schema = {
+    'type': 'array',
+    'items': {'$ref': '#/components/schemas/CreateUserRequestModel'},
+}
+
+
+@router.post(
+    '/bulk',
+    response_model=BulkCreateUsersResponseModel,
+    openapi_extra={
+        'requestBody': {
+            'required': True,
+            'content': {
+                'application/json': {'schema': _create_user_requests_schema},
+                _NDJSON_MEDIA_TYPE: {'schema': {'$ref': '#/components/schemas/CreateUserRequestModel'}},
+            },
+        }
+    },
+)
+async def create_users(request: Request, user_service: UserServiceDependency):
+    create_requests = await _read_create_user_requests(request)
+
+    result = await user_service.create_users([create_request.to_core() for create_request in create_requests])
+
+    if FAST_JSON_RESPONSES:
+        return Response(content=dump_bulk_create_users_result_json(result), media_type='application/json')
+    return BulkCreateUsersResponseModel.from_core(result)
+
+
+@router.delete('', response_model=DeleteUsersResponseModel)
+async def delete_users(request: DeleteUsersRequestModel, user_service: UserServiceDependency):
+    deleted = await user_service.delete_users(request.ids)
+
+    return DeleteUsersResponseModel(deleted=deleted)
 
 
 @router.get('', response_model=list[RetrieveUserModel])
-async def get_all_users(user_service: UserServiceDependency):
-    users = await user_service.get_all_users()
+async def get_all_users(
+    user_service: UserServiceDependency,
+    after_id: IDType | None = None,
+    limit: Annotated[int, Query(ge=1, le=USER_PAGE_SIZE_MAX)] = USER_PAGE_SIZE_DEFAULT,
+):
+    users = await user_service.get_all_user_summaries(after_id=after_id, limit=limit)
+
+    # already in the shape of the response model, so it is returned as is instead of being validated again
+    return Response(content=dump_user_summaries_json(users), media_type='application/json')
 
-    return [RetrieveUserModel.from_core(user) for user in users]
+
+async def _export_users_ndjson() -> AsyncIterator[str]:
+    # The session must live as long as the response body, so the service is built here instead of
+    # coming from UserServiceDependency.
+    async with user_service_scope(read_only=True) as user_service:
+        lines: list[str] = []
+        async for user in user_service.stream_all_users(USER_EXPORT_BATCH_SIZE):
+            lines.append(RetrieveUserModel.from_core(user).model_dump_json())
+            if len(lines) >= USER_EXPORT_BATCH_SIZE:
+                yield '\n'.join(lines) + '\n'
+                lines.clear()
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+
+@router.get('/export', response_class=StreamingResponse)
+async def export_users():
+    return StreamingResponse(_export_users_ndjson(), media_type='application/x-ndjson')
 
 
 @router.get('/{user_id}', response_model=RetrieveUserModel)
@@ -30,14 +207,14 @@ async def get_user(user_id: IDType, user_service: UserServiceDependency):
     if not user:
         raise NotFoundError('User not found')
 
-    return RetrieveUserModel.from_core(user)
+    return _user_response(user)
 
 
 @router.patch('/{user_id}', response_model=RetrieveUserModel)
 async def update_user(user_id: IDType, request: UpdateUserRequestModel, user_service: UserServiceDependency):
     user = await user_service.update_user(user_id, request.to_core())
 
-    return RetrieveUserModel.from_core(user)
+    return _user_response(user)
 
 
 @router.delete('/{user_id}', status_code=status.HTTP_204_NO_CONTENT)
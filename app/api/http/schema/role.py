@@ -0,0 +1,14 @@
+from typing import Annotated
+
+from pydantic import BaseModel, Field
+
+from core.constant.user import USER_BULK_IDS_MAX_SIZE
+from core.type import IDType
+
+
+class AddRoleMembersRequestModel(BaseModel):
+    user_ids: Annotated[list[IDType], Field(min_length=1, max_length=USER_BULK_IDS_MAX_SIZE)]
+
+
+class AddRoleMembersResponseModel(BaseModel):
+    added: int
@@ -1,8 +1,18 @@
-from typing import Self
+from collections.abc import Iterable
+from typing import Annotated, Self
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, TypeAdapter
+from pydantic_core import to_json
 
-from core.model.user import CreateUserPayload, UpdateUserPayload, User
+from core.constant.user import USER_BULK_IDS_MAX_SIZE
+from core.model.user import (
+    BulkCreateUserFailure,
+    BulkCreateUsersResult,
+    CreateUserPayload,
+    UpdateUserPayload,
+    User,
+    UserSummary,
+)
 from core.type import IDType
 
 
@@ -27,7 +37,59 @@ class RetrieveUserModel(BaseModel):
 
     @classmethod
     def from_core(cls, user: User) -> Self:
-        return cls.model_validate(user.__dict__)
+        return cls.model_validate(user, from_attributes=True)
+
+
+class BulkCreateUserFailureModel(BaseModel):
+    index: int
+    username: str
+    email: str
+    message: str
+
+    @classmethod
+    def from_core(cls, failure: BulkCreateUserFailure) -> Self:
+        return cls.model_validate(failure, from_attributes=True)
+
+
+class BulkCreateUsersResponseModel(BaseModel):
+    created: list[RetrieveUserModel]
+    failed: list[BulkCreateUserFailureModel]
+
+    @classmethod
+    def from_core(cls, result: BulkCreateUsersResult) -> Self:
+        return cls(
+            created=[RetrieveUserModel.from_core(user) for user in result.created],
+            failed=[BulkCreateUserFailureModel.from_core(failure) for failure in result.failed],
+        )
+
+
+# Precompiled serializers of the core models straight to the JSON of the response models above, for the fast
+# response mode. They only keep the response model fields, field order aside the output is the same.
+_RETRIEVE_USER_FIELDS = set(RetrieveUserModel.model_fields)
+_user_adapter = TypeAdapter(User)
+_bulk_create_users_result_adapter = TypeAdapter(BulkCreateUsersResult)
+
+
+def dump_user_json(user: User) -> bytes:
+    """Serialize a user as RetrieveUserModel JSON, without building the model"""
+    return _user_adapter.dump_json(user, include=_RETRIEVE_USER_FIELDS)
+
+
+def dump_bulk_create_users_result_json(result: BulkCreateUsersResult) -> bytes:
+    """Serialize a bulk create result as BulkCreateUsersResponseModel JSON, without building the models"""
+    return _bulk_create_users_result_adapter.dump_json(
+        result, include={'created': {'__all__': _RETRIEVE_USER_FIELDS}, 'failed': True}
+    )
+
+
+def dump_user_summaries_json(summaries: Iterable[UserSummary]) -> bytes:
+    """Serialize summaries as a JSON list of RetrieveUserModel, without building the models"""
+    return to_json(
+        [
+            {'id': summary.id, 'username': summary.username, 'email': summary.email, 'is_verified': summary.is_verified}
+            for summary in summaries
+        ]
+    )
 
 
 class UpdateUserRequestModel(BaseModel):
@@ -45,3 +107,11 @@ class UpdateUserRequestModel(BaseModel):
             is_verified=self.is_verified,
             role_ids=self.role_ids,
         )
+
+
+class DeleteUsersRequestModel(BaseModel):
+    ids: Annotated[list[IDType], Field(min_length=1, max_length=USER_BULK_IDS_MAX_SIZE)]
+
+
+class DeleteUsersResponseModel(BaseModel):
+    deleted: int
@@ -1,22 +1,61 @@
+import atexit
 import logging
+import queue
 
-from .settings import IS_DEVELOPMENT, LOG_LEVEL
+from core.enum.logging import LogFormat
+from utility.log import (
+    BatchingQueueListener,
+    BatchRotatingFileHandler,
+    BatchStreamHandler,
+    BoundedQueueHandler,
+    JsonFormatter,
+)
+
+from .settings import (
+    IS_DEVELOPMENT,
+    LOG_BATCH_SIZE,
+    LOG_FILE,
+    LOG_FILE_BACKUP_COUNT,
+    LOG_FILE_MAX_BYTES,
+    LOG_FILE_ROTATE_SECONDS,
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_QUEUE_SIZE,
+)
+
+# request id shown for records logged outside of a request
+_NO_REQUEST_ID = {'request_id': '-'}
+
+_queue_handler: BoundedQueueHandler | None = None
+_listener: BatchingQueueListener | None = None
 
 
 def init_logger():
+    """
+    Log through a bounded queue to a background thread, which formats the records and writes them in batches,
+    so that logging never does I/O on the event loop
+    """
+    global _queue_handler, _listener
+
     logger = logging.getLogger()
     logger.setLevel(LOG_LEVEL)
 
-    console_handler = logging.StreamHandler()
+    plain_formatter = logging.Formatter(
+        fmt='%(asctime)s - [%(levelname)s] [%(request_id)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        defaults=_NO_REQUEST_ID,
+    )
+    formatter = JsonFormatter() if LOG_FORMAT == LogFormat.JSON else plain_formatter
 
-    plain_formatter = logging.Formatter(fmt='%(asctime)s - [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    console_handler = BatchStreamHandler()
 
     if IS_DEVELOPMENT:
         import colorlog
 
         color_formatter = colorlog.ColoredFormatter(
-            fmt='%(asctime)s - %(log_color)s[%(levelname)s]%(reset)s %(message)s',
+            fmt='%(asctime)s - %(log_color)s[%(levelname)s]%(reset)s [%(request_id)s] %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S',
+            defaults=_NO_REQUEST_ID,
             log_colors={
                 'DEBUG': 'cyan',
                 'INFO': 'green',
@@ -27,11 +66,40 @@ def init_logger():
         )
         console_handler.setFormatter(color_formatter)
     else:
-        console_handler.setFormatter(plain_formatter)
+        console_handler.setFormatter(formatter)
+
+    handlers: list[logging.Handler] = [console_handler]
+    if LOG_FILE is not None:
+        file_handler = BatchRotatingFileHandler(
+            LOG_FILE,
+            max_bytes=LOG_FILE_MAX_BYTES,
+            interval=LOG_FILE_ROTATE_SECONDS,
+            backup_count=LOG_FILE_BACKUP_COUNT,
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = BoundedQueueHandler(log_queue)
+    listener = BatchingQueueListener(
+        log_queue, *handlers, batch_size=LOG_BATCH_SIZE, dropped=lambda: queue_handler.dropped
+    )
+    listener.start()
+    logger.handlers = [queue_handler]
+
+    # a previous pipeline writes out what it still has queued
+    if _listener is not None:
+        _listener.stop()
+    _queue_handler, _listener = queue_handler, listener
+
+
+def dropped_log_records() -> int:
+    """Records dropped because the log queue was full, since the logger was initialized"""
+    return 0 if _queue_handler is None else _queue_handler.dropped
 
-    logger.handlers = []
-    logger.addHandler(console_handler)
 
-    file_handler = logging.FileHandler('app.log')
-    file_handler.setFormatter(plain_formatter)
-    logger.addHandler(file_handler)
+@atexit.register
+def _stop_listener() -> None:
+    # writes out what is still queued
+    if _listener is not None:
+        _listener.stop()
@@ -1,3 +1,10 @@
 DEFAULT_ROLE_KEY = 'default_role'
 DEFAULT_ROLE_NAME = 'Default Role'
 DEFAULT_ROLE_DESCRIPTION = 'Default role for new users'
+
+USER_PAGE_SIZE_DEFAULT = 100
+USER_PAGE_SIZE_MAX = 1000
+USER_EXPORT_BATCH_SIZE = 1000
+USER_BULK_CREATE_MAX_SIZE = 50_000
+USER_BULK_CREATE_MAX_BYTES = 16 * 1024 * 1024
+USER_BULK_IDS_MAX_SIZE = 50_000
@@ -0,0 +1,6 @@
+from enum import StrEnum
+
+
+class ReplicaStrategy(StrEnum):
+    ROUND_ROBIN = 'round_robin'
+    LEAST_CONNECTIONS = 'least_connections'
@@ -7,3 +7,8 @@ class LogLevel(StrEnum):
     WARNING = 'WARNING'
     INFO = 'INFO'
     DEBUG = 'DEBUG'
+
+
+class LogFormat(StrEnum):
+    JSON = 'json'
+    PLAIN = 'plain'
@@ -0,0 +1,6 @@
+from enum import StrEnum
+
+
+class PasswordHashAlgorithm(StrEnum):
+    SCRYPT = 'scrypt'
+    PBKDF2_SHA256 = 'pbkdf2-sha256'
@@ -7,4 +7,6 @@ class NotFoundError(Exception):
 class DuplicateError(Exception):
     """Exception raised when a resource already exists"""
 
-    pass
+    def __init__(self, message: str = '', field: str | None = None):
+        super().__init__(message)
+        self.field = field  # name of the field that must be unique, if known
@@ -1,36 +1,105 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, fields
+from typing import Any, NamedTuple, Self
+from weakref import WeakValueDictionary
 
 from core.type import IDType
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class Role:
     key: str
     name: str
     id: IDType = IDType(0)  # should be set by the repository
 
 
-@dataclass(frozen=True)
+# every distinct role loaded from storage is kept once while it is referenced, instead of once per user; keyed by
+# the role's fields rather than the role itself, which as a key would be strongly referenced and never freed
+_role_pool: WeakValueDictionary[tuple[IDType, str, str], Role] = WeakValueDictionary()
+
+
+def intern_role(role: Role) -> Role:
+    """Return the shared instance equal to `role`, making `role` that instance if there is none yet"""
+    return _role_pool.setdefault((role.id, role.key, role.name), role)
+
+
+@dataclass(frozen=True, slots=True)
 class User:
     username: str
     email: str
     password_hash: str
     is_verified: bool = False
-    roles: list[Role] = field(default_factory=list)
+    roles: tuple[Role, ...] = ()
     id: IDType = IDType(0)  # should be set by the repository
 
+    def __post_init__(self):
+        if not isinstance(self.roles, tuple):
+            object.__setattr__(self, 'roles', tuple(self.roles))
+
+
+class UserSummary(NamedTuple):
+    """Read-only projection of a user, the fields a user list shows: no password hash, no roles"""
+
+    id: IDType
+    username: str
+    email: str
+    is_verified: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> Self:
+        return cls(user.id, user.username, user.email, user.is_verified)
+
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class CreateUserPayload:
     username: str
     email: str
     password: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class UpdateUserPayload:
     username: str | None = None
     email: str | None = None
     password: str | None = None
     is_verified: bool | None = None
     role_ids: list[IDType] | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class UpdateUserParams:
+    """Changes to apply to a stored user, fields left as None are kept"""
+
+    username: str | None = None
+    email: str | None = None
+    password_hash: str | None = None
+    is_verified: bool | None = None
+    roles: tuple[Role, ...] | None = None
+
+    def __post_init__(self):
+        if self.roles is not None and not isinstance(self.roles, tuple):
+            object.__setattr__(self, 'roles', tuple(self.roles))
+
+    def changes(self, user: User | None = None) -> dict[str, Any]:
+        """Shallow dict of the fields to change: the ones set, and only those differing from `user` if given"""
+        return {
+            name: value
+            for name in _UPDATE_USER_PARAMS_FIELDS
+            if (value := getattr(self, name)) is not None and (user is None or getattr(user, name) != value)
+        }
+
+
+_UPDATE_USER_PARAMS_FIELDS = tuple(f.name for f in fields(UpdateUserParams))
+
+
+@dataclass(frozen=True, slots=True)
+class BulkCreateUserFailure:
+    index: int  # position of the user in the submitted batch
+    username: str
+    email: str
+    message: str
+
+
+@dataclass(frozen=True, slots=True)
+class BulkCreateUsersResult:
+    created: list[User]
+    failed: list[BulkCreateUserFailure]
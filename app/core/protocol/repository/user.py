@@ -1,7 +1,9 @@
+from collections.abc import AsyncIterator
 from dataclasses import dataclass
 from typing import Protocol
 
-from core.model.user import User
+from core.error import DuplicateError
+from core.model.user import Role, UpdateUserParams, User, UserSummary
 from core.type import IDType
 
 
@@ -9,12 +11,30 @@ from core.type import IDType
 class UserRepository(Protocol):
     async def create(self, user: User) -> User: ...
 
-    async def get_all(self) -> list[User]: ...
+    async def create_many(self, users: list[User]) -> list[User | DuplicateError]:
+        """Create `users`, returning for each of them, in order, the created user or why it was a duplicate"""
+        ...
+
+    async def get_all(self, after_id: IDType | None = None, limit: int | None = None) -> list[User]: ...
+
+    async def get_all_summaries(self, after_id: IDType | None = None, limit: int | None = None) -> list[UserSummary]:
+        """Same users as `get_all`, projected to UserSummary without building full users"""
+        ...
+
+    def stream_all(self, batch_size: int) -> AsyncIterator[User]: ...
 
     async def get_by_id(self, user_id: IDType) -> User | None: ...
 
     async def get_by_username_or_email(self, username: str | None, email: str | None) -> User | None: ...
 
-    async def update(self, user: User) -> User: ...
+    async def update(self, user_id: IDType, params: UpdateUserParams) -> User: ...
 
     async def delete(self, user_id: IDType) -> None: ...
+
+    async def delete_many(self, user_ids: list[IDType]) -> int:
+        """Delete the users with `user_ids` in one transaction, returning how many existed"""
+        ...
+
+    async def add_role(self, role: Role, user_ids: list[IDType]) -> int:
+        """Grant `role` to the users with `user_ids` in one transaction, returning how many did not have it yet"""
+        ...
@@ -0,0 +1,87 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from core.enum.executor import ExecutorType
+
+from .user import PasswordCheck, PasswordHashBackend, check_password, hash_password
+
+
+class AsyncPasswordHasher:
+    """Runs password hashing in a bounded executor so slow hashes never block the event loop"""
+
+    def __init__(
+        self,
+        executor_type: ExecutorType = ExecutorType.THREAD,
+        max_workers: int | None = None,
+        max_concurrency: int | None = None,
+        backend: PasswordHashBackend | None = None,
+    ):
+        self.backend = backend
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency or max_workers or 4
+
+        self._executor: Executor | None = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._waiting = 0
+        self._running = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of hash calls waiting for a free slot"""
+        return self._waiting
+
+    @property
+    def in_flight(self) -> int:
+        """Number of hash calls currently running in the executor"""
+        return self._running
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == ExecutorType.PROCESS:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hash')
+        return self._executor
+
+    async def _run(self, func, *args):
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._running -= 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.backend)
+
+    async def hash_many(self, passwords: list[str]) -> list[str]:
+        """Hash `passwords` concurrently, as many at a time as the concurrency limit allows"""
+        # `max_concurrency` workers take the passwords in turn, so that a large batch does not create a coroutine
+        # and a future per password up front, only to have them wait on the semaphore
+        hashes = [''] * len(passwords)
+        pending = iter(enumerate(passwords))
+
+        async def worker():
+            for index, password in pending:
+                hashes[index] = await self.hash(password)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.max_concurrency, len(passwords)))))
+        return hashes
+
+    async def check(self, password: str, hashed_password: str) -> PasswordCheck:
+        return await self._run(check_password, password, hashed_password, self.backend)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return (await self.check(password, hashed_password)).is_valid
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,25 +1,141 @@
+import base64
 import hashlib
+import hmac
 import os
+from dataclasses import dataclass
+from typing import ClassVar, Protocol, Self
+
+from core.enum.password import PasswordHashAlgorithm
 
-_SALT_LENGTH = 8  # This is in bytes
-_SALT_HEX_LENGTH = _SALT_LENGTH * 2  # Length in hexadecimal characters
 _ENCODING = 'utf-8'
+_SALT_LENGTH = 16  # This is in bytes
+_DIGEST_LENGTH = 32  # This is in bytes
+
+# Hashes created before the versioned format: 8-byte hex salt followed by a hex SHA-256 digest
+_LEGACY_SALT_HEX_LENGTH = 16
+_LEGACY_HASH_LENGTH = _LEGACY_SALT_HEX_LENGTH + 64
+
+
+class PasswordHashBackend(Protocol):
+    """A key derivation function with fixed cost parameters"""
+
+    algorithm: ClassVar[PasswordHashAlgorithm]
+
+    def encode_params(self) -> str: ...
+
+    @classmethod
+    def from_params(cls, params: dict[str, str]) -> Self: ...
+
+    def derive(self, password: bytes, salt: bytes) -> bytes: ...
+
+
+@dataclass(frozen=True)
+class ScryptBackend:
+    algorithm: ClassVar[PasswordHashAlgorithm] = PasswordHashAlgorithm.SCRYPT
+
+    n: int = 2**14
+    r: int = 8
+    p: int = 1
+
+    def encode_params(self) -> str:
+        return f'n={self.n},r={self.r},p={self.p}'
+
+    @classmethod
+    def from_params(cls, params: dict[str, str]) -> Self:
+        return cls(n=int(params['n']), r=int(params['r']), p=int(params['p']))
+
+    def derive(self, password: bytes, salt: bytes) -> bytes:
+        # scrypt needs 128 * r * n bytes of memory per call, leave headroom above that
+        maxmem = 256 * self.r * self.n * self.p
+        return hashlib.scrypt(password, salt=salt, n=self.n, r=self.r, p=self.p, maxmem=maxmem, dklen=_DIGEST_LENGTH)
+
+
+@dataclass(frozen=True)
+class Pbkdf2Sha256Backend:
+    algorithm: ClassVar[PasswordHashAlgorithm] = PasswordHashAlgorithm.PBKDF2_SHA256
+
+    iterations: int = 600_000
+
+    def encode_params(self) -> str:
+        return f'i={self.iterations}'
+
+    @classmethod
+    def from_params(cls, params: dict[str, str]) -> Self:
+        return cls(iterations=int(params['i']))
 
+    def derive(self, password: bytes, salt: bytes) -> bytes:
+        return hashlib.pbkdf2_hmac('sha256', password, salt, self.iterations, dklen=_DIGEST_LENGTH)
 
-def _hash(text: str, salt: str) -> str:
+
+_BACKENDS: dict[PasswordHashAlgorithm, type[PasswordHashBackend]] = {}
+
+
+def register_password_hash_backend(backend: type[PasswordHashBackend]) -> None:
+    _BACKENDS[backend.algorithm] = backend
+
+
+register_password_hash_backend(ScryptBackend)
+register_password_hash_backend(Pbkdf2Sha256Backend)
+
+DEFAULT_PASSWORD_HASH_BACKEND: PasswordHashBackend = ScryptBackend()
+
+
+def get_password_hash_backend(algorithm: PasswordHashAlgorithm, **params: int) -> PasswordHashBackend:
+    """Build a backend of the given algorithm, e.g. `get_password_hash_backend('scrypt', n=2**15)`"""
+    return _BACKENDS[PasswordHashAlgorithm(algorithm)](**params)
+
+
+@dataclass(frozen=True)
+class PasswordCheck:
+    is_valid: bool
+    needs_rehash: bool = False
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _legacy_hash(text: str, salt: str) -> str:
     return hashlib.sha256((text + salt).encode(_ENCODING)).hexdigest()
 
 
-def hash_password(password: str) -> str:
-    random_salt = os.urandom(_SALT_LENGTH).hex()
-    hashed_password = _hash(password, random_salt)
+def hash_password(password: str, backend: PasswordHashBackend | None = None) -> str:
+    """Hash a password into `$<algorithm>$<params>$<salt>$<digest>` (salt and digest in unpadded base64)"""
+    backend = backend or DEFAULT_PASSWORD_HASH_BACKEND
+    salt = os.urandom(_SALT_LENGTH)
+    digest = backend.derive(password.encode(_ENCODING), salt)
+
+    return f'${backend.algorithm}${backend.encode_params()}${_b64encode(salt)}${_b64encode(digest)}'
+
+
+def check_password(password: str, hashed_password: str, backend: PasswordHashBackend | None = None) -> PasswordCheck:
+    """Verify a password, and report whether its hash was made with other parameters than `backend`"""
+    backend = backend or DEFAULT_PASSWORD_HASH_BACKEND
 
-    return f'{random_salt}{hashed_password}'
+    if not hashed_password.startswith('$'):
+        if len(hashed_password) != _LEGACY_HASH_LENGTH:
+            return PasswordCheck(is_valid=False)
+        salt = hashed_password[:_LEGACY_SALT_HEX_LENGTH]
+        is_valid = hmac.compare_digest(f'{salt}{_legacy_hash(password, salt)}', hashed_password)
+        return PasswordCheck(is_valid=is_valid, needs_rehash=is_valid)
 
+    try:
+        _, algorithm, params, salt, digest = hashed_password.split('$')
+        stored_backend = _BACKENDS[PasswordHashAlgorithm(algorithm)].from_params(
+            dict(param.split('=', 1) for param in params.split(','))
+        )
+        expected = _b64decode(digest)
+        actual = stored_backend.derive(password.encode(_ENCODING), _b64decode(salt))
+    except (ValueError, KeyError):
+        return PasswordCheck(is_valid=False)
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    hash_salt = hashed_password[:_SALT_HEX_LENGTH]
+    is_valid = hmac.compare_digest(actual, expected)
+    return PasswordCheck(is_valid=is_valid, needs_rehash=is_valid and stored_backend != backend)
 
-    new_hash = _hash(password, hash_salt)
 
-    return f'{hash_salt}{new_hash}' == hashed_password
+def verify_password(password: str, hashed_password: str, backend: PasswordHashBackend | None = None) -> bool:
+    return check_password(password, hashed_password, backend).is_valid
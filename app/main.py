@@ -1,13 +1,12 @@
 from starlette.types import ASGIApp
 
 from api.http import http_api
-from utility.decorator import singleton
-
-
-@singleton
-class HTTP_API:
-    def __init__(self, app: ASGIApp):
-        self.app = app
-
-
-http_api_app: ASGIApp = HTTP_API(http_api).app
+from api.http.dependencies.container import container
+from api.http.metrics import HttpMetrics, MetricsMiddleware
+from api.http.request_id import RequestIdMiddleware
+from config.settings import METRICS_ENABLED
+
+# outermost, so that they also see the responses of the exception handlers, the 500s included
+http_api_app: ASGIApp = RequestIdMiddleware(
+    MetricsMiddleware(http_api, container.resolve(HttpMetrics)) if METRICS_ENABLED else http_api
+)
@@ -0,0 +1,33 @@
+from collections.abc import Callable
+from typing import Protocol
+
+from core.type import IDType
+
+type InvalidationCallback = Callable[[IDType], None]
+
+
+class InvalidationBus(Protocol):
+    """Broadcasts invalidated ids to every cache sharing the bus, e.g. the caches of all workers"""
+
+    def publish(self, user_id: IDType) -> None: ...
+
+    def subscribe(self, callback: InvalidationCallback) -> None: ...
+
+    def unsubscribe(self, callback: InvalidationCallback) -> None: ...
+
+
+class LocalInvalidationBus(InvalidationBus):
+    """In-process stand-in for a shared pub/sub backend, delivering invalidations synchronously"""
+
+    def __init__(self):
+        self._subscribers: list[InvalidationCallback] = []
+
+    def publish(self, user_id: IDType) -> None:
+        for callback in list(self._subscribers):
+            callback(user_id)
+
+    def subscribe(self, callback: InvalidationCallback) -> None:
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: InvalidationCallback) -> None:
+        self._subscribers.remove(callback)
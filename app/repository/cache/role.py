@@ -0,0 +1,51 @@
+from core.model.user import Role
+from core.protocol.repository.role import RoleRepository
+from core.type import IDType
+from utility.cache import AsyncTTLCache
+
+type RoleCacheKey = tuple[str, str | IDType]
+type RoleCache = AsyncTTLCache[RoleCacheKey, Role]
+
+
+def _key_cache_key(key: str) -> RoleCacheKey:
+    return ('key', key)
+
+
+def _id_cache_key(role_id: IDType) -> RoleCacheKey:
+    return ('id', role_id)
+
+
+class CachedRoleRepository(RoleRepository):
+    """
+    RoleRepository decorator that serves lookups from a RoleCache.
+
+    The cache is meant to be shared process-wide, while the wrapped repository may be per request.
+    """
+
+    def __init__(self, repository: RoleRepository, cache: RoleCache):
+        self.repository = repository
+        self.cache = cache
+
+    def invalidate(self, role: Role) -> None:
+        """Drop a role from the cache, e.g. after it was changed or deleted"""
+        self.cache.invalidate(_key_cache_key(role.key))
+        self.cache.invalidate(_id_cache_key(role.id))
+
+    def invalidate_all(self) -> None:
+        self.cache.clear()
+
+    async def get_by_key(self, key: str) -> Role | None:
+        return await self.cache.get_or_load(_key_cache_key(key), lambda: self.repository.get_by_key(key))
+
+    async def get_by_ids(self, ids: list[IDType]) -> list[Role]:
+        if not ids:
+            return []
+
+        role_ids = {_id_cache_key(role_id): role_id for role_id in ids}
+
+        async def load(missing_keys: list[RoleCacheKey]) -> dict[RoleCacheKey, Role]:
+            roles = await self.repository.get_by_ids([role_ids[cache_key] for cache_key in missing_keys])
+            return {_id_cache_key(role.id): role for role in roles}
+
+        roles = await self.cache.get_many_or_load(role_ids, load)
+        return [role for role in roles.values() if role is not None]
@@ -0,0 +1,264 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass
+from operator import attrgetter
+
+from core.error import DuplicateError
+from core.model.user import Role, UpdateUserParams, User, UserSummary
+from core.protocol.repository.user import UserRepository
+from core.type import IDType
+
+from .invalidation import InvalidationBus
+
+_ENTRY_OVERHEAD_BYTES = 256  # entry tuple, index slots and the User instance itself
+
+
+def _approximate_size(user: User) -> int:
+    return (
+        _ENTRY_OVERHEAD_BYTES
+        + sys.getsizeof(user.username)
+        + sys.getsizeof(user.email)
+        + sys.getsizeof(user.password_hash)
+        + 8 * len(user.roles)  # roles are shared instances, only the references count
+    )
+
+
+@dataclass(frozen=True)
+class UserCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    entries: int
+    bytes: int
+
+
+@dataclass(frozen=True, slots=True)
+class _Entry:
+    user: User
+    size: int
+    expires_at: float
+
+
+class UserCache:
+    """
+    Process-wide cache of users, one entry per user reachable by id, username and email.
+
+    Entries are evicted least recently used first once either `max_entries` or `max_bytes` is exceeded.
+    Invalidations are published on `bus` (if any) so that caches of other workers drop the user too.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl: float,
+        bus: InvalidationBus | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bus = bus
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[IDType, _Entry] = OrderedDict()
+        self._by_username: dict[str, IDType] = {}
+        self._by_email: dict[str, IDType] = {}
+        self._bytes = 0
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        if bus is not None:
+            bus.subscribe(self._drop)
+
+    def stats(self) -> UserCacheStats:
+        return UserCacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            invalidations=self.invalidations,
+            entries=len(self._entries),
+            bytes=self._bytes,
+        )
+
+    @property
+    def generation(self) -> int:
+        """Changes on every invalidation, see `put`"""
+        return self._generation
+
+    def _lookup(self, user_id: IDType | None, matches: Callable[[User], bool]) -> User | None:
+        with self._lock:
+            entry = self._entries.get(user_id) if user_id is not None else None
+            if entry is None or not matches(entry.user):
+                self.misses += 1
+                return None
+            if entry.expires_at <= self._clock():
+                self._remove(entry.user.id)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(entry.user.id)
+            self.hits += 1
+            return entry.user
+
+    def get_by_id(self, user_id: IDType) -> User | None:
+        return self._lookup(user_id, lambda _: True)
+
+    def get_by_username(self, username: str) -> User | None:
+        return self._lookup(self._by_username.get(username), lambda user: user.username == username)
+
+    def get_by_email(self, email: str) -> User | None:
+        return self._lookup(self._by_email.get(email), lambda user: user.email == email)
+
+    def put(self, user: User, generation: int | None = None) -> None:
+        """
+        Cache `user`. A `generation` taken before the user was read from the repository makes the put
+        a no-op if an invalidation happened in between, so a slow read never resurrects stale data.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+
+            self._remove(user.id)
+            entry = _Entry(user=user, size=_approximate_size(user), expires_at=self._clock() + self.ttl)
+            self._entries[user.id] = entry
+            self._by_username[user.username] = user.id
+            self._by_email[user.email] = user.id
+            self._bytes += entry.size
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, user_id: IDType) -> None:
+        """Drop a user from this cache and from every other cache on the bus"""
+        self._drop(user_id)
+        if self.bus is not None:
+            self.bus.publish(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_username.clear()
+            self._by_email.clear()
+            self._bytes = 0
+
+    def close(self) -> None:
+        if self.bus is not None:
+            self.bus.unsubscribe(self._drop)
+
+    def _drop(self, user_id: IDType) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._remove(user_id)
+
+    def _remove(self, user_id: IDType) -> None:
+        """Remove an entry and its index keys, the caller holds the lock"""
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+
+        self._bytes -= entry.size
+        if self._by_username.get(entry.user.username) == user_id:
+            del self._by_username[entry.user.username]
+        if self._by_email.get(entry.user.email) == user_id:
+            del self._by_email[entry.user.email]
+
+
+class CachedUserRepository(UserRepository):
+    """
+    Read-through UserRepository decorator backed by a UserCache.
+
+    Single-user reads are served from the cache, list reads go straight to the wrapped repository,
+    and every write invalidates the user in all caches sharing the invalidation bus.
+    """
+
+    def __init__(self, repository: UserRepository, cache: UserCache):
+        self.repository = repository
+        self.cache = cache
+
+    async def create(self, user: User) -> User:
+        generation = self.cache.generation
+        created_user = await self.repository.create(user)
+        self.cache.put(created_user, generation)
+        return created_user
+
+    async def create_many(self, users: list[User]) -> list[User | DuplicateError]:
+        # not cached on the way in, a bulk import would only evict the users that are actually being read
+        return await self.repository.create_many(users)
+
+    async def get_all(self, after_id: IDType | None = None, limit: int | None = None) -> list[User]:
+        return await self.repository.get_all(after_id=after_id, limit=limit)
+
+    async def get_all_summaries(self, after_id: IDType | None = None, limit: int | None = None) -> list[UserSummary]:
+        return await self.repository.get_all_summaries(after_id=after_id, limit=limit)
+
+    def stream_all(self, batch_size: int) -> AsyncIterator[User]:
+        return self.repository.stream_all(batch_size)
+
+    async def get_by_id(self, user_id: IDType) -> User | None:
+        user = self.cache.get_by_id(user_id)
+        if user is not None:
+            return user
+
+        generation = self.cache.generation
+        user = await self.repository.get_by_id(user_id)
+        if user is not None:
+            self.cache.put(user, generation)
+        return user
+
+    async def get_by_username_or_email(self, username: str | None, email: str | None) -> User | None:
+        by_username = self.cache.get_by_username(username) if username else None
+        by_email = self.cache.get_by_email(email) if email else None
+        # The repository answers with the match of lowest ID. Given both fields, a hit on one is only that match
+        # if the other field is cached too, or belongs to the same user; otherwise the repository is asked.
+        if by_username is not None and by_email is not None:
+            return min(by_username, by_email, key=attrgetter('id'))
+        user = by_username or by_email
+        if user is not None and (not (username and email) or (user.username, user.email) == (username, email)):
+            return user
+
+        generation = self.cache.generation
+        user = await self.repository.get_by_username_or_email(username, email)
+        if user is not None:
+            self.cache.put(user, generation)
+        return user
+
+    async def update(self, user_id: IDType, params: UpdateUserParams) -> User:
+        # invalidated rather than replaced: a concurrent update may have written after this one but finished
+        # before it, the next read caches whichever is stored
+        try:
+            return await self.repository.update(user_id, params)
+        finally:
+            self.cache.invalidate(user_id)
+
+    async def delete(self, user_id: IDType) -> None:
+        try:
+            await self.repository.delete(user_id)
+        finally:
+            self.cache.invalidate(user_id)
+
+    async def delete_many(self, user_ids: list[IDType]) -> int:
+        try:
+            return await self.repository.delete_many(user_ids)
+        finally:
+            for user_id in user_ids:
+                self.cache.invalidate(user_id)
+
+    async def add_role(self, role: Role, user_ids: list[IDType]) -> int:
+        try:
+            return await self.repository.add_role(role, user_ids)
+        finally:
+            for user_id in user_ids:
+                self.cache.invalidate(user_id)
@@ -0,0 +1,330 @@
+import gc
+import logging
+import marshal
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections.abc import Callable, Hashable, Iterator
+from contextlib import contextmanager
+from enum import IntEnum
+from pathlib import Path
+from typing import Any, BinaryIO, Protocol
+
+# Both files start with a magic, the format version and the marshal version, since marshal data is only
+# readable by the interpreter version family that wrote it. A snapshot then holds one checksummed payload,
+# the log a sequence of length-prefixed, checksummed records.
+_SNAPSHOT_MAGIC = b'PCASNAP\x00'
+_LOG_MAGIC = b'PCALOG\x00\x00'
+_FORMAT_VERSION = 1
+_FILE_HEADER = struct.Struct('<8sHH')
+_SNAPSHOT_HEADER = struct.Struct('<IQ')  # crc32 and length of the payload
+_RECORD_HEADER = struct.Struct('<II')  # length and crc32 of the record
+
+logger = logging.getLogger(__name__)
+
+
+class StoreFormatError(Exception):
+    pass
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    # loading allocates millions of objects and nothing cyclic, so the collections it would trigger are wasted
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class LogOperation(IntEnum):
+    PUT = 0
+    DELETE = 1
+    CLEAR = 2
+    META = 3
+
+
+class RowCodec[K: Hashable, V](Protocol):
+    """Conversion of rows to marshal-able values, one at a time for the log and all at once for snapshots"""
+
+    def key(self, row: V) -> K: ...
+
+    def encode_row(self, row: V) -> Any: ...
+
+    def decode_row(self, record: Any) -> V: ...
+
+    def encode_rows(self, rows: list[V]) -> Any: ...
+
+    def decode_rows(self, encoded: Any) -> list[V]: ...
+
+
+class TableStore[K: Hashable, V]:
+    """
+    Persistence of an IndexedTable as a snapshot plus an append-only log of the writes made since.
+
+    Every write is appended to `<name>.log` as it happens, and flushed to the OS: a write() call per record, made
+    under the table's lock, so that an acknowledged write survives the process (a few microseconds each). With
+    `fsync`, the log is also synced to disk, by a background thread rather than on every write: a write reaches
+    the disk within one sync of the thread, which batches the writes made during the previous one.
+
+    Every `snapshot_every` writes, the log is handed off to `<name>.log.1` and a new one started, and the table
+    (the list of its rows, copied under its lock) is written to `<name>.snapshot` by the background thread,
+    atomically through a rename, after which the previous log is removed. Only the copy and the rename of the log
+    happen on the writing thread; the background one still competes for the GIL while it encodes the rows.
+
+    Loading maps the snapshot into memory and replays the previous log, if a snapshot was interrupted, then the
+    log on top of it. Log records are idempotent (a row's full state, its removal or the table's metadata), so
+    replaying a log that a crash left behind after a newer snapshot is harmless, and a torn last record is dropped.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        name: str,
+        codec: RowCodec[K, V],
+        snapshot_every: int = 100_000,
+        fsync: bool = False,
+    ):
+        self.directory = Path(directory)
+        self.snapshot_path = self.directory / f'{name}.snapshot'
+        self.log_path = self.directory / f'{name}.log'
+        self.previous_log_path = self.directory / f'{name}.log.1'
+        self.codec = codec
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        # called for the table contents and metadata when a periodic snapshot is due
+        self.source: Callable[[], tuple[list[V], Any]] | None = None
+
+        self._meta: Any = None
+        self._log: BinaryIO | None = None
+        self._log_records = 0
+
+        # handed to the background thread under `_condition`, which also guards the swap of `_log`
+        self._condition = threading.Condition()
+        self._worker: threading.Thread | None = None
+        self._closing = False
+        self._unsynced = False
+        self._snapshot_job: tuple[list[V], Any] | None = None
+        self._writing_snapshot = False
+        self._handed_off = False  # the previous log exists, until a snapshot covers it
+
+    def load(self) -> tuple[dict[K, V], Any]:
+        """Read the snapshot and replay the log, then open the log for appending"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        with _gc_paused():
+            rows, self._meta = self._read_snapshot()
+            self._replay_log(rows, self.previous_log_path)
+            valid_length = self._replay_log(rows, self.log_path)
+
+        if valid_length:
+            self._log = open(self.log_path, 'r+b')
+            self._log.truncate(valid_length)
+            self._log.seek(valid_length)
+        else:
+            self._log = self._new_log()
+
+        self._worker = threading.Thread(target=self._run, name=f'{self.log_path.name} writer', daemon=True)
+        self._worker.start()
+        if self.previous_log_path.exists():
+            # a periodic snapshot was interrupted, fold both logs into a new one
+            self._handed_off = True
+            self.write_snapshot(list(rows.values()), self._meta)
+        return rows, self._meta
+
+    def _new_log(self) -> BinaryIO:
+        log = open(self.log_path, 'wb')
+        log.write(_FILE_HEADER.pack(_LOG_MAGIC, _FORMAT_VERSION, marshal.version))
+        log.flush()
+        return log
+
+    def _read_snapshot(self) -> tuple[dict[K, V], Any]:
+        if not self.snapshot_path.exists():
+            return {}, None
+
+        with open(self.snapshot_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                self._check_file_header(view, _SNAPSHOT_MAGIC, self.snapshot_path)
+                crc, length = _SNAPSHOT_HEADER.unpack_from(view, _FILE_HEADER.size)
+                start = _FILE_HEADER.size + _SNAPSHOT_HEADER.size
+                with view[start : start + length] as payload:
+                    if len(payload) != length or zlib.crc32(payload) != crc:
+                        raise StoreFormatError(f'{self.snapshot_path} is corrupt')
+                    meta, encoded = marshal.loads(payload)
+
+        rows = self.codec.decode_rows(encoded)
+        return dict(zip(map(self.codec.key, rows), rows, strict=True)), meta
+
+    def _replay_log(self, rows: dict[K, V], path: Path) -> int:
+        """Apply the log at `path` to `rows`, returning the length of its valid part (0 if there is no usable log)"""
+        if not path.exists() or path.stat().st_size < _FILE_HEADER.size:
+            return 0
+
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                self._check_file_header(view, _LOG_MAGIC, path)
+                offset = _FILE_HEADER.size
+                while offset + _RECORD_HEADER.size <= len(view):
+                    length, crc = _RECORD_HEADER.unpack_from(view, offset)
+                    start = offset + _RECORD_HEADER.size
+                    with view[start : start + length] as record:
+                        if len(record) != length or zlib.crc32(record) != crc:
+                            break  # torn write at the end of the log
+                        operation, value = marshal.loads(record)
+                    self._apply(rows, LogOperation(operation), value)
+                    offset = start + length
+                    self._log_records += 1
+        return offset
+
+    def _apply(self, rows: dict[K, V], operation: LogOperation, value: Any) -> None:
+        match operation:
+            case LogOperation.PUT:
+                row = self.codec.decode_row(value)
+                rows[self.codec.key(row)] = row
+            case LogOperation.DELETE:
+                rows.pop(value, None)
+            case LogOperation.CLEAR:
+                rows.clear()
+            case LogOperation.META:
+                self._meta = value
+
+    def _check_file_header(self, view: memoryview, magic: bytes, path: Path) -> None:
+        if len(view) < _FILE_HEADER.size:
+            raise StoreFormatError(f'{path} is truncated')
+        file_magic, format_version, marshal_version = _FILE_HEADER.unpack_from(view)
+        if file_magic != magic or format_version != _FORMAT_VERSION:
+            raise StoreFormatError(f'{path} is not a version {_FORMAT_VERSION} store file')
+        if marshal_version != marshal.version:
+            raise StoreFormatError(f'{path} was written with marshal version {marshal_version}, not {marshal.version}')
+
+    def put(self, row: V) -> None:
+        self._append(LogOperation.PUT, self.codec.encode_row(row))
+
+    def delete(self, key: K) -> None:
+        self._append(LogOperation.DELETE, key)
+
+    def clear(self) -> None:
+        self._append(LogOperation.CLEAR, None)
+
+    def set_meta(self, meta: Any) -> None:
+        """Record table metadata that is not part of any row, such as an ID counter"""
+        self._append(LogOperation.META, meta)
+
+    def _append(self, operation: LogOperation, value: Any) -> None:
+        if self._log is None:
+            raise RuntimeError('the store must be loaded before it is written to')
+
+        record = marshal.dumps((int(operation), value))
+        self._log.write(_RECORD_HEADER.pack(len(record), zlib.crc32(record)) + record)
+        self._flush()
+
+        self._log_records += 1
+        if self.source is not None and self._log_records >= self.snapshot_every and not self._handed_off:
+            self._hand_off(*self.source())
+
+    def _hand_off(self, rows: list[V], meta: Any) -> None:
+        """Start a new log and have the background thread snapshot `rows`, which the previous log ends with"""
+        # all under the condition, so that the background thread never duplicates the descriptor of a closed log
+        with self._condition:
+            self._log.close()
+            os.replace(self.log_path, self.previous_log_path)
+            self._log = self._new_log()
+            self._log_records = 0
+            self._handed_off = True
+            self._snapshot_job = (rows, meta)
+            self._condition.notify_all()
+
+    def write_snapshot(self, rows: list[V], meta: Any = None) -> None:
+        """Replace the snapshot with `rows` and start an empty log, once any background snapshot is done"""
+        with self._condition:
+            # a background snapshot holds older rows, it must not land after this one
+            while self._snapshot_job is not None or self._writing_snapshot:
+                self._condition.wait()
+            self._write_snapshot_file(rows, meta)
+            if self._log is not None:
+                self._log.truncate(_FILE_HEADER.size)
+                self._log.seek(_FILE_HEADER.size)
+                self._flush()
+            self._log_records = 0
+            self._drop_previous_log()
+
+    def _write_snapshot_file(self, rows: list[V], meta: Any) -> None:
+        payload = marshal.dumps((meta, self.codec.encode_rows(rows)))
+        temporary_path = self.snapshot_path.with_suffix('.snapshot.tmp')
+        with open(temporary_path, 'wb') as file:
+            file.write(_FILE_HEADER.pack(_SNAPSHOT_MAGIC, _FORMAT_VERSION, marshal.version))
+            file.write(_SNAPSHOT_HEADER.pack(zlib.crc32(payload), len(payload)))
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.snapshot_path)
+
+    def _drop_previous_log(self) -> None:
+        if self._handed_off:
+            self.previous_log_path.unlink(missing_ok=True)
+            self._handed_off = False
+
+    def _flush(self) -> None:
+        self._log.flush()
+        if self.fsync:
+            with self._condition:
+                self._unsynced = True
+                self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not (self._closing or self._unsynced or self._snapshot_job is not None):
+                    self._condition.wait()
+                # a duplicate of the log's descriptor stays valid if the log is handed off meanwhile
+                sync_fd = os.dup(self._log.fileno()) if self._unsynced and self._log is not None else None
+                self._unsynced = False
+                job, self._snapshot_job = self._snapshot_job, None
+                self._writing_snapshot = job is not None
+                closing = self._closing
+
+            if sync_fd is not None:
+                try:
+                    os.fsync(sync_fd)
+                finally:
+                    os.close(sync_fd)
+            if job is not None:
+                self._snapshot_in_background(*job)
+            elif closing and sync_fd is None:
+                return
+
+    def _snapshot_in_background(self, rows: list[V], meta: Any) -> None:
+        try:
+            if self.fsync:
+                with open(self.previous_log_path, 'rb') as previous_log:
+                    os.fsync(previous_log.fileno())
+            self._write_snapshot_file(rows, meta)
+        except Exception:
+            # the previous log is kept and replayed on load, no more periodic snapshots are taken until a
+            # synchronous one succeeds
+            logger.exception('Failed to write the snapshot %s', self.snapshot_path)
+            with self._condition:
+                self._writing_snapshot = False
+                self._condition.notify_all()
+            return
+
+        with self._condition:
+            self._drop_previous_log()
+            self._writing_snapshot = False
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """Finish the background snapshot and sync if any, and close the log"""
+        if self._worker is not None:
+            with self._condition:
+                self._closing = True
+                self._condition.notify_all()
+            self._worker.join()
+            self._worker = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
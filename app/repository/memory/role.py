@@ -1,19 +1,44 @@
+from collections.abc import Mapping
+from operator import attrgetter
+from pathlib import Path
+
 from core.constant.user import (
     DEFAULT_ROLE_KEY,
     DEFAULT_ROLE_NAME,
 )
-from core.model.user import Role
+from core.model.user import Role, intern_role
 from core.protocol.repository.role import RoleRepository
 from core.type import IDType
-from utility.decorator import singleton
+
+from .persistence import TableStore
+from .table import IndexedTable
+
+_ROLE_INDEXES = {'key': attrgetter('key')}
+
+
+class _RoleCodec:
+    key = staticmethod(attrgetter('id'))
+
+    def encode_row(self, role: Role) -> tuple:
+        return role.id, role.key, role.name
+
+    def decode_row(self, record: tuple) -> Role:
+        role_id, key, name = record
+        return intern_role(Role(key=key, name=name, id=role_id))
+
+    def encode_rows(self, roles: list[Role]) -> list[tuple]:
+        return list(map(self.encode_row, roles))
+
+    def decode_rows(self, encoded: list[tuple]) -> list[Role]:
+        return list(map(self.decode_row, encoded))
 
 
-@singleton
 class InMemoryRoleRepository(RoleRepository):
     def __init__(self):
         self.next_id_counter = 2
+        self._store: TableStore[IDType, Role] | None = None
 
-        self.data: dict[IDType, Role] = {
+        self.data = {
             IDType(1): Role(
                 id=IDType(1),
                 key=DEFAULT_ROLE_KEY,
@@ -22,10 +47,52 @@ class InMemoryRoleRepository(RoleRepository):
         }
 
     def reset(self):
+        self.close()
         self.__init__()
 
+    def persist(self, directory: str | Path, snapshot_every: int = 100_000, fsync: bool = False) -> None:
+        """Load the roles saved in `directory` (or save the current ones, if none are), and save every write there"""
+        store = TableStore(directory, 'roles', _RoleCodec(), snapshot_every=snapshot_every, fsync=fsync)
+        roles, next_id_counter = store.load()
+
+        self.close()
+        if next_id_counter is None and not roles:
+            store.write_snapshot(self.data.snapshot(), self.next_id_counter)
+        else:
+            self.data = roles
+            self.next_id_counter = max(next_id_counter or 1, max(roles, default=0) + 1)
+        store.source = lambda: (self.data.snapshot(), self.next_id_counter)
+        self.data.journal = store
+        self._store = store
+
+    def save_snapshot(self) -> None:
+        """Snapshot all roles now, instead of waiting for `snapshot_every` writes"""
+        if self._store is None:
+            raise RuntimeError('the repository is not persisted')
+        with self.data.lock:
+            self._store.write_snapshot(self.data.snapshot(), self.next_id_counter)
+
+    def close(self) -> None:
+        """Stop saving writes"""
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    @property
+    def data(self) -> IndexedTable[IDType, Role]:
+        return self._data
+
+    @data.setter
+    def data(self, roles: Mapping[IDType, Role]) -> None:
+        self._data = IndexedTable(_ROLE_INDEXES, roles)
+        if self._store is not None:
+            self._store.write_snapshot(list(self._data.values()), self.next_id_counter)
+            self._data.journal = self._store
+
     async def get_by_key(self, key: str) -> Role | None:
-        return next((role for role in self.data.values() if role.key == key), None)
+        return self.data.lookup('key', key)
 
     async def get_by_ids(self, ids: list[IDType]) -> list[Role]:
-        return [role for role in self.data.values() if role.id in ids]
+        # in ID order, as a scan of the roles would return them
+        roles = (self.data.get(role_id) for role_id in set(ids))
+        return sorted((role for role in roles if role is not None), key=attrgetter('id'))
@@ -0,0 +1,190 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Hashable, ItemsView, Iterator, KeysView, Mapping, MutableMapping, ValuesView
+from typing import Protocol
+
+
+class UniqueIndexError(ValueError):
+    def __init__(self, index: str, value: Hashable, key: Hashable):
+        super().__init__(f'{index} {value!r} is already indexed for {key!r}')
+        self.index = index
+        self.value = value
+
+
+class TableJournal[K: Hashable, V](Protocol):
+    """Receiver of every write applied to an IndexedTable, in the order they were applied"""
+
+    def put(self, row: V) -> None: ...
+
+    def delete(self, key: K) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class IndexedTable[K: Hashable, V](MutableMapping[K, V]):
+    """
+    Rows by primary key, with unique secondary hash indexes kept in sync on every write.
+
+    Each index maps the value extracted from a row by its function to the row's key, so lookups by an
+    indexed field are O(1) instead of a scan over all rows.
+
+    The keys are also kept sorted, so that `rows_after` pages through the rows in key order from a bisect
+    rather than a scan. Removed keys are only dropped from the sorted keys once they make up half of them.
+
+    Writes check the indexes and apply under `lock`, so they are atomic across threads as well as tasks.
+    Callers hold the (reentrant) lock themselves to make a read-modify-write atomic. A `journal`, if set,
+    is passed each write while the lock is still held.
+    """
+
+    def __init__(self, indexes: Mapping[str, Callable[[V], Hashable]], rows: Mapping[K, V] | None = None):
+        self.lock = threading.RLock()
+        self.journal: TableJournal[K, V] | None = None
+        self._extractors = dict(indexes)
+        self._rows: dict[K, V] = dict(rows or {})
+        self._sorted_keys: list[K] = sorted(self._rows)
+        self._removed_keys = 0  # in _sorted_keys, but no longer in _rows
+        # built in bulk rather than row by row, so that loading a large table stays fast
+        self._indexes: dict[str, dict[Hashable, K]] = {}
+        for name, extract in self._extractors.items():
+            index = dict(zip(map(extract, self._rows.values()), self._rows.keys(), strict=True))
+            if len(index) != len(self._rows):
+                raise self._duplicate_in(name)
+            self._indexes[name] = index
+
+    def _duplicate_in(self, index: str) -> UniqueIndexError:
+        seen: dict[Hashable, K] = {}
+        for key, row in self._rows.items():
+            value = self._extractors[index](row)
+            if value in seen:
+                return UniqueIndexError(index, value, seen[value])
+            seen[value] = key
+        raise AssertionError(f'no duplicate in index {index}')
+
+    def lookup(self, index: str, value: Hashable) -> V | None:
+        """Row whose `index` field equals `value`, if any"""
+        with self.lock:
+            key = self._indexes[index].get(value)
+            return None if key is None else self._rows[key]
+
+    def insert(self, key: K, row: V) -> None:
+        """Add a row only if `key` and every indexed value of `row` are free, raising KeyError or UniqueIndexError"""
+        with self.lock:
+            if key in self._rows:
+                raise KeyError(key)
+            self[key] = row
+
+    def rows_after(self, key: K | None = None, limit: int | None = None) -> list[V]:
+        """At most `limit` rows in key order, of the keys greater than `key` (all of them for None)"""
+        with self.lock:
+            keys = self._sorted_keys
+            rows = []
+            for position in range(0 if key is None else bisect_right(keys, key), len(keys)):
+                if limit is not None and len(rows) >= limit:
+                    break
+                row = self._rows.get(keys[position])
+                if row is not None:
+                    rows.append(row)
+            return rows
+
+    def snapshot(self) -> list[V]:
+        """All rows, copied at once so that they can be iterated while other threads write"""
+        with self.lock:
+            return list(self._rows.values())
+
+    def __getitem__(self, key: K) -> V:
+        return self._rows[key]
+
+    def __setitem__(self, key: K, row: V) -> None:
+        new_values = {name: extract(row) for name, extract in self._extractors.items()}
+        with self.lock:
+            for name, value in new_values.items():
+                owner = self._indexes[name].get(value, key)
+                if owner != key:
+                    raise UniqueIndexError(name, value, owner)
+
+            if key in self._rows:
+                self._unindex(key, self._rows[key])
+            else:
+                self._add_sorted_key(key)
+            self._rows[key] = row
+            for name, value in new_values.items():
+                self._indexes[name][value] = key
+            if self.journal is not None:
+                self.journal.put(row)
+
+    def __delitem__(self, key: K) -> None:
+        with self.lock:
+            row = self._rows.pop(key)
+            self._unindex(key, row)
+            self._remove_sorted_key()
+            if self.journal is not None:
+                self.journal.delete(key)
+
+    def _add_sorted_key(self, key: K) -> None:
+        keys = self._sorted_keys
+        if not keys or key > keys[-1]:
+            keys.append(key)  # new keys are usually the largest yet
+            return
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            self._removed_keys -= 1  # removed before, and still there
+        else:
+            keys.insert(position, key)
+
+    def _remove_sorted_key(self) -> None:
+        self._removed_keys += 1
+        if self._removed_keys * 2 > len(self._sorted_keys):
+            self._sorted_keys = [key for key in self._sorted_keys if key in self._rows]
+            self._removed_keys = 0
+
+    def _unindex(self, key: K, row: V) -> None:
+        for name, extract in self._extractors.items():
+            index = self._indexes[name]
+            value = extract(row)
+            if index.get(value) == key:
+                del index[value]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self._rows!r})'
+
+    # the dict views are returned as they are, the mixin versions would go through __getitem__ per row
+    def keys(self) -> KeysView[K]:
+        return self._rows.keys()
+
+    def values(self) -> ValuesView[V]:
+        return self._rows.values()
+
+    def items(self) -> ItemsView[K, V]:
+        return self._rows.items()
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        return self._rows.get(key, default)
+
+    def pop(self, key: K, *default: V | None) -> V | None:
+        with self.lock:
+            if key in self._rows:
+                row = self._rows[key]
+                del self[key]
+                return row
+            if default:
+                return default[0]
+            raise KeyError(key)
+
+    def clear(self) -> None:
+        with self.lock:
+            self._rows.clear()
+            self._sorted_keys.clear()
+            self._removed_keys = 0
+            for index in self._indexes.values():
+                index.clear()
+            if self.journal is not None:
+                self.journal.clear()
@@ -1,35 +1,201 @@
-from dataclasses import replace
+from collections import deque
+from collections.abc import AsyncIterator, Mapping
+from dataclasses import fields, replace
+from itertools import repeat
+from operator import attrgetter
+from pathlib import Path
+from typing import Any
 
-from core.model.user import User
+from core.error import DuplicateError, NotFoundError
+from core.model.user import Role, UpdateUserParams, User, UserSummary, intern_role
 from core.protocol.repository.user import UserRepository
 from core.type import IDType
-from utility.decorator import singleton
+
+from .persistence import TableStore
+from .table import IndexedTable, UniqueIndexError
+
+# mirror the unique indexes on username and email
+_USER_INDEXES = {'username': attrgetter('username'), 'email': attrgetter('email')}
+
+
+def _duplicate_error(error: UniqueIndexError) -> DuplicateError:
+    return DuplicateError(f"User with {error.index} '{error.value}' already exists", field=error.index)
+
+
+_USER_SLOTS = {field.name: User.__dict__[field.name] for field in fields(User)}
+
+
+class _UserCodec:
+    """
+    Users as tuples in the log, and as one list per field in snapshots
+
+    The columns are marshalled and rebuilt into users in C loops, and each distinct combination of roles is
+    stored once and referenced by position, so that a load is mostly spent allocating the users' strings.
+    """
+
+    key = staticmethod(attrgetter('id'))
+
+    def encode_row(self, user: User) -> tuple:
+        roles = tuple((role.id, role.key, role.name) for role in user.roles)
+        return user.id, user.username, user.email, user.password_hash, user.is_verified, roles
+
+    def decode_row(self, record: tuple) -> User:
+        user_id, username, email, password_hash, is_verified, roles = record
+        roles = tuple(intern_role(Role(key=key, name=name, id=role_id)) for role_id, key, name in roles)
+        return User(username, email, password_hash, is_verified, roles, user_id)
+
+    def encode_rows(self, users: list[User]) -> tuple:
+        role_table: list[tuple[Any, str, str]] = []
+        role_set_table: list[tuple[int, ...]] = []  # distinct combinations of positions in role_table
+        # all by id(), of the role instances and of the roles tuples, which users loaded from a snapshot share
+        role_positions: dict[int, int] = {}
+        role_sets: dict[tuple[int, ...], int] = {}
+        role_sets_by_tuple: dict[int, int] = {}
+
+        def role_set(roles: tuple[Role, ...]) -> int:
+            key = tuple(map(id, roles))
+            if key not in role_sets:
+                for role in roles:
+                    if id(role) not in role_positions:
+                        role_positions[id(role)] = len(role_table)
+                        role_table.append((role.id, role.key, role.name))
+                role_sets[key] = len(role_set_table)
+                role_set_table.append(tuple(role_positions[id(role)] for role in roles))
+            role_sets_by_tuple[id(roles)] = role_sets[key]
+            return role_sets[key]
+
+        return (
+            [user.id for user in users],
+            [user.username for user in users],
+            [user.email for user in users],
+            [user.password_hash for user in users],
+            [user.is_verified for user in users],
+            [
+                role_sets_by_tuple[id(user.roles)] if id(user.roles) in role_sets_by_tuple else role_set(user.roles)
+                for user in users
+            ],
+            role_set_table,
+            role_table,
+        )
+
+    def decode_rows(self, encoded: tuple) -> list[User]:
+        ids, usernames, emails, password_hashes, verified, user_role_sets, role_sets, role_table = encoded
+        roles = [intern_role(Role(key=key, name=name, id=role_id)) for role_id, key, name in role_table]
+        role_sets = [tuple(roles[i] for i in positions) for positions in role_sets]
+
+        # User.__init__ sets each field of the frozen dataclass through object.__setattr__, which is most of
+        # the cost of a load, so the users are allocated bare and each field column is stored through its
+        # slot descriptor in a single C loop. The columns hold exactly what __init__ would have stored.
+        users = list(map(object.__new__, repeat(User, len(ids))))
+        for name, column in (
+            ('id', ids),
+            ('username', usernames),
+            ('email', emails),
+            ('password_hash', password_hashes),
+            ('is_verified', verified),
+            ('roles', map(role_sets.__getitem__, user_role_sets)),
+        ):
+            deque(map(_USER_SLOTS[name].__set__, users, column), maxlen=0)
+        return users
 
 
-@singleton
 class InMemoryUserRepository(UserRepository):
-    """In-memory implementation of UserRepository for testing"""
+    """
+    In-memory implementation of UserRepository for testing
+
+    Safe to share between tasks and threads: every method runs its check-and-write under the table lock,
+    which is never held across an await.
+
+    `persist` makes it durable, see TableStore.
+    """
 
     def __init__(self):
         self.next_id = 1
-        self.data: dict[IDType, User] = {}
+        self._store: TableStore[IDType, User] | None = None
+        self.data = {}
 
     def reset(self):
+        self.close()
         self.__init__()
 
+    def persist(self, directory: str | Path, snapshot_every: int = 100_000, fsync: bool = False) -> None:
+        """Load the users saved in `directory` (or save the current ones, if none are), and save every write there"""
+        store = TableStore(directory, 'users', _UserCodec(), snapshot_every=snapshot_every, fsync=fsync)
+        users, next_id = store.load()
+
+        self.close()
+        if next_id is None and not users:
+            store.write_snapshot(self.data.snapshot(), self.next_id)
+        else:
+            self.data = users
+            # a snapshot taken during a create holds the ID before it was taken
+            self.next_id = max(next_id or 1, max(users, default=0) + 1)
+        store.source = lambda: (self.data.snapshot(), self.next_id)
+        self.data.journal = store
+        self._store = store
+
+    def save_snapshot(self) -> None:
+        """Snapshot all users now, instead of waiting for `snapshot_every` writes"""
+        if self._store is None:
+            raise RuntimeError('the repository is not persisted')
+        with self.data.lock:
+            self._store.write_snapshot(self.data.snapshot(), self.next_id)
+
+    def close(self) -> None:
+        """Stop saving writes"""
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    @property
+    def data(self) -> IndexedTable[IDType, User]:
+        return self._data
+
+    @data.setter
+    def data(self, users: Mapping[IDType, User]) -> None:
+        self._data = IndexedTable(_USER_INDEXES, users)
+        if self._store is not None:
+            self._store.write_snapshot(list(self._data.values()), self.next_id)
+            self._data.journal = self._store
+
     async def create(self, user: User) -> User:
         """Create a new user"""
-        user_id = IDType(self.next_id)
-        self.next_id += 1
+        with self.data.lock:
+            new_user = replace(user, id=IDType(self.next_id))
+            try:
+                # inserted only if the username and email are free, checked and written atomically
+                self.data.insert(new_user.id, new_user)
+            except UniqueIndexError as e:
+                raise _duplicate_error(e) from e
+            self.next_id += 1
+            if self._store is not None:
+                # so that the ID is not reused after a restart, even if the user is deleted
+                self._store.set_meta(self.next_id)
 
-        new_user = replace(user, id=user_id)
-
-        self.data[user_id] = new_user
         return new_user
 
-    async def get_all(self) -> list[User]:
-        """Get all users"""
-        return list(self.data.values())
+    async def create_many(self, users: list[User]) -> list[User | DuplicateError]:
+        """Create users, reporting duplicates per user instead of failing the batch"""
+        results: list[User | DuplicateError] = []
+        for user in users:
+            try:
+                results.append(await self.create(user))
+            except DuplicateError as e:
+                results.append(e)
+        return results
+
+    async def get_all(self, after_id: IDType | None = None, limit: int | None = None) -> list[User]:
+        """Get users ordered by ID, starting after `after_id` and returning at most `limit` users"""
+        return self.data.rows_after(after_id, limit)
+
+    async def get_all_summaries(self, after_id: IDType | None = None, limit: int | None = None) -> list[UserSummary]:
+        """Get user summaries ordered by ID, paginated like `get_all`"""
+        return [UserSummary.from_user(user) for user in await self.get_all(after_id=after_id, limit=limit)]
+
+    async def stream_all(self, batch_size: int) -> AsyncIterator[User]:
+        """Stream all users ordered by ID"""
+        for user in self.data.snapshot():
+            yield user
 
     async def get_by_id(self, user_id: IDType) -> User | None:
         """Get a user by ID"""
@@ -37,20 +203,49 @@ class InMemoryUserRepository(UserRepository):
 
     async def get_by_username_or_email(self, username: str | None, email: str | None) -> User | None:
         """Get a user by username or email"""
-        for user in self.data.values():
-            if (username and user.username == username) or (email and user.email == email):
-                return user
-        return None
+        users = (
+            self.data.lookup('username', username) if username else None,
+            self.data.lookup('email', email) if email else None,
+        )
+        # the first match in ID order, as a scan would find it
+        return min((user for user in users if user is not None), key=attrgetter('id'), default=None)
 
-    async def update(self, user: User) -> User:
+    async def update(self, user_id: IDType, params: UpdateUserParams) -> User:
         """Update a user"""
-        if user.id not in self.data:
-            raise ValueError(f'User with ID {user.id} not found')
+        with self.data.lock:
+            existing_user = self.data.get(user_id)
+            if not existing_user:
+                raise NotFoundError(f'User with ID {user_id} not found')
+
+            changes = params.changes(existing_user)
+            if not changes:
+                return existing_user
+
+            user = replace(existing_user, **changes)
+            try:
+                self.data[user_id] = user
+            except UniqueIndexError as e:
+                raise _duplicate_error(e) from e
 
-        self.data[user.id] = user
         return user
 
     async def delete(self, user_id: IDType) -> None:
         """Delete a user"""
-        if user_id in self.data:
-            del self.data[user_id]
+        self.data.pop(user_id, None)
+
+    async def delete_many(self, user_ids: list[IDType]) -> int:
+        """Delete users by ID, returning how many existed"""
+        with self.data.lock:
+            return sum(self.data.pop(user_id, None) is not None for user_id in set(user_ids))
+
+    async def add_role(self, role: Role, user_ids: list[IDType]) -> int:
+        """Grant a role to users by ID, returning how many did not have it yet"""
+        role = intern_role(role)
+        added = 0
+        with self.data.lock:
+            for user_id in set(user_ids):
+                user = self.data.get(user_id)
+                if user is not None and all(user_role.id != role.id for user_role in user.roles):
+                    self.data[user_id] = replace(user, roles=(*user.roles, role))
+                    added += 1
+        return added
@@ -1,26 +1,190 @@
-from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+import logging
+import time
+from contextlib import AsyncExitStack
+from itertools import count
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.future import select
+from sqlalchemy.orm import Session, SessionTransaction
 
-from config.settings import APP_NAME, DATABASE_URL
+from config.settings import (
+    APP_NAME,
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_PRE_PING_IDLE_SECONDS,
+    DATABASE_POOL_RECYCLE_SECONDS,
+    DATABASE_POOL_SIZE,
+    DATABASE_POOL_TIMEOUT_SECONDS,
+    DATABASE_REPLICA_STRATEGY,
+    DATABASE_REPLICA_URLS,
+    DATABASE_SLOW_QUERY_LOG_PARAMETER_VALUES,
+    DATABASE_SLOW_QUERY_SECONDS,
+    DATABASE_STATEMENT_CACHE_SIZE,
+    DATABASE_URL,
+)
 from core.constant.user import DEFAULT_ROLE_DESCRIPTION, DEFAULT_ROLE_KEY, DEFAULT_ROLE_NAME
+from core.enum.database import ReplicaStrategy
 
+from .instrumentation import QueryRecorder
 from .model.base import Base
 from .model.user import DbRole
+from .pool import InstrumentedAsyncAdaptedQueuePool, PoolStats, install_idle_pre_ping, pool_stats
+
+logger = logging.getLogger(__name__)
+
+# session.info key of the UnitOfWork (see session.py) that a session's connection hold time is added to
+UNIT_OF_WORK_INFO_KEY = 'unit_of_work'
+_BEGAN_AT_INFO_KEY = 'began_at'
+_STATEMENT_STARTS_INFO_KEY = 'statement_starts'
+
+
+class TimedSession(Session):
+    """Session that adds the time it held a connection to its unit of work's `hold_seconds`"""
+
+
+@event.listens_for(TimedSession, 'after_begin')
+def _on_begin(session: Session, _transaction: SessionTransaction, _connection) -> None:
+    # a connection was just checked out for the session's transaction
+    session.info.setdefault(_BEGAN_AT_INFO_KEY, time.perf_counter())
+
+
+@event.listens_for(TimedSession, 'after_transaction_end')
+def _on_transaction_end(session: Session, transaction: SessionTransaction) -> None:
+    # the end of the outermost transaction releases the connection back to the pool
+    if transaction.parent is not None:
+        return
+    began_at = session.info.pop(_BEGAN_AT_INFO_KEY, None)
+    unit_of_work = session.info.get(UNIT_OF_WORK_INFO_KEY)
+    if began_at is not None and unit_of_work is not None:
+        unit_of_work.hold_seconds += time.perf_counter() - began_at
+
+
+def install_query_recorder(engine: AsyncEngine, recorder: QueryRecorder) -> None:
+    """Record every statement `engine` runs, with its rows and time, in `recorder`"""
+
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(connection, _cursor, _statement, _parameters, _context, _executemany) -> None:
+        connection.info.setdefault(_STATEMENT_STARTS_INFO_KEY, []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(connection, cursor, statement, parameters, context, _executemany) -> None:
+        seconds = time.perf_counter() - connection.info[_STATEMENT_STARTS_INFO_KEY].pop()
+        if context is not None and context.compiled is not None:
+            # by bind name, where asyncpg's are positional, so that sensitive ones can be told apart in the log
+            parameters = context.compiled_parameters
+        # rows returned by queries, or affected by writes; asyncpg reports both from the command status
+        recorder.record(statement, parameters, max(cursor.rowcount, 0), seconds)
+
+    @event.listens_for(engine.sync_engine, 'handle_error')
+    def handle_error(context) -> None:
+        # the statement failed, after_cursor_execute will not pop its start
+        connection = context.connection
+        if connection is not None and connection.info.get(_STATEMENT_STARTS_INFO_KEY):
+            connection.info[_STATEMENT_STARTS_INFO_KEY].pop()
+
+
+# statements of every engine, per repository method and per request
+query_recorder = QueryRecorder(
+    slow_query_seconds=DATABASE_SLOW_QUERY_SECONDS,
+    log_parameter_values=DATABASE_SLOW_QUERY_LOG_PARAMETER_VALUES,
+)
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    engine = create_async_engine(
+        url,
+        echo=False,  # Set to True for SQL query logging
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_size=DATABASE_POOL_SIZE,
+        max_overflow=DATABASE_MAX_OVERFLOW,
+        pool_timeout=DATABASE_POOL_TIMEOUT_SECONDS,
+        pool_recycle=DATABASE_POOL_RECYCLE_SECONDS,
+        connect_args={
+            'server_settings': {'application_name': APP_NAME},
+            'prepared_statement_cache_size': DATABASE_STATEMENT_CACHE_SIZE,
+        },
+    )
+    install_idle_pre_ping(engine, DATABASE_POOL_PRE_PING_IDLE_SECONDS)
+    install_query_recorder(engine, query_recorder)
+    return engine
+
+
+def _create_session_maker(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        engine,
+        sync_session_class=TimedSession,
+        expire_on_commit=False,
+        autoflush=False,
+    )
 
 
 class Database:
-    def __init__(self):
-        self.engine: AsyncEngine = create_async_engine(
-            DATABASE_URL,
-            echo=False,  # Set to True for SQL query logging
-            pool_pre_ping=True,
-            connect_args={'server_settings': {'application_name': APP_NAME}},
-        )
-        self.async_session_maker = async_sessionmaker(
-            self.engine,
-            expire_on_commit=False,
-            autoflush=False,
-        )
+    """The primary database, plus optional read replicas picked per session by `replica_strategy`"""
+
+    def __init__(
+        self,
+        url: str = DATABASE_URL,
+        replica_urls: list[str] = DATABASE_REPLICA_URLS,
+        replica_strategy: ReplicaStrategy = DATABASE_REPLICA_STRATEGY,
+    ):
+        self.engine: AsyncEngine = _create_engine(url)
+        self.async_session_maker = _create_session_maker(self.engine)
+
+        self.replica_engines: list[AsyncEngine] = [_create_engine(replica_url) for replica_url in replica_urls]
+        self.replica_strategy = replica_strategy
+        self._replica_session_makers = [_create_session_maker(engine) for engine in self.replica_engines]
+        self._replica_counter = count()
+
+    @property
+    def has_replicas(self) -> bool:
+        return bool(self.replica_engines)
+
+    def _pick_replica(self) -> int:
+        if self.replica_strategy == ReplicaStrategy.LEAST_CONNECTIONS:
+            checked_out = [pool_stats(engine).checked_out for engine in self.replica_engines]
+            return checked_out.index(min(checked_out))
+
+        return next(self._replica_counter) % len(self.replica_engines)
+
+    def read_session_maker(self) -> async_sessionmaker[AsyncSession]:
+        """Session maker for read-only work: a replica if any are configured, the primary otherwise"""
+        if not self.has_replicas:
+            return self.async_session_maker
+        return self._replica_session_makers[self._pick_replica()]
+
+    async def warmup(self, connections: int) -> None:
+        """Open `connections` pooled connections per engine up front, so the first requests don't pay for connecting"""
+        # connections beyond the pool size are overflow, closed as soon as they are returned, and holding more than
+        # the pool and its overflow at once would wait for the pool timeout
+        if connections > DATABASE_POOL_SIZE:
+            logger.warning('Warming up %s connection(s) per pool, its size, not %s', DATABASE_POOL_SIZE, connections)
+            connections = DATABASE_POOL_SIZE
+        if connections <= 0:
+            return
+
+        for engine in [self.engine, *self.replica_engines]:
+            async with AsyncExitStack() as stack:
+                for _ in range(connections):
+                    await stack.enter_async_context(engine.connect())
+
+        logger.info('Database pools warmed up with %s connection(s) each', connections)
+
+    def pool_stats(self) -> PoolStats:
+        return pool_stats(self.engine)
+
+    def replica_pool_stats(self) -> list[PoolStats]:
+        return [pool_stats(engine) for engine in self.replica_engines]
+
+    def pool_stats_by_name(self) -> dict[str, PoolStats]:
+        """Stats of every pool, the primary's as `primary` and the replicas' as `replica-<index>`"""
+        return {
+            'primary': self.pool_stats(),
+            **{f'replica-{index}': stats for index, stats in enumerate(self.replica_pool_stats())},
+        }
+
+    async def dispose(self) -> None:
+        for engine in [self.engine, *self.replica_engines]:
+            await engine.dispose()
 
     async def create_all_tables(self):
         async with self.engine.begin() as conn:
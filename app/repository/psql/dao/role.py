@@ -1,21 +1,27 @@
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import noload
 
 from core.model.user import Role
 from core.protocol.repository.role import RoleRepository
 from core.type import IDType
-from utility.decorator import singleton
 
+from ..instrumentation import instrumented
 from ..model import DbRole
+from ..session import SessionProvider
 
 
-@singleton
+@instrumented
 class PsqlRoleRepository(RoleRepository):
-    def __init__(self, session: AsyncSession):
-        self.session = session
+    def __init__(self, sessions: SessionProvider):
+        self.sessions = sessions
+
+    @property
+    def read_session(self) -> AsyncSession:
+        return self.sessions.read_session
 
     async def get_by_key(self, key: str) -> Role | None:
-        result = await self.session.execute(select(DbRole).where(DbRole.key == key))
+        result = await self.read_session.execute(select(DbRole).where(DbRole.key == key).options(noload(DbRole.users)))
         db_role = result.scalar_one_or_none()
 
         return db_role.to_core() if db_role else None
@@ -24,5 +30,5 @@ class PsqlRoleRepository(RoleRepository):
         if not ids:
             return []
 
-        result = await self.session.execute(select(DbRole).where(DbRole.id.in_(ids)))
+        result = await self.read_session.execute(select(DbRole).where(DbRole.id.in_(ids)).options(noload(DbRole.users)))
         return [db_role.to_core() for db_role in result.scalars().all()]
@@ -1,97 +1,456 @@
-from sqlalchemy import delete, or_, select, update
-from sqlalchemy.exc import SQLAlchemyError
+from collections.abc import AsyncIterator
+from dataclasses import replace
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Integer,
+    MetaData,
+    Table,
+    Text,
+    any_,
+    bindparam,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, noload, selectinload
 
-from core.error import NotFoundError
-from core.model.user import User
+from config.settings import (
+    DATABASE_BULK_COPY_THRESHOLD,
+    DATABASE_BULK_INSERT_CHUNK_SIZE,
+    DATABASE_BULK_INSERT_ENABLED,
+)
+from core.error import DuplicateError, NotFoundError
+from core.model.user import Role, UpdateUserParams, User, UserSummary, intern_role
 from core.protocol.repository.user import UserRepository
 from core.type import IDType
-from utility.decorator import singleton
 
-from ..model import DbRole, DbUser
+from ..instrumentation import instrumented
+from ..model import DbRole, DbUser, user_roles
+from ..session import SessionProvider
+
+# unique indexes created by `unique=True, index=True` on DbUser, see model/user.py
+_UNIQUE_INDEX_FIELDS = {
+    'ix_end_user_username': 'username',
+    'ix_end_user_email': 'email',
+}
+
+
+def _duplicate_field(error: IntegrityError) -> str | None:
+    """Name of the unique user field violated by `error`, if any."""
+    # asyncpg reports the constraint on the driver exception that SQLAlchemy's adapted error wraps
+    driver_error = error.orig.__cause__ if error.orig is not None else None
+    constraint_name = getattr(driver_error, 'constraint_name', None)
+    if constraint_name is None:
+        constraint_name = next((name for name in _UNIQUE_INDEX_FIELDS if name in str(error.orig)), None)
+    return _UNIQUE_INDEX_FIELDS.get(constraint_name) if constraint_name else None
+
+
+def _duplicate_error(field: str | None, username: str | None, email: str | None) -> DuplicateError | None:
+    match field:
+        case 'username':
+            return DuplicateError(f"User with username '{username}' already exists", field='username')
+        case 'email':
+            return DuplicateError(f"User with email '{email}' already exists", field='email')
+        case _:
+            return None
+
+
+_USER_COLUMNS = (DbUser.id, DbUser.username, DbUser.email, DbUser.password_hash, DbUser.is_verified)
+
+
+def _id_array(ids: list[IDType]):
+    # a single array parameter (`= ANY($1)`) keeps the statement text, and so its prepared statement,
+    # the same whatever the number of IDs
+    return bindparam('ids', list(ids), type_=ARRAY(Integer))
+
+
+# Loader options for DbUser.roles, which is never loaded implicitly: lists fetch the roles of a whole page
+# in one extra IN query, single users get them joined into the same statement. Neither loads role.users.
+_LIST_WITH_ROLES = selectinload(DbUser.roles).options(noload(DbRole.users))
+_ONE_WITH_ROLES = joinedload(DbUser.roles).options(noload(DbRole.users))
 
 
-@singleton
+# staging table that large bulk inserts COPY into, it only lives as long as the transaction loading it
+_bulk_user_staging = Table(
+    'bulk_end_user',
+    MetaData(),
+    Column('ordinal', Integer, nullable=False),
+    Column('username', Text, nullable=False),
+    Column('email', Text, nullable=False),
+    Column('password_hash', Text),
+    Column('is_verified', Boolean, nullable=False),
+    prefixes=['TEMPORARY'],
+    postgresql_on_commit='DROP',
+)
+
+
+@instrumented
 class PsqlUserRepository(UserRepository):
-    def __init__(self, session: AsyncSession):
-        self.session = session
+    def __init__(self, sessions: SessionProvider):
+        """Built once per process, each call runs on the sessions of the current unit of work. Read-only
+        methods use `read_session`, which is on a read replica only for units of work that do not write,
+        so that reads never miss the unit's own writes."""
+        self.sessions = sessions
+
+    @property
+    def session(self) -> AsyncSession:
+        return self.sessions.session
+
+    @property
+    def read_session(self) -> AsyncSession:
+        return self.sessions.read_session
 
     async def create(self, user: User) -> User:
-        role_ids = [role.id for role in user.roles]
-        result = await self.session.execute(select(DbRole).where(DbRole.id.in_(role_ids)))
-        db_roles = result.scalars().all()
-
-        new_db_user = DbUser(
-            username=user.username,
-            email=user.email,
-            password_hash=user.password_hash,
-            is_verified=user.is_verified,
-            roles=db_roles,
+        # One statement: the user insert and its user_roles rows are chained through data-modifying CTEs,
+        # and uniqueness is left to the unique indexes instead of a prior lookup.
+        new_user = (
+            insert(DbUser)
+            .values(
+                username=user.username,
+                email=user.email,
+                password_hash=user.password_hash,
+                is_verified=user.is_verified,
+            )
+            .returning(DbUser.id)
+            .cte('new_user')
+        )
+        new_user_roles = (
+            insert(user_roles)
+            .from_select(
+                ['user_id', 'role_id'],
+                # joined on the role ids, so that only existing roles are linked, rather than a cartesian product
+                select(new_user.c.id, DbRole.id).select_from(
+                    new_user.join(DbRole, DbRole.id.in_([role.id for role in user.roles]))
+                ),
+            )
+            .cte('new_user_roles')
         )
 
         try:
-            self.session.add(new_db_user)
+            result = await self.session.execute(select(new_user.c.id).add_cte(new_user_roles))
+            user_id = result.scalar_one()
             await self.session.commit()
-            await self.session.refresh(new_db_user)
-            return new_db_user.to_core()
+        except IntegrityError as e:
+            await self.session.rollback()
+            duplicate_error = _duplicate_error(_duplicate_field(e), user.username, user.email)
+            if duplicate_error:
+                raise duplicate_error from e
+            raise
         except SQLAlchemyError:
             await self.session.rollback()
             raise
 
-    async def get_all(self) -> list[User]:
-        result = await self.session.execute(select(DbUser))
+        return replace(user, id=user_id)
+
+    async def create_many(self, users: list[User]) -> list[User | DuplicateError]:
+        if not DATABASE_BULK_INSERT_ENABLED:
+            return await self._create_one_by_one(users)
+
+        # Users are written in chunks of one transaction each, as multi-row INSERTs or, for large batches,
+        # through COPY. Conflicting rows are skipped by ON CONFLICT DO NOTHING and reported per user
+        # instead of failing the whole batch.
+        results: list[User | DuplicateError | None] = [None] * len(users)
+
+        # duplicates within the batch itself are settled up front, so every row sent has a unique username
+        pending: list[tuple[int, User]] = []
+        seen_usernames: set[str] = set()
+        seen_emails: set[str] = set()
+        for index, user in enumerate(users):
+            if user.username in seen_usernames:
+                results[index] = _duplicate_error('username', user.username, user.email)
+            elif user.email in seen_emails:
+                results[index] = _duplicate_error('email', user.username, user.email)
+            else:
+                seen_usernames.add(user.username)
+                seen_emails.add(user.email)
+                pending.append((index, user))
+
+        insert_chunk = self._copy_users if len(users) >= DATABASE_BULK_COPY_THRESHOLD else self._insert_users
+        for start in range(0, len(pending), DATABASE_BULK_INSERT_CHUNK_SIZE):
+            chunk = pending[start : start + DATABASE_BULK_INSERT_CHUNK_SIZE]
+            chunk_users = [user for _, user in chunk]
+            try:
+                user_ids = await insert_chunk(chunk_users)
+                await self._insert_user_roles(chunk_users, user_ids)
+                duplicate_errors = await self._find_duplicate_errors(
+                    [user for user in chunk_users if user.username not in user_ids]
+                )
+                await self.session.commit()
+            except SQLAlchemyError:
+                await self.session.rollback()
+                raise
+
+            for index, user in chunk:
+                user_id = user_ids.get(user.username)
+                results[index] = replace(user, id=user_id) if user_id is not None else duplicate_errors[user.username]
+
+        return results
+
+    async def _create_one_by_one(self, users: list[User]) -> list[User | DuplicateError]:
+        results: list[User | DuplicateError] = []
+        for user in users:
+            try:
+                results.append(await self.create(user))
+            except DuplicateError as e:
+                results.append(e)
+        return results
+
+    async def _insert_users(self, users: list[User]) -> dict[str, IDType]:
+        """Insert `users` with one multi-row INSERT, returning the IDs of the inserted ones by username"""
+        result = await self.session.execute(
+            pg_insert(DbUser)
+            .values(
+                [
+                    {
+                        'username': user.username,
+                        'email': user.email,
+                        'password_hash': user.password_hash,
+                        'is_verified': user.is_verified,
+                    }
+                    for user in users
+                ]
+            )
+            .on_conflict_do_nothing()
+            .returning(DbUser.id, DbUser.username)
+        )
+        return {row.username: row.id for row in result}
+
+    async def _copy_users(self, users: list[User]) -> dict[str, IDType]:
+        """Insert `users` through COPY into a staging table, returning the IDs of the inserted ones by username"""
+        connection = await self.session.connection()
+        # created through SQLAlchemy so it belongs to the session's transaction, and is dropped on commit
+        await connection.run_sync(_bulk_user_staging.create)
+        driver_connection = (await connection.get_raw_connection()).driver_connection
+        await driver_connection.copy_records_to_table(
+            _bulk_user_staging.name,
+            records=[
+                (ordinal, user.username, user.email, user.password_hash, user.is_verified)
+                for ordinal, user in enumerate(users)
+            ],
+            columns=[column.name for column in _bulk_user_staging.columns],
+        )
+
+        staged = _bulk_user_staging.c
+        result = await self.session.execute(
+            pg_insert(DbUser)
+            .from_select(
+                ['username', 'email', 'password_hash', 'is_verified'],
+                select(staged.username, staged.email, staged.password_hash, staged.is_verified).order_by(
+                    staged.ordinal
+                ),
+            )
+            .on_conflict_do_nothing()
+            .returning(DbUser.id, DbUser.username)
+        )
+        return {row.username: row.id for row in result}
+
+    async def _insert_user_roles(self, users: list[User], user_ids: dict[str, IDType]) -> None:
+        rows = [
+            {'user_id': user_ids[user.username], 'role_id': role.id}
+            for user in users
+            if user.username in user_ids
+            for role in user.roles
+        ]
+        if rows:
+            await self.session.execute(insert(user_roles), rows)
+
+    async def _find_duplicate_errors(self, users: list[User]) -> dict[str, DuplicateError]:
+        """Tell, for users skipped by a bulk insert, which of their unique fields is already taken"""
+        if not users:
+            return {}
+
+        result = await self.session.execute(
+            select(DbUser.username, DbUser.email).where(
+                or_(
+                    DbUser.username.in_([user.username for user in users]),
+                    DbUser.email.in_([user.email for user in users]),
+                )
+            )
+        )
+        taken_usernames: set[str] = set()
+        taken_emails: set[str] = set()
+        for row in result:
+            taken_usernames.add(row.username)
+            taken_emails.add(row.email)
+
+        duplicate_errors = {}
+        for user in users:
+            field = 'username' if user.username in taken_usernames else 'email' if user.email in taken_emails else None
+            duplicate_errors[user.username] = _duplicate_error(field, user.username, user.email) or DuplicateError(
+                f"User with username '{user.username}' or email '{user.email}' already exists"
+            )
+        return duplicate_errors
+
+    async def get_all(self, after_id: IDType | None = None, limit: int | None = None) -> list[User]:
+        query = select(DbUser).options(_LIST_WITH_ROLES).order_by(DbUser.id)
+        if after_id is not None:
+            query = query.where(DbUser.id > after_id)
+        if limit is not None:
+            query = query.limit(limit)
+
+        result = await self.read_session.execute(query)
         return [db_user.to_core() for db_user in result.scalars().all()]
 
+    async def get_all_summaries(self, after_id: IDType | None = None, limit: int | None = None) -> list[UserSummary]:
+        # Core select of the summary columns of end_user only: rows skip the ORM identity map and the user
+        # dataclass, and no roles are joined since the list does not show them.
+        query = select(DbUser.id, DbUser.username, DbUser.email, DbUser.is_verified).order_by(DbUser.id)
+        if after_id is not None:
+            query = query.where(DbUser.id > after_id)
+        if limit is not None:
+            query = query.limit(limit)
+
+        result = await self.read_session.execute(query)
+        return [UserSummary._make(row) for row in result]
+
+    async def stream_all(self, batch_size: int) -> AsyncIterator[User]:
+        # server-side cursor: rows (and their roles) are fetched and converted one batch at a time
+        result = await self.read_session.stream_scalars(
+            select(DbUser).options(_LIST_WITH_ROLES).order_by(DbUser.id).execution_options(yield_per=batch_size)
+        )
+        async for db_user in result:
+            yield db_user.to_core()
+
     async def get_by_id(self, user_id: IDType) -> User | None:
-        result = await self.session.execute(select(DbUser).where(DbUser.id == user_id))
+        result = await self.read_session.execute(select(DbUser).options(_ONE_WITH_ROLES).where(DbUser.id == user_id))
 
-        db_user = result.scalar_one_or_none()
+        db_user = result.unique().scalar_one_or_none()
 
         return db_user.to_core() if db_user else None
 
     async def get_by_username_or_email(self, username: str | None, email: str | None) -> User | None:
-        result = await self.session.execute(
-            select(DbUser).where(or_(DbUser.username == username, DbUser.email == email))
+        # username and email may belong to two users, the first one in ID order is returned
+        result = await self.read_session.execute(
+            select(DbUser)
+            .options(_ONE_WITH_ROLES)
+            .where(or_(DbUser.username == username, DbUser.email == email))
+            .order_by(DbUser.id)
+            .limit(1)
         )
 
-        db_user = result.scalar_one_or_none()
+        db_user = result.unique().scalar_one_or_none()
 
         return db_user.to_core() if db_user else None
 
-    async def update(self, user: User) -> User:
-        existing_user = await self.session.execute(select(DbUser).where(DbUser.id == user.id))
-        existing_user = existing_user.scalar_one_or_none()
+    async def update(self, user_id: IDType, params: UpdateUserParams) -> User:
+        # One statement: only the changed columns are sent, the user_roles diff is applied through
+        # data-modifying CTEs, and a missing user shows up as an empty result.
+        values = params.changes()
+        values.pop('roles', None)
+        if values:
+            # set here, the update_time onupdate of the model is not applied to an UPDATE nested in a CTE
+            target_user = (
+                update(DbUser)
+                .where(DbUser.id == user_id)
+                .values(**values, update_time=func.now())
+                .returning(*_USER_COLUMNS)
+                .cte('target_user')
+            )
+        else:
+            target_user = select(*_USER_COLUMNS).where(DbUser.id == user_id).cte('target_user')
 
-        if not existing_user:
-            raise NotFoundError('User not found')
+        if params.roles is None:
+            statement = select(
+                target_user,
+                DbRole.id.label('role_id'),
+                DbRole.key.label('role_key'),
+                DbRole.name.label('role_name'),
+            ).select_from(
+                target_user.outerjoin(user_roles, user_roles.c.user_id == target_user.c.id).outerjoin(
+                    DbRole, DbRole.id == user_roles.c.role_id
+                )
+            )
+        else:
+            role_ids = [role.id for role in params.roles]
+            removed_user_roles = (
+                delete(user_roles)
+                .where(user_roles.c.user_id.in_(select(target_user.c.id)), user_roles.c.role_id.not_in(role_ids))
+                .cte('removed_user_roles')
+            )
+            added_user_roles = (
+                pg_insert(user_roles)
+                .from_select(
+                    ['user_id', 'role_id'],
+                    select(target_user.c.id, DbRole.id).select_from(target_user.join(DbRole, DbRole.id.in_(role_ids))),
+                )
+                .on_conflict_do_nothing()
+                .cte('added_user_roles')
+            )
+            statement = select(target_user).add_cte(removed_user_roles, added_user_roles)
 
-        role_ids = [role.id for role in user.roles]
-        result = await self.session.execute(select(DbRole).where(DbRole.id.in_(role_ids)))
-        db_roles = result.scalars().all()
+        try:
+            rows = (await self.session.execute(statement)).all()
+            if not rows:
+                await self.session.rollback()
+                raise NotFoundError(f'User with ID {user_id} not found')
+            await self.session.commit()
+        except IntegrityError as e:
+            await self.session.rollback()
+            duplicate_error = _duplicate_error(_duplicate_field(e), params.username, params.email)
+            if duplicate_error:
+                raise duplicate_error from e
+            raise
+        except SQLAlchemyError:
+            await self.session.rollback()
+            raise
 
-        await self.session.execute(
-            update(DbUser)
-            .where(DbUser.id == user.id)
-            .values(
-                username=user.username,
-                email=user.email,
-                password_hash=user.password_hash,
-                is_verified=user.is_verified,
+        row = rows[0]
+        roles = (
+            params.roles
+            if params.roles is not None
+            else tuple(
+                intern_role(Role(id=r.role_id, key=r.role_key, name=r.role_name)) for r in rows if r.role_id is not None
             )
         )
+        return User(
+            id=row.id,
+            username=row.username,
+            email=row.email,
+            password_hash=row.password_hash,
+            is_verified=row.is_verified,
+            roles=roles,
+        )
 
-        existing_user.roles.clear()
-        for role in db_roles:
-            existing_user.roles.append(role)
+    async def delete(self, user_id: IDType) -> None:
+        await self.session.execute(delete(DbUser).where(DbUser.id == user_id))
+        await self.session.commit()
 
+    async def delete_many(self, user_ids: list[IDType]) -> int:
         try:
+            result = await self.session.execute(delete(DbUser).where(DbUser.id == any_(_id_array(user_ids))))
             await self.session.commit()
-            await self.session.refresh(existing_user)
-            return existing_user.to_core()
         except SQLAlchemyError:
             await self.session.rollback()
             raise
+        return result.rowcount
 
-    async def delete(self, user_id: IDType) -> None:
-        await self.session.execute(delete(DbUser).where(DbUser.id == user_id))
-        await self.session.commit()
+    async def add_role(self, role: Role, user_ids: list[IDType]) -> int:
+        # the role id is a bound literal, and a missing role adds nothing instead of violating the foreign key
+        statement = (
+            pg_insert(user_roles)
+            .from_select(
+                ['user_id', 'role_id'],
+                select(DbUser.id, literal(role.id, DbRole.id.type)).where(
+                    DbUser.id == any_(_id_array(user_ids)), exists().where(DbRole.id == role.id)
+                ),
+            )
+            .on_conflict_do_nothing()
+        )
+        try:
+            result = await self.session.execute(statement)
+            await self.session.commit()
+        except SQLAlchemyError:
+            await self.session.rollback()
+            raise
+        return result.rowcount
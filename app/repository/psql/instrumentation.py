@@ -0,0 +1,158 @@
+import functools
+import inspect
+import logging
+from collections.abc import AsyncIterator, Callable, Mapping
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# operation label of statements run outside of an instrumented repository method (table creation, etc.)
+OTHER_OPERATION = '<other>'
+
+_MAX_LOGGED_PARAMETERS_LENGTH = 1000
+
+# bind parameters whose values are never logged, matched within their lowercased names (`password_hash_m0`, ...)
+_SENSITIVE_PARAMETER_MARKERS = ('password', 'hash', 'secret', 'token')
+_REDACTED = '<redacted>'
+
+
+def _is_sensitive(name: str) -> bool:
+    lowered = name.lower()
+    return any(marker in lowered for marker in _SENSITIVE_PARAMETER_MARKERS)
+
+
+def describe_parameters(parameters: Any, values: bool = False) -> str:
+    """
+    Bind parameters of a statement, for the log: their names and types, with their values if `values`
+
+    Even then, the values of sensitive parameters (passwords, hashes, secrets, tokens) are redacted, and those of
+    positional parameters left out, since there is no name to tell whether they are sensitive. Parameters of an
+    executemany are described by their count and first set.
+    """
+    if isinstance(parameters, Mapping):
+
+        def describe(name: str, value: Any) -> str:
+            if not values:
+                return type(value).__name__
+            return _REDACTED if _is_sensitive(name) else repr(value)
+
+        return '{' + ', '.join(f'{name}: {describe(name, value)}' for name, value in parameters.items()) + '}'
+    if isinstance(parameters, list | tuple):
+        if parameters and all(isinstance(each, Mapping | list | tuple) for each in parameters):
+            first = describe_parameters(parameters[0], values)
+            return first if len(parameters) == 1 else f'{len(parameters)} sets, the first {first}'
+        return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+    return type(parameters).__name__
+
+
+@dataclass(slots=True)
+class QueryStats:
+    statements: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+
+    def add(self, rows: int, seconds: float) -> None:
+        self.statements += 1
+        self.rows += rows
+        self.seconds += seconds
+
+    def server_timing(self) -> bytes:
+        """The stats as a `Server-Timing` header value, in milliseconds"""
+        return b'db;dur=%.3f;desc="%d statements, %d rows"' % (self.seconds * 1000, self.statements, self.rows)
+
+
+_operation: ContextVar[str | None] = ContextVar('repository_operation', default=None)
+_request: ContextVar[QueryStats | None] = ContextVar('request_query_stats', default=None)
+
+
+class QueryRecorder:
+    """
+    Statements, rows and time spent in the database, per repository operation and per request
+
+    Fed by the cursor events `install_query_recorder` adds to an engine. Statements are attributed to the innermost
+    repository method decorated by `instrumented` that runs them, and to the request tracked by `track_request`,
+    both found through context variables that SQLAlchemy's greenlets inherit from the task awaiting the statement.
+    Statements slower than `slow_query_seconds` are logged (None disables the log), with the names and types of
+    their parameters, and their values if `log_parameter_values`, see `describe_parameters`.
+    """
+
+    def __init__(self, slow_query_seconds: float | None = None, log_parameter_values: bool = False):
+        self.slow_query_seconds = slow_query_seconds
+        self.log_parameter_values = log_parameter_values
+        self.operations: dict[str, QueryStats] = {}
+
+    def record(self, statement: str, parameters: Any, rows: int, seconds: float) -> None:
+        operation = _operation.get() or OTHER_OPERATION
+        stats = self.operations.get(operation)
+        if stats is None:
+            stats = self.operations[operation] = QueryStats()
+        stats.add(rows, seconds)
+
+        request = _request.get()
+        if request is not None:
+            request.add(rows, seconds)
+
+        if self.slow_query_seconds is not None and seconds >= self.slow_query_seconds:
+            logged_parameters = describe_parameters(parameters, self.log_parameter_values)
+            if len(logged_parameters) > _MAX_LOGGED_PARAMETERS_LENGTH:
+                logged_parameters = logged_parameters[:_MAX_LOGGED_PARAMETERS_LENGTH] + '...'
+            logger.warning(
+                'Slow query in %s (%.1f ms, %d rows): %s parameters: %s',
+                operation,
+                seconds * 1000,
+                rows,
+                statement,
+                logged_parameters,
+            )
+
+    def track_request(self) -> tuple[QueryStats, Token]:
+        """Start counting the statements of the current request (and the tasks it spawns) in the returned stats"""
+        stats = QueryStats()
+        return stats, _request.set(stats)
+
+    def untrack_request(self, token: Token) -> None:
+        _request.reset(token)
+
+
+def _instrument_method(method: Callable, label: str) -> Callable:
+    if inspect.isasyncgenfunction(method):
+
+        @functools.wraps(method)
+        async def generator_wrapper(*args, **kwargs) -> AsyncIterator:
+            # an async generator runs in its consumer's context, so the label is set for each step only
+            iterator = method(*args, **kwargs)
+            try:
+                while True:
+                    token = _operation.set(label)
+                    try:
+                        item = await anext(iterator)
+                    except StopAsyncIteration:
+                        return
+                    finally:
+                        _operation.reset(token)
+                    yield item
+            finally:
+                await iterator.aclose()
+
+        return generator_wrapper
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = _operation.set(label)
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            _operation.reset(token)
+
+    return wrapper
+
+
+def instrumented[T: type](cls: T) -> T:
+    """Attribute the statements of each public async method of `cls` to `<class name>.<method name>`"""
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or not (inspect.iscoroutinefunction(method) or inspect.isasyncgenfunction(method)):
+            continue
+        setattr(cls, name, _instrument_method(method, f'{cls.__name__}.{name}'))
+    return cls
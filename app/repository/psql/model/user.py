@@ -1,7 +1,7 @@
 from sqlalchemy import Boolean, Column, ForeignKey, Integer, Table, Text, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from core.model.user import Role, User
+from core.model.user import Role, User, intern_role
 from core.type import IDType
 
 from .base import Base, TimestampedMixin
@@ -19,14 +19,17 @@ class DbRole(Base, TimestampedMixin):
         'DbUser',
         secondary='user_roles',
         back_populates='roles',
-        lazy='selectin',
+        # never loaded: the users of a role like the default one are a large part of the table
+        lazy='noload',
     )
 
     def to_core(self) -> Role:
-        return Role(
-            id=self.id,
-            name=self.name,
-            key=self.key,
+        return intern_role(
+            Role(
+                id=self.id,
+                name=self.name,
+                key=self.key,
+            )
         )
 
 
@@ -43,7 +46,8 @@ class DbUser(Base, TimestampedMixin):
         'DbRole',
         secondary='user_roles',
         back_populates='users',
-        lazy='selectin',
+        # loaded explicitly by the queries that need them, see dao/user.py
+        lazy='raise_on_sql',
     )
 
     def to_core(self) -> User:
@@ -53,7 +57,7 @@ class DbUser(Base, TimestampedMixin):
             email=self.email,
             password_hash=self.password_hash,
             is_verified=self.is_verified,
-            roles=[role.to_core() for role in self.roles],
+            roles=tuple(role.to_core() for role in self.roles),
         )
 
 
@@ -0,0 +1,78 @@
+import logging
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from utility.metrics import Histogram, HistogramSnapshot
+
+logger = logging.getLogger(__name__)
+
+_LAST_CHECKIN = 'last_checkin'
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long each checkout waited for a connection (including connecting)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_histogram = Histogram()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait_histogram.observe(time.perf_counter() - start)
+
+
+@dataclass(frozen=True)
+class PoolStats:
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    wait_seconds: HistogramSnapshot | None
+
+
+def pool_stats(engine: AsyncEngine) -> PoolStats:
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return PoolStats(size=0, checked_in=0, checked_out=0, overflow=0, wait_seconds=None)
+
+    return PoolStats(
+        size=pool.size(),
+        checked_in=pool.checkedin(),
+        checked_out=pool.checkedout(),
+        overflow=max(pool.overflow(), 0),
+        wait_seconds=pool.wait_histogram.snapshot() if isinstance(pool, InstrumentedAsyncAdaptedQueuePool) else None,
+    )
+
+
+def install_idle_pre_ping(engine: AsyncEngine, idle_seconds: float) -> None:
+    """
+    Validate a connection on checkout only if it sat idle in the pool for more than `idle_seconds`,
+    instead of `pool_pre_ping`'s round trip on every checkout. A failed ping makes the pool discard
+    the connection and retry with a fresh one.
+    """
+    pool = engine.sync_engine.pool
+    dialect = engine.sync_engine.dialect
+
+    @event.listens_for(pool, 'checkin')
+    def on_checkin(_dbapi_connection, connection_record):
+        connection_record.info[_LAST_CHECKIN] = time.monotonic()
+
+    @event.listens_for(pool, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, _connection_proxy):
+        last_checkin = connection_record.info.get(_LAST_CHECKIN)
+        if last_checkin is None or time.monotonic() - last_checkin <= idle_seconds:
+            return
+
+        try:
+            dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            logger.warning('Discarding idle database connection that failed a ping: %s', e)
+            raise DisconnectionError() from e
@@ -0,0 +1,107 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utility.metrics import Histogram, HistogramSnapshot
+from utility.scope import Container, Scope
+
+from .connection import UNIT_OF_WORK_INFO_KEY, Database
+
+# key of the value given to Container.scope() that makes the scope's units of work read-only
+READ_ONLY = 'read_only'
+
+
+class UnitOfWork:
+    """
+    The sessions of one task of a request (or background job), each opened on first use
+
+    Creating a session does not touch the pool: a connection is checked out on the session's first
+    statement and released when its transaction ends, on commit or rollback, or at the latest when
+    the unit of work is closed. Work that never reaches the database never takes a connection.
+    """
+
+    def __init__(self, database: Database, read_only: bool = False):
+        self.database = database
+        self.read_only = read_only
+        self.hold_seconds = 0.0  # time connections were held for, summed over the unit's sessions
+
+        self._session: AsyncSession | None = None
+        self._read_session: AsyncSession | None = None
+
+    def _open(self, session: AsyncSession) -> AsyncSession:
+        session.sync_session.info[UNIT_OF_WORK_INFO_KEY] = self
+        return session
+
+    @property
+    def session(self) -> AsyncSession:
+        """Session on the primary database"""
+        if self._session is None:
+            self._session = self._open(self.database.async_session_maker())
+        return self._session
+
+    @property
+    def read_session(self) -> AsyncSession:
+        """Session for reads: on a replica for read-only units of work, if any are configured, the primary otherwise"""
+        if not (self.read_only and self.database.has_replicas):
+            return self.session
+        if self._read_session is None:
+            self._read_session = self._open(self.database.read_session_maker()())
+        return self._read_session
+
+    @property
+    def is_open(self) -> bool:
+        return self._session is not None or self._read_session is not None
+
+    async def close(self) -> None:
+        for session in (self._session, self._read_session):
+            if session is not None:
+                await session.close()
+        self._session = self._read_session = None
+
+
+class SessionProvider:
+    """
+    Sessions of the current unit of work, for repositories built once per process
+
+    UnitOfWork is registered task-scoped in `container`: every task of a request scope gets its own (an
+    AsyncSession must not be used by concurrent tasks), and they are all closed when the scope ends.
+    """
+
+    def __init__(self, database: Database, container: Container | None = None):
+        self.database = database
+        self.container = container or Container()
+        self.hold_histogram = Histogram()  # connection hold time per unit of work, 0 if it never connected
+        self.container.register(UnitOfWork, self._open, scope=Scope.TASK, close=self._close)
+
+    def _open(self) -> UnitOfWork:
+        try:
+            read_only = bool(self.container.resolve(READ_ONLY))
+        except LookupError:
+            read_only = False
+        return UnitOfWork(self.database, read_only=read_only)
+
+    async def _close(self, unit_of_work: UnitOfWork) -> None:
+        await unit_of_work.close()
+        self.hold_histogram.observe(unit_of_work.hold_seconds)
+
+    @asynccontextmanager
+    async def scope(self, read_only: bool = False) -> AsyncIterator[UnitOfWork]:
+        """Run a request scope, whose `read_only` reads go to a read replica if any are configured"""
+        async with self.container.scope({READ_ONLY: read_only}):
+            yield self.current
+
+    @property
+    def current(self) -> UnitOfWork:
+        return self.container.resolve(UnitOfWork)
+
+    @property
+    def session(self) -> AsyncSession:
+        return self.current.session
+
+    @property
+    def read_session(self) -> AsyncSession:
+        return self.current.read_session
+
+    def hold_stats(self) -> HistogramSnapshot:
+        return self.hold_histogram.snapshot()
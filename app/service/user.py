@@ -1,62 +1,140 @@
 import logging
-from dataclasses import asdict, replace
+from collections.abc import AsyncIterator
 
 from core.constant.user import DEFAULT_ROLE_KEY
 from core.error import DuplicateError, NotFoundError
-from core.model.user import CreateUserPayload, Role, UpdateUserPayload, User
+from core.model.user import (
+    BulkCreateUserFailure,
+    BulkCreateUsersResult,
+    CreateUserPayload,
+    Role,
+    UpdateUserParams,
+    UpdateUserPayload,
+    User,
+    UserSummary,
+)
 from core.protocol.repository.role import RoleRepository
 from core.protocol.repository.user import UserRepository
 from core.type import IDType
-from core.utility.user import hash_password
+from core.utility.hasher import AsyncPasswordHasher
 
 logger = logging.getLogger(__name__)
 
 
 class UserService:
-    def __init__(self, user_repository: UserRepository, role_repository: RoleRepository):
+    def __init__(
+        self,
+        user_repository: UserRepository,
+        role_repository: RoleRepository,
+        password_hasher: AsyncPasswordHasher | None = None,
+    ):
         self.user_repository = user_repository
         self.role_repository = role_repository
+        self.password_hasher = password_hasher or AsyncPasswordHasher()
 
-    async def create_user(self, payload: CreateUserPayload) -> User:
+    async def _get_default_role(self) -> Role:
         default_role = await self.role_repository.get_by_key(DEFAULT_ROLE_KEY)
         if not default_role:
-            logger.error(f"Default role with key '{DEFAULT_ROLE_KEY}' not found in database")
+            logger.error("Default role with key '%s' not found in database", DEFAULT_ROLE_KEY)
             raise NotFoundError('Default role not found')
+        return default_role
 
-        existing_user = await self.user_repository.get_by_username_or_email(payload.username, payload.email)
-        if existing_user:
-            if existing_user.username == payload.username:
-                raise DuplicateError(f"User with username '{payload.username}' already exists")
-            else:
-                raise DuplicateError(f"User with email '{payload.email}' already exists")
+    async def create_user(self, payload: CreateUserPayload) -> User:
+        default_role = await self._get_default_role()
 
         user = User(
             username=payload.username,
             email=payload.email,
-            password_hash=hash_password(payload.password),
-            roles=[default_role],
+            password_hash=await self.password_hasher.hash(payload.password),
+            roles=(default_role,),
         )
 
         try:
+            # uniqueness of username and email is enforced by the repository, which raises DuplicateError
             return await self.user_repository.create(user)
+        except DuplicateError:
+            raise
+        except Exception as e:
+            logger.error('Failed to create user: %s', e)
+            raise
+
+    async def create_users(self, payloads: list[CreateUserPayload]) -> BulkCreateUsersResult:
+        """Create users in bulk, users whose username or email is taken are reported instead of created."""
+        default_role = await self._get_default_role()
+        password_hashes = await self.password_hasher.hash_many([payload.password for payload in payloads])
+
+        users = [
+            User(username=payload.username, email=payload.email, password_hash=password_hash, roles=(default_role,))
+            for payload, password_hash in zip(payloads, password_hashes, strict=True)
+        ]
+
+        try:
+            results = await self.user_repository.create_many(users)
+        except Exception as e:
+            logger.error('Failed to create users in bulk: %s', e)
+            raise
+
+        created: list[User] = []
+        failed: list[BulkCreateUserFailure] = []
+        for index, (payload, result) in enumerate(zip(payloads, results, strict=True)):
+            if isinstance(result, DuplicateError):
+                failed.append(
+                    BulkCreateUserFailure(
+                        index=index, username=payload.username, email=payload.email, message=str(result)
+                    )
+                )
+            else:
+                created.append(result)
+
+        return BulkCreateUsersResult(created=created, failed=failed)
+
+    async def get_all_users(self, after_id: IDType | None = None, limit: int | None = None) -> list[User]:
+        try:
+            return await self.user_repository.get_all(after_id=after_id, limit=limit)
+        except Exception as e:
+            logger.error('Failed to retrieve all users: %s', e)
+            raise
+
+    async def get_all_user_summaries(
+        self, after_id: IDType | None = None, limit: int | None = None
+    ) -> list[UserSummary]:
+        try:
+            return await self.user_repository.get_all_summaries(after_id=after_id, limit=limit)
         except Exception as e:
-            logger.error(f'Failed to create user: {str(e)}')
+            logger.error('Failed to retrieve all user summaries: %s', e)
             raise
 
-    async def get_all_users(self) -> list[User]:
+    async def stream_all_users(self, batch_size: int) -> AsyncIterator[User]:
         try:
-            return await self.user_repository.get_all()
+            async for user in self.user_repository.stream_all(batch_size):
+                yield user
         except Exception as e:
-            logger.error(f'Failed to retrieve all users: {str(e)}')
+            logger.error('Failed to stream all users: %s', e)
             raise
 
     async def get_user_by_id(self, user_id: IDType) -> User | None:
         try:
             return await self.user_repository.get_by_id(user_id)
         except Exception as e:
-            logger.error(f'Failed to retrieve user with ID {user_id}: {str(e)}')
+            logger.error('Failed to retrieve user with ID %s: %s', user_id, e)
             raise
 
+    async def verify_user_password(self, user: User, password: str) -> bool:
+        """Verify a user's password, upgrading the stored hash if it was made with outdated parameters."""
+        if not user.password_hash:
+            return False
+
+        password_check = await self.password_hasher.check(password, user.password_hash)
+        if password_check.is_valid and password_check.needs_rehash:
+            try:
+                new_password_hash = await self.password_hasher.hash(password)
+                await self.user_repository.update(user.id, UpdateUserParams(password_hash=new_password_hash))
+            except Exception as e:
+                # the password is valid either way, the upgrade is retried on the next verification
+                logger.warning('Failed to rehash password for user with ID %s: %s', user.id, e)
+
+        return password_check.is_valid
+
     async def _validate_user_exists(self, user_id: IDType) -> User:
         """Validate and return a user if it exists, otherwise raise NotFoundError."""
         existing_user = await self.user_repository.get_by_id(user_id)
@@ -64,25 +142,7 @@ class UserService:
             raise NotFoundError(f'User with ID {user_id} not found')
         return existing_user
 
-    async def _validate_unique_username(self, username: str, current_username: str) -> None:
-        """Validate that a username is unique (if changed)."""
-        if username == current_username:
-            return
-
-        duplicate = await self.user_repository.get_by_username_or_email(username, None)
-        if duplicate:
-            raise DuplicateError(f"Username '{username}' is already taken")
-
-    async def _validate_unique_email(self, email: str, current_email: str) -> None:
-        """Validate that an email is unique (if changed)."""
-        if email == current_email:
-            return
-
-        duplicate = await self.user_repository.get_by_username_or_email(None, email)
-        if duplicate:
-            raise DuplicateError(f"Email '{email}' is already registered")
-
-    async def _get_validated_roles(self, role_ids: list[IDType]) -> list:
+    async def _get_validated_roles(self, role_ids: list[IDType]) -> list[Role]:
         """Get and validate roles from role IDs."""
         if not role_ids:
             raise ValueError('User must have at least one role')
@@ -93,43 +153,45 @@ class UserService:
             found_ids = {role.id for role in roles}
             missing_ids = [str(rid) for rid in role_ids if rid not in found_ids]
 
-            logger.error(f'Role IDs not found in database: {", ".join(missing_ids)}')
+            logger.error('Role IDs not found in database: %s', ', '.join(missing_ids))
             raise NotFoundError(f'Role(s) with ID(s) {", ".join(missing_ids)} not found')
 
         return roles
 
-    async def _prepare_user_update_params(self, existing_user: User, payload: UpdateUserPayload) -> dict:
+    async def _prepare_user_update_params(self, payload: UpdateUserPayload) -> UpdateUserParams:
         """Prepare update parameters based on payload and validate when needed."""
-        update_params = {k: v for k, v in asdict(payload).items() if v is not None}
-
-        if 'username' in update_params:
-            await self._validate_unique_username(update_params['username'], existing_user.username)
-
-        if 'email' in update_params:
-            await self._validate_unique_email(update_params['email'], existing_user.email)
+        roles: list[Role] | None = None
+        if payload.role_ids is not None:
+            roles = await self._get_validated_roles(payload.role_ids)
 
-        if 'password' in update_params:
-            update_params['password_hash'] = hash_password(update_params.pop('password'))
+        password_hash: str | None = None
+        if payload.password is not None:
+            password_hash = await self.password_hasher.hash(payload.password)
 
-        roles: list[Role] = existing_user.roles
-        if 'role_ids' in update_params:
-            role_ids = update_params.pop('role_ids')
-            roles = await self._get_validated_roles(role_ids)
-            update_params['roles'] = roles
-
-        return update_params
+        return UpdateUserParams(
+            username=payload.username,
+            email=payload.email,
+            password_hash=password_hash,
+            is_verified=payload.is_verified,
+            roles=roles,
+        )
 
     async def update_user(self, user_id: IDType, payload: UpdateUserPayload) -> User:
-        existing_user = await self._validate_user_exists(user_id)
-
-        update_params = await self._prepare_user_update_params(existing_user, payload)
-
-        updated_user = replace(existing_user, **update_params)
+        update_params = await self._prepare_user_update_params(payload)
 
         try:
-            return await self.user_repository.update(updated_user)
+            # existence and uniqueness are checked by the repository as part of the update itself
+            return await self.user_repository.update(user_id, update_params)
+        except NotFoundError:
+            raise
+        except DuplicateError as e:
+            if e.field == 'username':
+                raise DuplicateError(f"Username '{payload.username}' is already taken", field=e.field) from e
+            if e.field == 'email':
+                raise DuplicateError(f"Email '{payload.email}' is already registered", field=e.field) from e
+            raise
         except Exception as e:
-            logger.error(f'Failed to update user with ID {user_id}: {str(e)}')
+            logger.error('Failed to update user with ID %s: %s', user_id, e)
             raise
 
     async def delete_user(self, user_id: IDType) -> None:
@@ -138,5 +200,25 @@ class UserService:
         try:
             await self.user_repository.delete(user_id)
         except Exception as e:
-            logger.error(f'Failed to delete user with ID {user_id}: {str(e)}')
+            logger.error('Failed to delete user with ID %s: %s', user_id, e)
+            raise
+
+    async def delete_users(self, user_ids: list[IDType]) -> int:
+        """Delete users in bulk, returning how many were deleted. IDs of missing users are ignored."""
+        try:
+            return await self.user_repository.delete_many(user_ids)
+        except Exception as e:
+            logger.error('Failed to delete users in bulk: %s', e)
+            raise
+
+    async def add_role_to_users(self, role_id: IDType, user_ids: list[IDType]) -> int:
+        """Grant a role to users in bulk, returning how many did not have it yet. IDs of missing users are ignored."""
+        roles = await self.role_repository.get_by_ids([role_id])
+        if not roles:
+            raise NotFoundError(f'Role with ID {role_id} not found')
+
+        try:
+            return await self.user_repository.add_role(roles[0], user_ids)
+        except Exception as e:
+            logger.error('Failed to add role with ID %s to users in bulk: %s', role_id, e)
             raise
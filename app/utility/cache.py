@@ -0,0 +1,173 @@
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from dataclasses import dataclass
+
+# result given to the callers waiting on a load whose own caller was cancelled, for one of them to load it again
+_ABANDONED = object()
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    loads: int
+    evictions: int
+    size: int
+
+
+class AsyncTTLCache[K: Hashable, V]:
+    """
+    Bounded LRU cache with a per-entry TTL, for values loaded by coroutines.
+
+    - `None` results are cached too (negative caching), for `negative_ttl` seconds
+    - concurrent misses on the same key share one load (single-flight); if the caller running it is cancelled,
+      a caller waiting on it runs the load again in its own task rather than being cancelled too
+    - a load that races with an invalidation is returned to its callers but not stored
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        negative_ttl: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._clock = clock
+
+        self._entries: OrderedDict[K, tuple[float, V | None]] = OrderedDict()  # key -> (expires at, value)
+        self._loading: dict[K, asyncio.Future[V | None]] = {}
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self.hits, misses=self.misses, loads=self.loads, evictions=self.evictions, size=len(self._entries)
+        )
+
+    def get(self, key: K) -> tuple[bool, V | None]:
+        """Return `(True, value)` for a live entry, `(False, None)` otherwise"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return False, None
+
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: K, value: V | None) -> None:
+        ttl = self.ttl if value is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        self._generation += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+    async def get_or_load(self, key: K, loader: Callable[[], Awaitable[V | None]]) -> V | None:
+        found, value = self.get(key)
+        if found:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        while (future := self._loading.get(key)) is not None:
+            value = await asyncio.shield(future)
+            if value is not _ABANDONED:
+                return value
+            # unless another waiter has taken the load over already, this one does
+
+        async def load_one(_: list[K]) -> dict[K, V | None]:
+            return {key: await loader()}
+
+        return (await self._load([key], load_one))[key]
+
+    async def get_many_or_load(
+        self, keys: Iterable[K], loader: Callable[[list[K]], Awaitable[dict[K, V]]]
+    ) -> dict[K, V | None]:
+        """Look up `keys` at once, loading all missing ones with a single `loader` call"""
+        results: dict[K, V | None] = {}
+        pending: dict[K, asyncio.Future[V | None]] = {}
+        missing: dict[K, None] = {}  # ordered set
+
+        for key in keys:
+            found, value = self.get(key)
+            if found:
+                self.hits += 1
+                results[key] = value
+                continue
+
+            self.misses += 1
+            if key in self._loading:
+                pending[key] = self._loading[key]
+            else:
+                missing[key] = None
+
+        if missing:
+            results.update(await self._load(list(missing), loader))
+        abandoned = []
+        for key, future in pending.items():
+            value = await asyncio.shield(future)
+            if value is _ABANDONED:
+                abandoned.append(key)
+            else:
+                results[key] = value
+        if abandoned:
+            results.update(await self.get_many_or_load(abandoned, loader))
+
+        return results
+
+    async def _load(
+        self, keys: list[K], loader: Callable[[list[K]], Awaitable[dict[K, V]] | Awaitable[dict[K, V | None]]]
+    ) -> dict[K, V | None]:
+        loop = asyncio.get_running_loop()
+        futures = {key: loop.create_future() for key in keys}
+        self._loading.update(futures)
+        generation = self._generation
+        self.loads += 1
+
+        try:
+            loaded = await loader(keys)
+        except asyncio.CancelledError:
+            # the callers waiting on the load were not cancelled, they load the keys again themselves
+            for future in futures.values():
+                future.set_result(_ABANDONED)
+            raise
+        except Exception as e:
+            for future in futures.values():
+                future.set_exception(e)
+                future.exception()  # mark as retrieved, this caller re-raises it
+            raise
+        finally:
+            for key in keys:
+                self._loading.pop(key, None)
+
+        results = {key: loaded.get(key) for key in keys}
+        for key, value in results.items():
+            futures[key].set_result(value)
+            if generation == self._generation:
+                self.set(key, value)
+
+        return results
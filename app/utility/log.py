@@ -0,0 +1,232 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable, Sequence
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+# id of the request being handled, set by the HTTP layer and attached to every record logged while handling it
+request_id: ContextVar[str | None] = ContextVar('request_id', default=None)
+
+_exception_formatter = logging.Formatter()
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to a BatchingQueueListener through a bounded queue, dropping (and counting) them when it is full
+    rather than blocking the caller
+
+    The caller only merges the message with its arguments (which may change once the call returns), formats the
+    exception if any, and reads the request id from its context, set as the record's `request_id` when there is one;
+    formatting and I/O happen on the listener's thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # a shallow copy, other handlers may still see the original; cheaper than copy.copy
+        prepared = object.__new__(logging.LogRecord)
+        prepared.__dict__.update(record.__dict__)
+        record = prepared
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        current_request_id = request_id.get()
+        if current_request_id is not None:
+            record.request_id = current_request_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class BatchingQueueListener:
+    """
+    Thread handing the records of a queue to its handlers in batches: everything that was queued while the previous
+    batch was written, up to `batch_size`, so that a burst costs one write and one flush per batch rather than per
+    record. Handlers with an `emit_batch` method get whole batches, the others one record at a time, and records
+    below a handler's level are skipped for it.
+
+    With a `dropped` count (BoundedQueueHandler.dropped), the records dropped since the last batch are reported
+    with a warning of their own.
+    """
+
+    # queued by stop(), the thread returns once it gets it
+    _STOP = object()
+
+    def __init__(
+        self,
+        log_queue: queue.Queue,
+        *handlers: logging.Handler,
+        batch_size: int = 256,
+        dropped: Callable[[], int] | None = None,
+    ):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._dropped = dropped
+        self._reported_drops = 0
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            raise RuntimeError('Listener already started')
+        self._thread = threading.Thread(target=self._run, name='log-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write out what is queued, then stop the thread"""
+        if self._thread is None:
+            return
+        # waits for room in a full queue, so that stopping never loses the stop marker
+        self.queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not self._STOP]
+            self.handle_batch(records)
+            for _ in batch:
+                self.queue.task_done()
+            if len(records) != len(batch):
+                return
+
+    def _drop_report(self) -> logging.LogRecord | None:
+        dropped = self._dropped() if self._dropped is not None else 0
+        if dropped == self._reported_drops:
+            return None
+        record = logging.LogRecord(
+            name=__name__,
+            level=logging.WARNING,
+            pathname=__file__,
+            lineno=0,
+            msg='%d log record(s) dropped, the log queue was full',
+            args=(dropped - self._reported_drops,),
+            exc_info=None,
+        )
+        self._reported_drops = dropped
+        return record
+
+    def handle_batch(self, records: list[logging.LogRecord]) -> None:
+        report = self._drop_report()
+        if report is not None:
+            records = [*records, report]
+        if not records:
+            return
+
+        for handler in self.handlers:
+            accepted = [record for record in records if record.levelno >= handler.level and handler.filter(record)]
+            if not accepted:
+                continue
+            emit_batch = getattr(handler, 'emit_batch', None)
+            if emit_batch is None:
+                for record in accepted:
+                    handler.handle(record)
+                continue
+            with handler.lock:
+                emit_batch(accepted)
+
+
+def _format_batch(handler: logging.StreamHandler, records: Sequence[logging.LogRecord]) -> str:
+    lines = []
+    for record in records:
+        try:
+            lines.append(handler.format(record) + handler.terminator)
+        except Exception:
+            handler.handleError(record)
+    return ''.join(lines)
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """StreamHandler that writes a batch of records with a single write and flush"""
+
+    def emit_batch(self, records: Sequence[logging.LogRecord]) -> None:
+        text = _format_batch(self, records)
+        try:
+            self.stream.write(text)
+            self.flush()
+        except Exception:
+            self.handleError(records[-1])
+
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """
+    Log file rotated once it would grow past `max_bytes` or every `interval` seconds, whichever comes first,
+    keeping `backup_count` rotated files (`app.log.1` the most recent). Batches are written with a single write.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, interval: float | None, backup_count: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=max(backup_count, 1), encoding='utf-8', delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval if interval else None
+
+    def _is_due(self, size: int) -> bool:
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        if self.maxBytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        position = self.stream.tell()
+        return position > 0 and position + size > self.maxBytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        return self._is_due(len(self.format(record)) + len(self.terminator))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        if self.interval:
+            self.rollover_at = time.time() + self.interval
+
+    def emit_batch(self, records: Sequence[logging.LogRecord]) -> None:
+        text = _format_batch(self, records)
+        try:
+            if self._is_due(len(text)):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(text)
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, request id, and exception or stack if any"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, UTC).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        current_request_id = getattr(record, 'request_id', None)
+        if current_request_id is not None:
+            entry['request_id'] = current_request_id
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
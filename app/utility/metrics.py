@@ -0,0 +1,42 @@
+from bisect import bisect_left
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+LATENCY_BUCKETS_SECONDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass(frozen=True)
+class HistogramSnapshot:
+    buckets: tuple[float, ...]  # upper bounds, an implicit +Inf bucket follows
+    counts: tuple[int, ...]  # per bucket (not cumulative), one more than `buckets`
+    count: int
+    sum: float
+
+    def merge(self, other: 'HistogramSnapshot') -> 'HistogramSnapshot':
+        """Sum of two snapshots with the same buckets, e.g. of two worker processes"""
+        if other.buckets != self.buckets:
+            raise ValueError('Cannot merge histograms with different buckets')
+        return HistogramSnapshot(
+            buckets=self.buckets,
+            counts=tuple(a + b for a, b in zip(self.counts, other.counts, strict=True)),
+            count=self.count + other.count,
+            sum=self.sum + other.sum,
+        )
+
+
+class Histogram:
+    """Fixed-bucket histogram; `observe` is a bisect and three increments"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_SECONDS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self._count += 1
+        self._sum += value
+
+    def snapshot(self) -> HistogramSnapshot:
+        return HistogramSnapshot(buckets=self.buckets, counts=tuple(self._counts), count=self._count, sum=self._sum)
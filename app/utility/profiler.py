@@ -0,0 +1,137 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from types import CodeType, FrameType
+
+# (file name, function) of the innermost frame of threads that are waiting rather than running: the event loop
+# in its selector, executor workers and other threads blocked on a queue or a condition
+_IDLE_LEAVES = frozenset(
+    {
+        ('selectors.py', 'select'),
+        ('thread.py', '_worker'),
+        ('threading.py', 'wait'),
+        ('queue.py', 'get'),
+    }
+)
+
+_labels: dict[CodeType, str] = {}
+
+
+def _short_path(filename: str) -> str:
+    # relative to the longest sys.path entry that contains it: `sqlalchemy/orm/session.py`, `service/user.py`
+    best = ''
+    for entry in sys.path:
+        if entry and filename.startswith(entry) and len(entry) > len(best):
+            best = entry
+    return filename[len(best) :].lstrip(os.sep).replace(os.sep, '/') if best else filename
+
+
+def _label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f'{_short_path(code.co_filename)}:{code.co_qualname}'
+    return label
+
+
+def _stack(frame: FrameType | None) -> list[str]:
+    """Labels of `frame` and its callers, outermost first"""
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _is_idle(frame: FrameType) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES
+
+
+def sample_stacks(seconds: float, interval: float = 0.005, idle: bool = False) -> Counter[str]:
+    """
+    Sample the stacks of every other thread of the process every `interval` seconds, for `seconds`
+
+    A statistical, wall-clock profiler: blocking, so run it in a thread of its own, where it costs the profiled
+    threads one `sys._current_frames()` per sample. Unless `idle`, threads caught waiting (the event loop in its
+    selector, idle executor workers) are left out, which approximates a CPU profile. Returns the number of times
+    each stack was seen, keyed by its frames from the thread down, joined by `;`.
+    """
+    sampler = threading.get_ident()
+    names: dict[int, str] = {}
+    counts: Counter[str] = Counter()
+    deadline = time.perf_counter() + seconds
+    next_sample = time.perf_counter()
+    while next_sample < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == sampler or (not idle and _is_idle(frame)):
+                continue
+            if ident not in names:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            counts[';'.join([names.get(ident, str(ident)), *_stack(frame)])] += 1
+        next_sample += interval
+        time.sleep(max(0.0, next_sample - time.perf_counter()))
+    return counts
+
+
+def collapse(counts: Mapping[str, int]) -> str:
+    """Stack counts in the collapsed format of flamegraph.pl, speedscope and most flame graph viewers"""
+    return ''.join(f'{stack} {count}\n' for stack, count in sorted(counts.items(), key=lambda item: -item[1]))
+
+
+@dataclass(frozen=True)
+class TaskInfo:
+    name: str
+    category: str
+    stack: list[str]  # the coroutines the task is suspended in, outermost first
+
+
+def _await_chain(coroutine) -> list[str]:
+    # follows what each coroutine (or generator) awaits, down to the future the innermost one is waiting on
+    stack = []
+    awaitable = coroutine
+    while awaitable is not None:
+        frame = getattr(awaitable, 'cr_frame', None) or getattr(awaitable, 'ag_frame', None)
+        frame = frame or getattr(awaitable, 'gi_frame', None)
+        if frame is not None:
+            stack.append(f'{_label(frame.f_code)}:{frame.f_lineno}')
+        awaitable = next(
+            (
+                getattr(awaitable, attribute)
+                for attribute in ('cr_await', 'ag_await', 'gi_yieldfrom')
+                if hasattr(awaitable, attribute)
+            ),
+            None,
+        )
+    return stack
+
+
+def dump_tasks(categories: Mapping[str, Sequence[str]] | None = None, other: str = 'other') -> list[TaskInfo]:
+    """
+    The pending tasks of the running loop, except the current one, with the coroutines each is suspended in
+
+    A task's category is the first of `categories` that has a marker in the label (`path/to/module.py:function`)
+    of one of its frames, searched from the innermost frame out; `other` if there is none.
+    """
+    current = asyncio.current_task()
+    tasks = []
+    for task in asyncio.all_tasks():
+        if task is current or task.done():
+            continue
+        stack = _await_chain(task.get_coro())
+        category = next(
+            (
+                name
+                for label in reversed(stack)
+                for name, markers in (categories or {}).items()
+                if any(marker in label for marker in markers)
+            ),
+            other,
+        )
+        tasks.append(TaskInfo(name=task.get_name(), category=category, stack=stack))
+    return tasks
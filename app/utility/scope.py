@@ -0,0 +1,132 @@
+import asyncio
+import inspect
+import threading
+from collections.abc import AsyncIterator, Awaitable, Callable, Hashable, Mapping
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Any
+
+
+class Scope(StrEnum):
+    PROCESS = 'process'  # one instance per container
+    REQUEST = 'request'  # one per `Container.scope()`: an HTTP request, or any other unit of work
+    TASK = 'task'  # one per asyncio task within a request scope, for state that concurrent tasks must not share
+
+
+class ScopeError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class _Provider:
+    factory: Callable[[], Any]
+    scope: Scope
+    close: Callable[[Any], Awaitable[None] | None] | None
+
+
+class _Frame:
+    """Instances created for one process or request scope, closed together when it ends"""
+
+    def __init__(self, parent: '_Frame | None' = None, values: Mapping[Hashable, Any] | None = None):
+        self.parent = parent
+        self.values = dict(values or {})
+        self.instances: dict[Hashable, Any] = {}
+        self.task_instances: dict[asyncio.Task | None, dict[Hashable, Any]] = {}
+        self.created: list[tuple[_Provider, Any]] = []
+
+    async def close(self) -> None:
+        errors: list[Exception] = []
+        for provider, instance in reversed(self.created):
+            if provider.close is None:
+                continue
+            try:
+                result = provider.close(instance)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                errors.append(e)
+        self.created.clear()
+        if errors:
+            raise errors[0]
+
+
+class Container:
+    """
+    Instances by key, each created on first use by its registered factory and shared for the lifetime of
+    its scope: the process, a request, or a task within a request.
+
+    Request scopes are entered with `scope()`, which makes the new scope current for the running task and
+    the tasks it spawns. Resolving a request- or task-scoped key outside a request scope is an error rather
+    than a silent process-wide instance.
+    """
+
+    def __init__(self):
+        self._providers: dict[Hashable, _Provider] = {}
+        self._process = _Frame()
+        self._process_lock = threading.RLock()  # factories resolve their own dependencies
+        self._current: ContextVar[_Frame | None] = ContextVar('scope', default=None)
+
+    def register[T](
+        self,
+        key: Hashable,
+        factory: Callable[[], T],
+        scope: Scope = Scope.PROCESS,
+        close: Callable[[T], Awaitable[None] | None] | None = None,
+    ) -> None:
+        """Register how to build `key`, and how to `close` each instance when its scope ends"""
+        self._providers[key] = _Provider(factory=factory, scope=scope, close=close)
+
+    def resolve(self, key: Hashable) -> Any:
+        """The instance of `key` for the current scope, or a value given to an enclosing `scope()`"""
+        frame = self._current.get()
+        provider = self._providers.get(key)
+        if provider is None:
+            while frame is not None:
+                if key in frame.values:
+                    return frame.values[key]
+                frame = frame.parent
+            raise LookupError(f'Nothing is registered for {key!r}')
+
+        if provider.scope == Scope.PROCESS:
+            instances = self._process.instances
+            if key not in instances:
+                # process instances may be resolved from other threads too, they are created only once
+                with self._process_lock:
+                    if key not in instances:
+                        self._create(self._process, instances, key, provider)
+            return instances[key]
+
+        if frame is None:
+            raise ScopeError(f'{key!r} is {provider.scope}-scoped, but no request scope is active')
+        instances = (
+            frame.instances
+            if provider.scope == Scope.REQUEST
+            else frame.task_instances.setdefault(asyncio.current_task(), {})
+        )
+        if key in instances:
+            return instances[key]
+        return self._create(frame, instances, key, provider)
+
+    def _create(self, frame: _Frame, instances: dict[Hashable, Any], key: Hashable, provider: _Provider) -> Any:
+        instance = provider.factory()
+        instances[key] = instance
+        frame.created.append((provider, instance))
+        return instance
+
+    @asynccontextmanager
+    async def scope(self, values: Mapping[Hashable, Any] | None = None) -> AsyncIterator[None]:
+        """Run a request scope, in which `values` resolve by their keys; its instances are closed on exit"""
+        frame = _Frame(parent=self._current.get(), values=values)
+        token = self._current.set(frame)
+        try:
+            yield
+        finally:
+            self._current.reset(token)
+            await frame.close()
+
+    async def aclose(self) -> None:
+        """Close the process-scoped instances, e.g. at shutdown"""
+        await self._process.close()
+        self._process.instances.clear()
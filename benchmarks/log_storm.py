@@ -0,0 +1,107 @@
+"""
+Logging cost on the calling thread during a log storm.
+
+Logs `--records` error records as fast as possible, with a traceback-free message and two arguments, through
+the previous setup (a synchronous FileHandler on the root logger) and through the queue pipeline of
+config/logger.py, and reports the latency of each call as a request handler would see it. With a queue smaller
+than the storm, the pipeline drops what it cannot keep up with instead of slowing the callers down.
+`--write-delay-ms` adds a delay to every write, as a slow or saturated disk would.
+
+    PYTHONPATH=./app python -m benchmarks.log_storm --records 100000
+"""
+
+import argparse
+import json
+import logging
+import queue
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.stats import percentile
+from utility.log import BatchingQueueListener, BatchRotatingFileHandler, BoundedQueueHandler, JsonFormatter
+
+
+class _SlowFileHandler(logging.FileHandler):
+    def __init__(self, filename: Path, delay: float):
+        super().__init__(filename)
+        self.write_delay = delay
+
+    def emit(self, record: logging.LogRecord) -> None:
+        time.sleep(self.write_delay)
+        super().emit(record)
+
+
+class _SlowRotatingFileHandler(BatchRotatingFileHandler):
+    def __init__(self, filename: Path, delay: float):
+        super().__init__(str(filename), max_bytes=64 * 1024 * 1024, interval=None, backup_count=1)
+        self.write_delay = delay
+
+    def emit_batch(self, records: list[logging.LogRecord]) -> None:
+        time.sleep(self.write_delay)
+        super().emit_batch(records)
+
+
+def _storm(logger: logging.Logger, records: int) -> dict[str, float]:
+    latencies = []
+    for i in range(records):
+        started = time.perf_counter()
+        logger.error('Failed to retrieve user with ID %s: %s', i, 'connection reset')
+        latencies.append(time.perf_counter() - started)
+    return {
+        'p50_us': percentile(latencies, 50) * 1e6,
+        'p99_us': percentile(latencies, 99) * 1e6,
+        'max_us': max(latencies) * 1e6,
+    }
+
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(f'benchmarks.log_storm.{name}')
+    logger.propagate = False
+    logger.handlers = [handler]
+    return logger
+
+
+def bench(records: int, queue_size: int, write_delay: float, directory: Path) -> dict[str, dict[str, float]]:
+    file_handler = _SlowFileHandler(directory / 'sync.log', write_delay)
+    file_handler.setFormatter(JsonFormatter())
+    synchronous = _storm(_logger('sync', file_handler), records)
+    file_handler.close()
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = BoundedQueueHandler(log_queue)
+    rotating_handler = _SlowRotatingFileHandler(directory / 'queued.log', write_delay)
+    rotating_handler.setFormatter(JsonFormatter())
+    listener = BatchingQueueListener(log_queue, rotating_handler, dropped=lambda: queue_handler.dropped)
+    listener.start()
+    queued = _storm(_logger('queued', queue_handler), records)
+    listener.stop()
+    rotating_handler.close()
+
+    return {
+        'synchronous_file': synchronous,
+        'queue_pipeline': {**queued, 'dropped': queue_handler.dropped},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=100_000, help='records logged in the storm')
+    parser.add_argument('--queue-size', type=int, default=10_000, help='size of the log queue')
+    parser.add_argument('--write-delay-ms', type=float, default=0, help='delay added to every write')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = bench(args.records, args.queue_size, args.write_delay_ms / 1000, Path(directory))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for name, result in results.items():
+        print(f'{name:<20}' + ''.join(f'{key}={value:.1f}  ' for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+In-memory repository scaling benchmark.
+
+Fills InMemoryUserRepository / InMemoryRoleRepository to each of `--sizes` and reports the mean time per
+operation of the lookups and writes that used to scan every row. With the hash indexes, times should stay
+flat as the size grows.
+
+    PYTHONPATH=./app python -m benchmarks.memory_repositories --sizes 1000 10000 100000 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections.abc import Awaitable, Callable
+
+from core.model.user import Role, UpdateUserParams, User
+from core.type import IDType
+from repository.memory.role import InMemoryRoleRepository
+from repository.memory.user import InMemoryUserRepository
+
+
+async def _mean_microseconds(operation: Callable[[int], Awaitable[object]], samples: int) -> float:
+    started = time.perf_counter()
+    for i in range(samples):
+        await operation(i)
+    return (time.perf_counter() - started) / samples * 1_000_000
+
+
+async def bench_size(size: int, samples: int) -> dict[str, float]:
+    user_repository = InMemoryUserRepository()
+    user_repository.reset()
+    role_repository = InMemoryRoleRepository()
+    role_repository.reset()
+
+    roles = [Role(id=IDType(i), key=f'role-{i}', name=f'Role {i}') for i in range(1, size // 100 + 2)]
+    role_repository.data = {role.id: role for role in roles}
+    await user_repository.create_many(
+        [User(username=f'user-{i}', email=f'user-{i}@benchmark.test', password_hash='x') for i in range(size)]
+    )
+    role_ids = [role.id for role in roles[-10:]]
+
+    return {
+        'user.create': await _mean_microseconds(
+            lambda i: user_repository.create(
+                User(username=f'new-{size}-{i}', email=f'new-{size}-{i}@benchmark.test', password_hash='x')
+            ),
+            samples,
+        ),
+        'user.get_by_username_or_email': await _mean_microseconds(
+            lambda i: user_repository.get_by_username_or_email(f'user-{size - 1 - i % size}', None), samples
+        ),
+        'user.update': await _mean_microseconds(
+            lambda i: user_repository.update(
+                IDType(size - i % size), UpdateUserParams(email=f'moved-{i}@benchmark.test')
+            ),
+            samples,
+        ),
+        'role.get_by_key': await _mean_microseconds(
+            lambda i: role_repository.get_by_key(roles[-1 - i % len(roles)].key), samples
+        ),
+        'role.get_by_ids': await _mean_microseconds(lambda _: role_repository.get_by_ids(role_ids), samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10_000, 100_000], help='users to hold')
+    parser.add_argument('--samples', type=int, default=1000, help='operations timed per size')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = {size: asyncio.run(bench_size(size, args.samples)) for size in sorted(args.sizes)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    sizes = list(results)
+    print(f'{"operation (us/op)":<32}' + ''.join(f'{size:>12}' for size in sizes))
+    for name in results[sizes[0]]:
+        print(f'{name:<32}' + ''.join(f'{results[size][name]:>12.2f}' for size in sizes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+In-memory repository cold start benchmark.
+
+Persists `--users` users with InMemoryUserRepository.persist, appends `--log-writes` creates to the write log,
+then reports the time to write the snapshot and to load it back with the log replayed, as a restarted
+process would. It exits with 1 if the load takes longer than `--max-load-seconds`, by default the one second
+a million users should load in.
+
+    PYTHONPATH=./app python -m benchmarks.memory_snapshot --users 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from core.model.user import Role, User
+from repository.memory.user import InMemoryUserRepository
+
+
+def _make_users(count: int) -> dict[int, User]:
+    roles = (Role(key='default_role', name='Default Role', id=1), Role(key='admin', name='Admin', id=2))
+    return {
+        i + 1: User(
+            username=f'user-{i}',
+            email=f'user-{i}@benchmark.test',
+            password_hash=f'$scrypt$n=16384,r=8,p=1$c2FsdHNhbHQ{i:08d}$ZGlnZXN0ZGlnZXN0ZGlnZXN0ZGlnZXN0ZGlnZXN0',
+            roles=roles[: 1 + i % 2],
+            id=i + 1,
+        )
+        for i in range(count)
+    }
+
+
+async def _log_writes(repository: InMemoryUserRepository, count: int) -> None:
+    for i in range(count):
+        await repository.create(User(username=f'new-{i}', email=f'new-{i}@benchmark.test', password_hash='x'))
+
+
+def bench(users: int, log_writes: int, directory: Path) -> dict[str, float]:
+    repository = InMemoryUserRepository()
+    repository.reset()
+    repository.data = _make_users(users)
+    repository.next_id = users + 1
+
+    started = time.perf_counter()
+    repository.persist(directory, snapshot_every=log_writes * 2 + 1)
+    snapshot_seconds = time.perf_counter() - started
+    asyncio.run(_log_writes(repository, log_writes))
+    repository.reset()
+
+    started = time.perf_counter()
+    repository.persist(directory)
+    load_seconds = time.perf_counter() - started
+    assert len(repository.data) == users + log_writes
+    repository.reset()
+
+    return {
+        'snapshot_seconds': snapshot_seconds,
+        'load_seconds': load_seconds,
+        'snapshot_mib': (directory / 'users.snapshot').stat().st_size / 2**20,
+        'log_mib': (directory / 'users.log').stat().st_size / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1_000_000, help='users in the snapshot')
+    parser.add_argument('--log-writes', type=int, default=10_000, help='creates replayed from the log')
+    parser.add_argument('--max-load-seconds', type=float, default=1.0, help='slowest accepted load')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = bench(args.users, args.log_writes, Path(directory))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, value in results.items():
+            print(f'{name:<20}{value:>10.3f}')
+
+    if results['load_seconds'] > args.max_load_seconds:
+        print(f'load took {results["load_seconds"]:.3f}s, over {args.max_load_seconds:.3f}s', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Password hashing microbenchmark.
+
+Reports hashes/sec and p50/p99 latency for each backend configuration, once for a single caller and once
+through AsyncPasswordHasher with `--workers` concurrent callers, so the cost factor can be sized against
+the expected sign-up QPS of a worker.
+
+    PYTHONPATH=./app python -m benchmarks.password_hash --samples 50 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from core.enum.executor import ExecutorType
+from core.utility.hasher import AsyncPasswordHasher
+from core.utility.user import PasswordHashBackend, Pbkdf2Sha256Backend, ScryptBackend, hash_password
+
+from .stats import summarize_latencies
+
+CONFIGURATIONS: list[PasswordHashBackend] = [
+    ScryptBackend(n=2**14, r=8, p=1),
+    ScryptBackend(n=2**15, r=8, p=1),
+    ScryptBackend(n=2**16, r=8, p=1),
+    Pbkdf2Sha256Backend(iterations=100_000),
+    Pbkdf2Sha256Backend(iterations=600_000),
+]
+
+
+def bench_sequential(backend: PasswordHashBackend, samples: int) -> dict[str, float]:
+    latencies: list[float] = []
+    started = time.perf_counter()
+    for _ in range(samples):
+        start = time.perf_counter()
+        hash_password('benchmark-password', backend)
+        latencies.append(time.perf_counter() - start)
+    return summarize_latencies(latencies, time.perf_counter() - started)
+
+
+async def bench_concurrent(
+    backend: PasswordHashBackend, samples: int, workers: int, executor_type: ExecutorType
+) -> dict[str, float]:
+    hasher = AsyncPasswordHasher(executor_type=executor_type, max_workers=workers, backend=backend)
+    latencies: list[float] = []
+
+    async def timed_hash():
+        start = time.perf_counter()
+        await hasher.hash('benchmark-password')
+        latencies.append(time.perf_counter() - start)
+
+    await hasher.hash('warmup')  # start the pool outside of the measurement
+    started = time.perf_counter()
+    await asyncio.gather(*(timed_hash() for _ in range(samples)))
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+
+    return summarize_latencies(latencies, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=30, help='hashes per configuration')
+    parser.add_argument('--workers', type=int, default=4, help='executor workers for the concurrent run')
+    parser.add_argument('--executor', type=ExecutorType, default=ExecutorType.THREAD)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    for backend in CONFIGURATIONS:
+        results.append(
+            {
+                'algorithm': str(backend.algorithm),
+                'params': backend.encode_params(),
+                'sequential': bench_sequential(backend, args.samples),
+                'concurrent': asyncio.run(bench_concurrent(backend, args.samples, args.workers, args.executor)),
+            }
+        )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f'{"configuration":<32} {"mode":<12} {"hashes/s":>10} {"p50 ms":>10} {"p99 ms":>10}')
+    for result in results:
+        for mode in ('sequential', 'concurrent'):
+            stats = result[mode]
+            name = f'{result["algorithm"]} {result["params"]}'
+            print(
+                f'{name:<32} {mode:<12} {stats["per_second"]:>10.1f} {stats["p50_ms"]:>10.2f} {stats["p99_ms"]:>10.2f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import math
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of `values`, with `p` in [0, 100]"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(latencies: Sequence[float], elapsed: float) -> dict[str, float]:
+    """Throughput and latency percentiles (in milliseconds) for `latencies` measured over `elapsed` seconds"""
+    return {
+        'count': len(latencies),
+        'per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+# metrics compared against a baseline, and whether a larger value is an improvement
+_COMPARED_METRICS = {
+    'per_second': True,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'alloc_peak_kib': False,
+    'errors': False,
+}
+# metrics where any increase is a regression, whatever the threshold
+_UNTOLERATED_METRICS = frozenset({'errors'})
+
+
+@dataclass(frozen=True)
+class Regression:
+    path: str  # keys down to the metric, e.g. `asgi/memory.get.p95_ms`
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        if not self.baseline:
+            return math.inf if self.current else 0.0
+        return self.current / self.baseline - 1
+
+
+def compare(results: Mapping, baseline: Mapping, threshold: float, path: str = '') -> list[Regression]:
+    """
+    Metrics of `results` that are worse than in `baseline` by more than `threshold` (0.1 for 10%)
+
+    Both are nested dicts of the same shape; cases or metrics found in only one of them are not compared.
+    Any increase of the `errors` of an operation is a regression.
+    """
+    regressions = []
+    for key, value in results.items():
+        if key not in baseline:
+            continue
+        key_path = f'{path}.{key}' if path else key
+        if isinstance(value, Mapping):
+            regressions.extend(compare(value, baseline[key], threshold, key_path))
+            continue
+        higher_is_better = _COMPARED_METRICS.get(key)
+        if higher_is_better is None:
+            continue
+        regression = Regression(key_path, baseline[key], value)
+        tolerance = 0 if key in _UNTOLERATED_METRICS else threshold
+        if (-regression.change if higher_is_better else regression.change) > tolerance:
+            regressions.append(regression)
+    return regressions
@@ -0,0 +1,95 @@
+"""
+User memory footprint benchmark.
+
+Reports the traced memory (tracemalloc) of `--users` users held three ways: as bare core User instances,
+in the in-memory repository and in the UserCache. Numbers are scaled to bytes per 100k users, so the
+capacity of a worker can be sized from them.
+
+    PYTHONPATH=./app python -m benchmarks.user_memory --users 100000
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+from collections.abc import Callable
+
+from core.model.user import Role, User
+from repository.cache.user import UserCache
+from repository.memory.user import InMemoryUserRepository
+
+_PER_USERS = 100_000
+
+
+def _make_users(count: int) -> list[User]:
+    # roles as a repository would return them, one shared instance per role
+    roles = (Role(key='default_role', name='Default Role', id=1), Role(key='admin', name='Admin', id=2))
+    return [
+        User(
+            username=f'user-{i}',
+            email=f'user-{i}@benchmark.test',
+            password_hash=f'$scrypt$n=16384,r=8,p=1$c2FsdHNhbHQ{i:08d}$ZGlnZXN0ZGlnZXN0ZGlnZXN0ZGlnZXN0ZGlnZXN0',
+            roles=roles[: 1 + i % 2],
+            id=i + 1,
+        )
+        for i in range(count)
+    ]
+
+
+def _traced_bytes(build: Callable[[], object]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        held = build()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del held
+    return current
+
+
+def _in_memory_repository(count: int) -> InMemoryUserRepository:
+    repository = InMemoryUserRepository()
+    repository.reset()
+    # stored directly: this measures what the repository holds, not its insertion path
+    repository.data = {user.id: user for user in _make_users(count)}
+    return repository
+
+
+def _user_cache(count: int) -> UserCache:
+    cache = UserCache(max_entries=count, max_bytes=2**40, ttl=3600)
+    for user in _make_users(count):
+        cache.put(user)
+    return cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=_PER_USERS, help='users to hold')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for name, build in (
+        ('users', lambda: _make_users(args.users)),
+        ('in_memory_repository', lambda: _in_memory_repository(args.users)),
+        ('user_cache', lambda: _user_cache(args.users)),
+    ):
+        traced = _traced_bytes(build)
+        results[name] = {
+            'bytes_per_100k_users': traced * _PER_USERS / args.users,
+            'bytes_per_user': traced / args.users,
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f'{"holder":<24}{"MiB/100k users":>16}{"B/user":>10}')
+    for name, result in results.items():
+        print(f'{name:<24}{result["bytes_per_100k_users"] / 2**20:>16.1f}{result["bytes_per_user"]:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
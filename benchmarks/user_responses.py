@@ -0,0 +1,134 @@
+"""
+User response serialization benchmark.
+
+Measures requests/sec of GET /users/{id} (single) and GET /users (list) through the ASGI app, backed by the
+in-memory repositories, once with the default response models and once with FAST_JSON_RESPONSES. Each mode
+runs in its own process since the setting is read at import. The list endpoint is served from user summaries
+in both modes, so a `serializer` section compares the two ways of serializing a page of core users on their own.
+
+    PYTHONPATH=./app python -m benchmarks.user_responses --requests 2000 --page-size 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+from pydantic import TypeAdapter
+
+from api.http import http_api
+from api.http.dependencies.user import get_user_service
+from api.http.schema.user import RetrieveUserModel
+from core.model.user import Role, User
+from main import http_api_app
+from repository.memory.role import InMemoryRoleRepository
+from repository.memory.user import InMemoryUserRepository
+from service.user import UserService
+
+from .stats import summarize_latencies
+
+
+async def bench_endpoints(requests: int, page_size: int) -> dict[str, dict[str, float]]:
+    user_repository = InMemoryUserRepository()
+    role_repository = InMemoryRoleRepository()
+    default_role = next(iter(role_repository.data.values()))
+    await user_repository.create_many(
+        [
+            User(username=f'user-{i}', email=f'user-{i}@benchmark.test', password_hash='x', roles=(default_role,))
+            for i in range(page_size)
+        ]
+    )
+
+    async def user_service():
+        yield UserService(user_repository, role_repository)
+
+    http_api.dependency_overrides[get_user_service] = user_service
+
+    results = {}
+    transport = httpx.ASGITransport(http_api_app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+        for name, url in (('single', '/users/1'), ('list', f'/users?limit={page_size}')):
+            (await client.get(url)).raise_for_status()
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(requests):
+                start = time.perf_counter()
+                await client.get(url)
+                latencies.append(time.perf_counter() - start)
+            results[name] = summarize_latencies(latencies, time.perf_counter() - started)
+    return results
+
+
+def bench_serializers(rounds: int, page_size: int) -> dict[str, dict[str, float]]:
+    role = Role(key='default_role', name='Default Role', id=1)
+    users = [
+        User(username=f'user-{i}', email=f'user-{i}@benchmark.test', password_hash='x', roles=(role,), id=i)
+        for i in range(page_size)
+    ]
+    models_adapter = TypeAdapter(list[RetrieveUserModel])
+    users_adapter = TypeAdapter(list[User])
+    fields = {'__all__': set(RetrieveUserModel.model_fields)}
+
+    def response_models() -> bytes:
+        # built by the endpoint, then validated again and dumped by FastAPI
+        models = [RetrieveUserModel.from_core(user) for user in users]
+        return models_adapter.dump_json(models_adapter.validate_python(models))
+
+    def core_users() -> bytes:
+        return users_adapter.dump_json(users, include=fields)
+
+    results = {}
+    for name, serialize in (('response_models', response_models), ('core_users', core_users)):
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(rounds):
+            start = time.perf_counter()
+            serialize()
+            latencies.append(time.perf_counter() - start)
+        results[name] = summarize_latencies(latencies, time.perf_counter() - started)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per endpoint and mode')
+    parser.add_argument('--page-size', type=int, default=100, help='users per list response')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(bench_endpoints(args.requests, args.page_size))))
+        return
+
+    results = {}
+    for mode, fast in (('response_model', 'false'), ('fast_json', 'true')):
+        child = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.user_responses', '--child', '--requests', str(args.requests)]
+            + ['--page-size', str(args.page_size)],
+            env={**os.environ, 'FAST_JSON_RESPONSES': fast},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        results[mode] = json.loads(child.stdout.splitlines()[-1])
+    results['serializer'] = bench_serializers(args.requests, args.page_size)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f'{"mode":<16}{"case":<18}{"per_second":>12}{"p50_ms":>10}{"p99_ms":>10}')
+    for mode, cases in results.items():
+        for case, result in cases.items():
+            print(
+                f'{mode:<16}{case:<18}{result["per_second"]:>12.0f}{result["p50_ms"]:>10.3f}{result["p99_ms"]:>10.3f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from api.http.error_handler import register_exception_handlers
+from api.http.router import admin
+from utility.profiler import dump_tasks, sample_stacks
+
+TOKEN = 'admin-token'
+
+
+def _busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+async def _fake_query() -> None:
+    await asyncio.sleep(10)
+
+
+async def _handle_request() -> None:
+    await _fake_query()
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch) -> httpx.AsyncClient:
+    monkeypatch.setattr(admin, 'ADMIN_TOKEN', TOKEN)
+    app = FastAPI()
+    register_exception_handlers(app)
+    app.include_router(admin.router)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url='http://test')
+
+
+class TestProfiler:
+    def test_sample_stacks(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=_busy_loop, args=(stop,), name='busy')
+        thread.start()
+        try:
+            counts = sample_stacks(0.2, interval=0.002)
+        finally:
+            stop.set()
+            thread.join()
+
+        busy = {stack: count for stack, count in counts.items() if stack.startswith('busy;')}
+        assert sum(busy.values()) > 10
+        assert all('test_admin_profiler.py:_busy_loop' in stack for stack in busy)
+
+    @pytest.mark.asyncio
+    async def test_dump_tasks(self):
+        task = asyncio.create_task(_handle_request(), name='request')
+        await asyncio.sleep(0)
+        try:
+            (info,) = [info for info in dump_tasks({'database': ('_fake_query',)}) if info.name == 'request']
+        finally:
+            task.cancel()
+
+        assert info.category == 'database'
+        functions = [frame.rsplit(':', 2)[1] for frame in info.stack]
+        assert functions == ['_handle_request', '_fake_query', 'sleep']
+
+
+class TestAdminRouter:
+    @pytest.mark.asyncio
+    async def test_requires_the_admin_token(self, client: httpx.AsyncClient):
+        async with client:
+            assert (await client.get('/admin/tasks')).status_code == 401
+            response = await client.get('/admin/tasks', headers={'Authorization': 'Bearer wrong'})
+
+        assert response.status_code == 401
+        assert response.headers['www-authenticate'] == 'Bearer'
+
+    @pytest.mark.asyncio
+    async def test_rejects_a_non_ascii_token(self, client: httpx.AsyncClient):
+        async with client:
+            response = await client.get('/admin/tasks', headers={'Authorization': 'Bearer tökén'.encode()})
+
+        assert response.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_profile_and_tasks(self, client: httpx.AsyncClient):
+        headers = {'Authorization': f'Bearer {TOKEN}'}
+        task = asyncio.create_task(_handle_request(), name='request')
+        async with client:
+            tasks = (await client.get('/admin/tasks', headers=headers)).json()
+            profile = await client.get('/admin/profile', params={'seconds': 0.1, 'idle': True}, headers=headers)
+        task.cancel()
+
+        assert tasks['summary']['other'] >= 1
+        assert any(info['name'] == 'request' for info in tasks['tasks'])
+        assert profile.status_code == 200
+        # idle stacks included: the event loop thread, waiting for the sampler in its selector
+        leaves = [line.rsplit(' ', 1)[0].rsplit(';', 1)[-1] for line in profile.text.splitlines()]
+        assert any(leaf.startswith('selectors.py:') and leaf.endswith('.select') for leaf in leaves)
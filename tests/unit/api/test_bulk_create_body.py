@@ -0,0 +1,93 @@
+import json
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from api.http.dependencies.user import get_user_service
+from api.http.error_handler import register_exception_handlers
+from api.http.router import user as user_router
+from core.utility.hasher import AsyncPasswordHasher
+from core.utility.user import Pbkdf2Sha256Backend
+from repository.memory.role import InMemoryRoleRepository
+from repository.memory.user import InMemoryUserRepository
+from service.user import UserService
+
+NDJSON_HEADERS = {'Content-Type': 'application/x-ndjson'}
+
+
+@pytest.fixture
+def client() -> httpx.AsyncClient:
+    user_repository = InMemoryUserRepository()
+    user_repository.reset()
+    role_repository = InMemoryRoleRepository()
+    role_repository.reset()
+    password_hasher = AsyncPasswordHasher(backend=Pbkdf2Sha256Backend(iterations=1000))
+
+    async def user_service():
+        yield UserService(user_repository, role_repository, password_hasher)
+
+    app = FastAPI()
+    register_exception_handlers(app)
+    app.include_router(user_router.router)
+    app.dependency_overrides[get_user_service] = user_service
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url='http://test')
+
+
+def user(i: int) -> dict[str, str]:
+    return {'username': f'user-{i}', 'email': f'user-{i}@test.com', 'password': 'password'}
+
+
+async def chunked(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+class TestBulkCreateBody:
+    @pytest.mark.asyncio
+    async def test_ndjson_lines_split_across_chunks(self, client: httpx.AsyncClient):
+        body = b'\n'.join(json.dumps(user(i)).encode() for i in range(5)) + b'\n\n'
+
+        async with client:
+            response = await client.post('/users/bulk', content=chunked(body, 7), headers=NDJSON_HEADERS)
+
+        assert response.status_code == 200
+        assert [created['username'] for created in response.json()['created']] == [f'user-{i}' for i in range(5)]
+
+    @pytest.mark.asyncio
+    async def test_long_ndjson_line_is_read_in_linear_time(
+        self, client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch
+    ):
+        lines = []
+
+        async def collect(request):
+            async for line in user_router._read_ndjson_lines(request):
+                lines.append(line)
+            return []
+
+        monkeypatch.setattr(user_router, '_read_create_user_requests', collect)
+        line = b'x' * 8 * 1024 * 1024
+
+        started = time.perf_counter()
+        async with client:
+            await client.post('/users/bulk', content=chunked(line + b'\nend', 1024), headers=NDJSON_HEADERS)
+
+        # scanning the whole pending line for each of the 8192 chunks takes minutes
+        assert time.perf_counter() - started < 5
+        assert lines == [line, b'end']
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('headers', [{}, NDJSON_HEADERS])
+    async def test_oversized_body_is_rejected(
+        self, client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch, headers: dict[str, str]
+    ):
+        monkeypatch.setattr(user_router, 'USER_BULK_CREATE_MAX_BYTES', 100)
+        body = json.dumps([user(i) for i in range(5)]).encode()
+
+        async with client:
+            with_length = await client.post('/users/bulk', content=body, headers=headers)
+            without_length = await client.post('/users/bulk', content=chunked(body, 16), headers=headers)
+
+        assert with_length.status_code == 413
+        assert without_length.status_code == 413
@@ -0,0 +1,74 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from api.http.dependencies.user import get_user_service
+from api.http.error_handler import register_exception_handlers
+from api.http.router import user as user_router
+from core.utility.hasher import AsyncPasswordHasher
+from core.utility.user import Pbkdf2Sha256Backend
+from repository.memory.role import InMemoryRoleRepository
+from repository.memory.user import InMemoryUserRepository
+from service.user import UserService
+
+USERS = [
+    {'username': 'alice', 'email': 'alice@test.com', 'password': 'password'},
+    {'username': 'bob', 'email': 'bob@test.com', 'password': 'password'},
+    {'username': 'alice', 'email': 'alice-again@test.com', 'password': 'password'},
+]
+
+
+def _client() -> httpx.AsyncClient:
+    user_repository = InMemoryUserRepository()
+    user_repository.reset()
+    role_repository = InMemoryRoleRepository()
+    role_repository.reset()
+    password_hasher = AsyncPasswordHasher(backend=Pbkdf2Sha256Backend(iterations=1000))
+
+    async def user_service():
+        yield UserService(user_repository, role_repository, password_hasher)
+
+    app = FastAPI()
+    register_exception_handlers(app)
+    app.include_router(user_router.router)
+    app.dependency_overrides[get_user_service] = user_service
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url='http://test')
+
+
+async def _responses(monkeypatch: pytest.MonkeyPatch, fast: bool) -> dict[str, httpx.Response]:
+    monkeypatch.setattr(user_router, 'FAST_JSON_RESPONSES', fast)
+    async with _client() as client:
+        created = await client.post('/users/bulk', json=USERS)
+        user_id = created.json()['created'][0]['id']
+        return {
+            'bulk_create': created,
+            'create': await client.post('/users', json={**USERS[1], 'username': 'carol', 'email': 'carol@test.com'}),
+            'get': await client.get(f'/users/{user_id}'),
+            'list': await client.get('/users'),
+        }
+
+
+class TestFastJsonResponses:
+    @pytest.mark.asyncio
+    async def test_same_bodies_as_response_models(self, monkeypatch: pytest.MonkeyPatch):
+        validated = await _responses(monkeypatch, fast=False)
+        fast = await _responses(monkeypatch, fast=True)
+
+        for endpoint, response in validated.items():
+            assert fast[endpoint].status_code == response.status_code, endpoint
+            assert fast[endpoint].headers['content-type'] == response.headers['content-type'], endpoint
+            assert fast[endpoint].json() == response.json(), endpoint
+        assert len(validated['bulk_create'].json()['created']) == 2
+        assert len(validated['bulk_create'].json()['failed']) == 1
+
+    @pytest.mark.asyncio
+    async def test_list_matches_response_model(self, monkeypatch: pytest.MonkeyPatch):
+        # the list is always serialized from the summaries, it must match each user's RetrieveUserModel
+        monkeypatch.setattr(user_router, 'FAST_JSON_RESPONSES', False)
+        async with _client() as client:
+            await client.post('/users/bulk', json=USERS)
+            users = (await client.get('/users')).json()
+            validated = [(await client.get(f'/users/{user["id"]}')).json() for user in users]
+
+        assert users == validated
+        assert [user['username'] for user in users] == ['alice', 'bob']
@@ -0,0 +1,222 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from api.http.dependencies.container import container
+from api.http.error_handler import register_exception_handlers
+from api.http.metrics import (
+    UNMATCHED_ROUTE,
+    HttpMetrics,
+    MetricsMiddleware,
+    MetricsSnapshot,
+    MetricsStore,
+    render_metrics,
+)
+from core.enum.error import ErrorCode
+from core.error import NotFoundError
+from core.utility.hasher import AsyncPasswordHasher
+from repository.cache.role import RoleCache
+from utility.metrics import Histogram
+
+
+def _app(metrics: HttpMetrics) -> MetricsMiddleware:
+    app = FastAPI()
+    register_exception_handlers(app)
+
+    @app.get('/items/{item_id}')
+    async def get_item(item_id: int):
+        if item_id == 0:
+            raise NotFoundError('item not found')
+        if item_id == 500:
+            raise RuntimeError('boom')
+        return {'id': item_id}
+
+    return MetricsMiddleware(app, metrics)
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+class TestHttpMetrics:
+    @pytest.mark.asyncio
+    async def test_requests_are_recorded_by_route_template(self):
+        metrics = HttpMetrics()
+        transport = httpx.ASGITransport(_app(metrics), raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            assert (await client.get('/items/1')).status_code == 200
+            assert (await client.get('/items/2')).status_code == 200
+            assert (await client.get('/items/0')).status_code == 404
+            assert (await client.get('/items/500')).status_code == 500
+            assert (await client.get('/missing')).status_code == 404
+
+        snapshot = metrics.snapshot()
+        assert snapshot.requests == {
+            ('GET', '/items/{item_id}', 200): 2,
+            ('GET', '/items/{item_id}', 404): 1,
+            ('GET', '/items/{item_id}', 500): 1,
+            ('GET', UNMATCHED_ROUTE, 404): 1,
+        }
+        assert snapshot.in_flight == {'GET': 0}
+        assert snapshot.latency[('GET', '/items/{item_id}')].count == 4
+        assert snapshot.errors == {
+            ErrorCode.CORE_1000_UNEXPECTED_ERROR: 1,
+            ErrorCode.CORE_1002_NOT_FOUND: 1,
+            ErrorCode.API_2001_API_SERVICE_ERROR: 1,
+        }
+
+        text = render_metrics(snapshot)
+        assert 'http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2\n' in text
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/items/{item_id}",le="+Inf"} 4\n' in text
+        assert 'http_request_duration_seconds_count{method="GET",route="<unmatched>"} 1\n' in text
+        assert 'http_errors_total{code="CORE_1002_NOT_FOUND"} 1\n' in text
+
+    def test_workers_are_aggregated_through_the_store(self, tmp_path: Path):
+        workers = [HttpMetrics() for _ in range(3)]
+        stores = [MetricsStore(metrics, directory=tmp_path) for metrics in workers]
+        # other processes: one alive (this test's parent), one that exited
+        stores[1].pid, stores[2].pid = 1, _dead_pid()
+        for metrics in workers:
+            metrics.record('GET', '/items/{item_id}', 200, 0.002)
+            metrics.record('GET', '/items/{item_id}', 404, 0.02, ErrorCode.CORE_1002_NOT_FOUND)
+            metrics.in_flight['GET'] = 1
+        for store in stores[1:]:
+            store.flush()
+        workers[0].record('POST', '/items', 201, 0.004)
+
+        snapshot = stores[0].collect()
+
+        assert snapshot.requests == {
+            ('GET', '/items/{item_id}', 200): 3,
+            ('GET', '/items/{item_id}', 404): 3,
+            ('POST', '/items', 201): 1,
+        }
+        assert snapshot.in_flight == {'GET': 2}  # the exited worker's requests are not in flight
+        latency = snapshot.latency[('GET', '/items/{item_id}')]
+        assert latency.count == 6
+        assert latency.sum == pytest.approx(0.066)
+        assert snapshot.errors == {ErrorCode.CORE_1002_NOT_FOUND: 3}
+
+        (tmp_path / '2.metrics').write_bytes(b'not a snapshot')
+        assert stores[0].collect().requests == snapshot.requests
+
+    def test_snapshot_round_trip(self):
+        metrics = HttpMetrics()
+        metrics.record('DELETE', '/items/{item_id}', 204, 0.001, None)
+        snapshot = metrics.snapshot()
+
+        assert MetricsSnapshot.loads(snapshot.dumps()) == snapshot
+
+    def test_histograms_of_other_components(self, tmp_path: Path):
+        waits = {'primary': Histogram(), 'replica-1': Histogram()}
+        holds = Histogram()
+        workers = [
+            HttpMetrics(
+                histograms={
+                    'db_pool_wait_seconds': lambda: {(('pool', pool),): h.snapshot() for pool, h in waits.items()},
+                    'db_connection_hold_seconds': lambda: {(): holds.snapshot()},
+                }
+            )
+            for _ in range(2)
+        ]
+        stores = [MetricsStore(metrics, directory=tmp_path) for metrics in workers]
+        stores[1].pid = 1
+        waits['primary'].observe(0.002)
+        holds.observe(0.03)
+        holds.observe(0.3)
+        stores[1].flush()
+
+        snapshot = stores[0].collect()
+
+        assert snapshot.histograms[('db_connection_hold_seconds', ())].count == 4
+        assert MetricsSnapshot.loads(snapshot.dumps()) == snapshot
+        text = render_metrics(snapshot)
+        assert text.count('# TYPE db_pool_wait_seconds histogram\n') == 1
+        assert 'db_pool_wait_seconds_bucket{pool="primary",le="0.0025"} 2\n' in text
+        assert 'db_pool_wait_seconds_count{pool="replica-1"} 0\n' in text
+        assert 'db_connection_hold_seconds_bucket{le="0.05"} 2\n' in text
+        assert 'db_connection_hold_seconds_count 4\n' in text
+
+    def test_gauges_of_other_components(self, tmp_path: Path):
+        workers = [HttpMetrics(gauges={'db_pool_checked_out': lambda: {(('pool', 'primary'),): 2}}) for _ in range(3)]
+        stores = [MetricsStore(metrics, directory=tmp_path) for metrics in workers]
+        # other processes: one alive (this test's parent), one that exited
+        stores[1].pid, stores[2].pid = 1, _dead_pid()
+        for store in stores[1:]:
+            store.flush()
+
+        snapshot = stores[0].collect()
+
+        assert snapshot.gauges == {('db_pool_checked_out', (('pool', 'primary'),)): 4}
+        assert MetricsSnapshot.loads(snapshot.dumps()) == snapshot
+        text = render_metrics(snapshot)
+        assert '# TYPE db_pool_checked_out gauge\ndb_pool_checked_out{pool="primary"} 4\n' in text
+
+    def test_database_metrics_are_exported(self):
+        text = render_metrics(container.resolve(HttpMetrics).snapshot())
+
+        assert '# TYPE db_connection_hold_seconds histogram\n' in text
+        assert 'db_connection_hold_seconds_count ' in text
+        for gauge in ('db_pool_size', 'db_pool_checked_in', 'db_pool_checked_out', 'db_pool_overflow'):
+            assert f'# TYPE {gauge} gauge\n{gauge}{{pool="primary"}} ' in text
+        assert 'db_pool_wait_seconds_count{pool="primary"} ' in text
+
+    @pytest.mark.asyncio
+    async def test_role_cache_stats_are_exported(self):
+        cache = container.resolve(RoleCache)
+        hits, misses = cache.hits, cache.misses
+
+        async def load():
+            return None
+
+        await cache.get_or_load(('key', 'metrics-test-role'), load)
+        await cache.get_or_load(('key', 'metrics-test-role'), load)
+        text = render_metrics(container.resolve(HttpMetrics).snapshot())
+
+        assert f'# TYPE role_cache_hits_total counter\nrole_cache_hits_total {hits + 1}\n' in text
+        assert f'# TYPE role_cache_misses_total counter\nrole_cache_misses_total {misses + 1}\n' in text
+        assert '# TYPE role_cache_loads_total counter\n' in text
+        assert '# TYPE role_cache_evictions_total counter\n' in text
+        assert f'# TYPE role_cache_entries gauge\nrole_cache_entries {cache.stats().size}\n' in text
+
+    @pytest.mark.asyncio
+    async def test_password_hash_queue_is_exported(self):
+        hasher = container.resolve(AsyncPasswordHasher)
+        release = threading.Event()
+
+        def blocked_hash(_password, _backend):
+            release.wait(10)
+            return 'hash'
+
+        with patch('core.utility.hasher.hash_password', blocked_hash):
+            hashing = asyncio.gather(*(hasher.hash('password') for _ in range(hasher.max_concurrency + 2)))
+            while hasher.queue_depth < 2:
+                await asyncio.sleep(0.01)
+            text = render_metrics(container.resolve(HttpMetrics).snapshot())
+            release.set()
+            await hashing
+
+        assert f'# TYPE password_hash_in_flight gauge\npassword_hash_in_flight {hasher.max_concurrency}\n' in text
+        assert '# TYPE password_hash_queue_depth gauge\npassword_hash_queue_depth 2\n' in text
+
+    @pytest.mark.parametrize('enabled', ['true', 'false'])
+    def test_metrics_route_follows_the_setting(self, enabled: str):
+        routes = subprocess.run(
+            [sys.executable, '-c', 'from api.http import http_api; print(*(route.path for route in http_api.routes))'],
+            env={**os.environ, 'METRICS_ENABLED': enabled, 'LOG_FILE': ''},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+
+        assert ('/metrics' in routes) == (enabled == 'true')
@@ -0,0 +1,127 @@
+import logging
+from collections.abc import AsyncIterator
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import Connection, create_engine, text
+
+from api.http.metrics import HttpMetrics, MetricsMiddleware
+from repository.psql.connection import install_query_recorder
+from repository.psql.instrumentation import OTHER_OPERATION, QueryRecorder, describe_parameters, instrumented
+
+
+@instrumented
+class ItemRepository:
+    def __init__(self, connection: Connection):
+        self.connection = connection
+
+    async def count(self) -> int:
+        return self.connection.execute(text('SELECT count(*) FROM items')).scalar_one()
+
+    async def get_all(self) -> list[int]:
+        # one statement per item, as a lazy relationship load would
+        ids = self.connection.execute(text('SELECT id FROM items')).scalars().all()
+        return [self.connection.execute(text('SELECT :id'), {'id': i}).scalar_one() for i in ids]
+
+    async def stream_all(self) -> AsyncIterator[int]:
+        for row in self.connection.execute(text('SELECT id FROM items')):
+            yield row.id
+
+
+@pytest.fixture
+def recorder() -> QueryRecorder:
+    return QueryRecorder()
+
+
+@pytest.fixture
+def connection(recorder: QueryRecorder) -> Connection:
+    engine = create_engine('sqlite://')
+    install_query_recorder(SimpleNamespace(sync_engine=engine), recorder)
+    with engine.connect() as connection:
+        connection.execute(text('CREATE TABLE items (id INTEGER PRIMARY KEY)'))
+        connection.execute(text('INSERT INTO items (id) VALUES (1), (2), (3)'))
+        yield connection
+
+
+class TestQueryInstrumentation:
+    @pytest.mark.asyncio
+    async def test_statements_are_recorded_per_operation_and_request(
+        self, recorder: QueryRecorder, connection: Connection
+    ):
+        repository = ItemRepository(connection)
+
+        request, token = recorder.track_request()
+        try:
+            assert await repository.count() == 3
+            assert await repository.get_all() == [1, 2, 3]
+            assert [i async for i in repository.stream_all()] == [1, 2, 3]
+        finally:
+            recorder.untrack_request(token)
+        await repository.count()  # outside of the request
+
+        assert recorder.operations[OTHER_OPERATION].statements == 2  # the fixture's
+        assert recorder.operations[OTHER_OPERATION].rows == 3
+        assert recorder.operations['ItemRepository.count'].statements == 2
+        assert recorder.operations['ItemRepository.get_all'].statements == 4
+        assert recorder.operations['ItemRepository.stream_all'].statements == 1
+        assert request.statements == 6
+        assert request.seconds > 0
+
+    @pytest.mark.asyncio
+    async def test_slow_queries_are_logged(
+        self, recorder: QueryRecorder, connection: Connection, caplog: pytest.LogCaptureFixture
+    ):
+        recorder.slow_query_seconds = 0
+        with caplog.at_level(logging.WARNING, logger='repository.psql.instrumentation'):
+            await ItemRepository(connection).get_all()
+
+        assert len(caplog.records) == 4
+        assert 'Slow query in ItemRepository.get_all' in caplog.records[-1].getMessage()
+        # by default only the names and types of the parameters
+        assert caplog.records[-1].getMessage().endswith('parameters: {id: int}')
+
+    def test_sensitive_parameter_values_are_redacted(
+        self, recorder: QueryRecorder, connection: Connection, caplog: pytest.LogCaptureFixture
+    ):
+        recorder.slow_query_seconds = 0
+        recorder.log_parameter_values = True
+        connection.execute(text('CREATE TABLE users (username TEXT, password_hash TEXT)'))
+        with caplog.at_level(logging.WARNING, logger='repository.psql.instrumentation'):
+            connection.execute(
+                text('INSERT INTO users VALUES (:username, :password_hash)'),
+                [{'username': 'alice', 'password_hash': '$scrypt$secret'}, {'username': 'bob', 'password_hash': 'x'}],
+            )
+
+        message = caplog.records[-1].getMessage()
+        assert message.endswith("parameters: 2 sets, the first {username: 'alice', password_hash: <redacted>}")
+        assert '$scrypt$secret' not in message
+        # positional parameters have no name to tell them apart, their values are never logged
+        assert describe_parameters(('alice', '$scrypt$secret'), values=True) == '(str, str)'
+
+    @pytest.mark.asyncio
+    async def test_request_statements_are_in_server_timing_and_metrics(
+        self, recorder: QueryRecorder, connection: Connection
+    ):
+        app = FastAPI()
+        repository = ItemRepository(connection)
+
+        @app.get('/items')
+        async def get_items():
+            return await repository.get_all()
+
+        metrics = HttpMetrics(queries=recorder)
+        transport = httpx.ASGITransport(MetricsMiddleware(app, metrics))
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            response = await client.get('/items')
+
+        assert response.json() == [1, 2, 3]
+        assert response.headers['server-timing'].startswith('db;dur=')
+        assert response.headers['server-timing'].endswith(';desc="4 statements, 0 rows"')
+
+        snapshot = metrics.snapshot()
+        statements = snapshot.db_statements[('GET', '/items')]
+        assert statements.count == 1
+        assert statements.sum == 4
+        assert snapshot.db_operations['ItemRepository.get_all'][0] == 4
@@ -0,0 +1,89 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.http.dependencies.container import container
+from api.http.dependencies.user import UserServiceDependency
+from core.protocol.repository.user import UserRepository
+from repository.psql.session import SessionProvider, UnitOfWork
+from utility.scope import Container, Scope, ScopeError
+
+PARALLEL_REQUESTS = 300
+
+
+class Resource:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class TestContainer:
+    @pytest.mark.asyncio
+    async def test_scopes(self):
+        scoped = Container()
+        scoped.register('process', Resource, close=Resource.close)
+        scoped.register('request', Resource, scope=Scope.REQUEST, close=Resource.close)
+        scoped.register('task', Resource, scope=Scope.TASK, close=Resource.close)
+
+        with pytest.raises(ScopeError):
+            scoped.resolve('request')
+
+        async def resolve_all() -> tuple[Resource, Resource, Resource]:
+            await asyncio.sleep(0)
+            return scoped.resolve('process'), scoped.resolve('request'), scoped.resolve('task')
+
+        async with scoped.scope({'value': 1}):
+            assert scoped.resolve('value') == 1
+            assert scoped.resolve('task') is scoped.resolve('task')
+            results = await asyncio.gather(resolve_all(), resolve_all())
+            request_resource = scoped.resolve('request')
+
+        (process_1, request_1, task_1), (process_2, request_2, task_2) = results
+        assert process_1 is process_2 and not process_1.closed
+        assert request_1 is request_2 is request_resource and request_1.closed
+        assert task_1 is not task_2 and task_1.closed and task_2.closed
+
+        with pytest.raises(LookupError):
+            scoped.resolve('value')
+
+        async with scoped.scope():
+            assert scoped.resolve('request') is not request_1
+            assert scoped.resolve('process') is process_1
+
+        await scoped.aclose()
+        assert process_1.closed
+
+
+class TestRequestScopes:
+    @pytest.mark.asyncio
+    async def test_parallel_requests_get_their_own_sessions(self):
+        app = FastAPI()
+        barrier = asyncio.Barrier(PARALLEL_REQUESTS)
+        seen: list[tuple[int, int, UnitOfWork, AsyncSession]] = []
+
+        @app.get('/')
+        async def endpoint(user_service: UserServiceDependency):
+            unit_of_work = container.resolve(SessionProvider).current
+            session = unit_of_work.session
+            # every request must be in flight at once to get past the barrier
+            await barrier.wait()
+            assert container.resolve(SessionProvider).session is session
+            seen.append((id(user_service), id(container.resolve(UserRepository)), unit_of_work, session))
+            return {}
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url='http://test') as client:
+            responses = await asyncio.wait_for(
+                asyncio.gather(*(client.get('/') for _ in range(PARALLEL_REQUESTS))), timeout=30
+            )
+
+        assert all(response.status_code == 200 for response in responses)
+        # the service and repositories are built once, the sessions are not shared
+        assert len({user_service for user_service, _, _, _ in seen}) == 1
+        assert len({user_repository for _, user_repository, _, _ in seen}) == 1
+        assert len({id(session) for _, _, _, session in seen}) == PARALLEL_REQUESTS
+        assert not any(unit_of_work.is_open for _, _, unit_of_work, _ in seen)
@@ -0,0 +1,166 @@
+import os
+from collections.abc import AsyncIterator
+
+import pytest
+from sqlalchemy import Text, column, select
+
+from core.error import DuplicateError, NotFoundError
+from core.model.user import Role, UpdateUserParams, User
+from repository.psql.connection import Database
+from repository.psql.dao.user import PsqlUserRepository
+from repository.psql.model import DbRole, user_roles
+from repository.psql.session import SessionProvider
+
+# a scratch database, its tables are dropped
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+pytestmark = [
+    pytest.mark.skipif(not TEST_DATABASE_URL, reason='runs against Postgres, set TEST_DATABASE_URL'),
+    pytest.mark.asyncio(loop_scope='session'),
+]
+
+
+@pytest.fixture
+async def provider() -> AsyncIterator[SessionProvider]:
+    database = Database(url=TEST_DATABASE_URL, replica_urls=[])
+    await database.drop_all_tables()
+    await database.create_all_tables()
+    try:
+        yield SessionProvider(database)
+    finally:
+        await database.drop_all_tables()
+        await database.engine.dispose()
+
+
+@pytest.fixture
+async def repository(provider: SessionProvider) -> AsyncIterator[PsqlUserRepository]:
+    async with provider.scope():
+        yield PsqlUserRepository(provider)
+
+
+@pytest.fixture
+async def roles(provider: SessionProvider, repository: PsqlUserRepository) -> tuple[Role, ...]:
+    db_roles = [DbRole(key=key, name=key.title(), description=key) for key in ('admin', 'editor', 'viewer')]
+    provider.session.add_all(db_roles)
+    await provider.session.commit()
+    return tuple(db_role.to_core() for db_role in db_roles)
+
+
+async def user_role_versions(provider: SessionProvider) -> dict[tuple[int, int], str]:
+    """The version (xmin, the transaction that wrote it) of each user_roles row, by user and role"""
+    result = await provider.session.execute(
+        select(user_roles.c.user_id, user_roles.c.role_id, column('xmin').cast(Text))
+    )
+    await provider.session.commit()
+    return {(user_id, role_id): version for user_id, role_id, version in result}
+
+
+class TestPsqlUserRepository:
+    async def test_create_duplicate(self, repository: PsqlUserRepository):
+        await repository.create(User(username='alice', email='alice@example.com', password_hash='x'))
+
+        with pytest.raises(DuplicateError) as username_taken:
+            await repository.create(User(username='alice', email='alice-2@example.com', password_hash='x'))
+        with pytest.raises(DuplicateError) as email_taken:
+            await repository.create(User(username='alice-2', email='alice@example.com', password_hash='x'))
+
+        assert (username_taken.value.field, email_taken.value.field) == ('username', 'email')
+        assert [user.username for user in await repository.get_all()] == ['alice']
+
+    async def test_update_roles(
+        self, provider: SessionProvider, repository: PsqlUserRepository, roles: tuple[Role, ...]
+    ):
+        admin, editor, viewer = roles
+        user = await repository.create(
+            User(username='alice', email='alice@example.com', password_hash='x', roles=(admin, editor))
+        )
+        other = await repository.create(
+            User(username='bob', email='bob@example.com', password_hash='x', roles=(admin, editor))
+        )
+        versions = await user_role_versions(provider)
+
+        updated = await repository.update(user.id, UpdateUserParams(roles=(editor, viewer)))
+
+        assert updated.roles == (editor, viewer)
+        updated_versions = await user_role_versions(provider)
+        assert set(updated_versions) == {
+            (user.id, editor.id),
+            (user.id, viewer.id),
+            (other.id, admin.id),
+            (other.id, editor.id),
+        }
+        # the role the user keeps is left as it was, not deleted and inserted again
+        assert updated_versions[user.id, editor.id] == versions[user.id, editor.id]
+        assert {role.key for role in (await repository.get_by_id(user.id)).roles} == {'editor', 'viewer'}
+        # only the user's own roles are changed
+        assert {role.key for role in (await repository.get_by_id(other.id)).roles} == {'admin', 'editor'}
+
+    async def test_update_keeps_unchanged_roles(
+        self, provider: SessionProvider, repository: PsqlUserRepository, roles: tuple[Role, ...]
+    ):
+        admin, editor, _ = roles
+        user = await repository.create(
+            User(username='alice', email='alice@example.com', password_hash='x', roles=(admin, editor))
+        )
+        versions = await user_role_versions(provider)
+
+        updated = await repository.update(user.id, UpdateUserParams(username='alice-2', roles=(admin, editor)))
+        assert updated.roles == (admin, editor)
+        assert await user_role_versions(provider) == versions
+
+        updated = await repository.update(user.id, UpdateUserParams(is_verified=True))
+        assert (updated.username, updated.is_verified) == ('alice-2', True)
+        assert {role.key for role in updated.roles} == {'admin', 'editor'}
+
+        updated = await repository.update(user.id, UpdateUserParams(roles=()))
+        assert updated.roles == ()
+        assert (await repository.get_by_id(user.id)).roles == ()
+
+    async def test_update_missing_user(self, repository: PsqlUserRepository, roles: tuple[Role, ...]):
+        user = await repository.create(
+            User(username='alice', email='alice@example.com', password_hash='x', roles=roles[:1])
+        )
+
+        with pytest.raises(NotFoundError):
+            await repository.update(user.id + 1, UpdateUserParams(username='bob', roles=roles))
+        with pytest.raises(NotFoundError):
+            await repository.update(user.id + 1, UpdateUserParams(is_verified=True))
+
+        assert await repository.get_by_username_or_email('bob', None) is None
+        assert {role.key for role in (await repository.get_by_id(user.id)).roles} == {'admin'}
+
+    async def test_delete_many(self, repository: PsqlUserRepository):
+        users = [
+            await repository.create(User(username=f'user{i}', email=f'user{i}@example.com', password_hash='x'))
+            for i in range(3)
+        ]
+        ids = [user.id for user in users]
+
+        assert await repository.delete_many([ids[0], ids[0], ids[1], max(ids) + 1]) == 2
+        assert await repository.delete_many([max(ids) + 1]) == 0
+        assert await repository.delete_many([]) == 0
+        assert [user.id for user in await repository.get_all()] == [ids[2]]
+
+    async def test_add_role(self, repository: PsqlUserRepository, roles: tuple[Role, ...]):
+        admin, editor, _ = roles
+        users = [
+            await repository.create(User(username=f'user{i}', email=f'user{i}@example.com', password_hash='x'))
+            for i in range(3)
+        ]
+        ids = [user.id for user in users]
+        missing_role = Role(id=max(role.id for role in roles) + 1, key='missing', name='Missing')
+
+        assert await repository.add_role(admin, [ids[0], ids[0], max(ids) + 1]) == 1
+        assert await repository.add_role(admin, ids) == 2
+        assert await repository.add_role(missing_role, ids) == 0
+        assert await repository.add_role(editor, []) == 0
+
+        assert [[role.key for role in user.roles] for user in await repository.get_all()] == [['admin']] * 3
+
+    async def test_get_by_username_or_email_of_two_users(self, repository: PsqlUserRepository):
+        first = await repository.create(User(username='alice', email='alice@example.com', password_hash='x'))
+        second = await repository.create(User(username='bob', email='bob@example.com', password_hash='x'))
+
+        assert (await repository.get_by_username_or_email('bob', 'alice@example.com')).id == first.id
+        assert (await repository.get_by_username_or_email('bob', None)).id == second.id
+        assert await repository.get_by_username_or_email('carol', 'carol@example.com') is None
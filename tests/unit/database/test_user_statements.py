@@ -0,0 +1,172 @@
+import warnings
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from asyncpg.exceptions import UniqueViolationError
+from pydantic import ValidationError
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.compiler import FROM_LINTING, WARN_LINTING
+
+from config.settings import Settings
+from core.error import DuplicateError, NotFoundError
+from core.model.user import Role, UpdateUserParams, User
+from repository.psql.dao import user as user_dao
+from repository.psql.dao.user import PsqlUserRepository
+
+# the most parameters asyncpg binds to one statement
+MAX_BIND_PARAMETERS = 32767
+
+ROLES = (Role(key='default_role', name='Default Role', id=1), Role(key='admin', name='Admin', id=2))
+
+
+class RecordingSession:
+    """Keeps the statements it is given, and answers each with `rows` (a single row by default), or fails them
+    with `error`"""
+
+    def __init__(self, error: Exception | None = None, rows: list | None = None):
+        self.statements = []
+        self.error = error
+        self.rows = [MagicMock()] if rows is None else rows
+        self.commits = 0
+        self.rollbacks = 0
+
+    async def execute(self, statement, *_args, **_kwargs):
+        self.statements.append(statement)
+        if self.error is not None:
+            raise self.error
+        result = MagicMock()
+        result.scalar_one.return_value = 1
+        result.all.return_value = self.rows
+        result.rowcount = 1
+        return result
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+    async def rollback(self) -> None:
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def session() -> RecordingSession:
+    return RecordingSession()
+
+
+@pytest.fixture
+def repository(session: RecordingSession) -> PsqlUserRepository:
+    return PsqlUserRepository(SimpleNamespace(session=session, read_session=session))
+
+
+def unique_violation(constraint_name: str) -> IntegrityError:
+    """What a statement violating `constraint_name` fails with: asyncpg's error, wrapped as SQLAlchemy's asyncpg
+    dialect does it"""
+    # without the constraint in the message, as when the server's messages are localized
+    driver_error = UniqueViolationError.new(
+        {'C': '23505', 'M': 'duplicate key value violates unique constraint', 'n': constraint_name}
+    )
+    dbapi = asyncpg_dialect.import_dbapi()
+    adapted_error = dbapi.IntegrityError(f'{type(driver_error)}: {driver_error}')
+    adapted_error.__cause__ = driver_error
+    return IntegrityError('INSERT INTO end_user ...', None, adapted_error)
+
+
+def assert_no_cartesian_product(session: RecordingSession) -> None:
+    for statement in session.statements:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            # what an engine's from linting would warn about when running it
+            statement.compile(dialect=postgresql.dialect(), linting=FROM_LINTING | WARN_LINTING)
+
+
+class TestUserStatements:
+    @pytest.mark.asyncio
+    async def test_create(self, repository: PsqlUserRepository, session: RecordingSession):
+        await repository.create(User(username='alice', email='alice@example.com', password_hash='x', roles=ROLES))
+
+        assert_no_cartesian_product(session)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        ('constraint_name', 'field'), [('ix_end_user_username', 'username'), ('ix_end_user_email', 'email')]
+    )
+    async def test_create_duplicate(self, constraint_name: str, field: str):
+        session = RecordingSession(error=unique_violation(constraint_name))
+        repository = PsqlUserRepository(SimpleNamespace(session=session, read_session=session))
+
+        with pytest.raises(DuplicateError) as exc_info:
+            await repository.create(User(username='alice', email='alice@example.com', password_hash='x'))
+
+        assert exc_info.value.field == field
+        assert session.rollbacks == 1
+
+    @pytest.mark.asyncio
+    async def test_create_other_integrity_error(self):
+        session = RecordingSession(error=unique_violation('unique_user_role'))
+        repository = PsqlUserRepository(SimpleNamespace(session=session, read_session=session))
+
+        with pytest.raises(IntegrityError):
+            await repository.create(User(username='alice', email='alice@example.com', password_hash='x'))
+
+        assert session.rollbacks == 1
+
+    @pytest.mark.asyncio
+    async def test_update(self, repository: PsqlUserRepository, session: RecordingSession):
+        await repository.update(1, UpdateUserParams(username='bob', roles=ROLES))
+        await repository.update(1, UpdateUserParams(is_verified=True))
+
+        assert_no_cartesian_product(session)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('params', [UpdateUserParams(username='bob', roles=ROLES), UpdateUserParams(roles=())])
+    async def test_update_missing_user(self, params: UpdateUserParams):
+        # the user_roles CTEs only touch the rows of the target user, and an empty result is rolled back
+        session = RecordingSession(rows=[])
+        repository = PsqlUserRepository(SimpleNamespace(session=session, read_session=session))
+
+        with pytest.raises(NotFoundError):
+            await repository.update(1, params)
+
+        assert (session.commits, session.rollbacks) == (0, 1)
+
+    @pytest.mark.asyncio
+    async def test_add_role(self, repository: PsqlUserRepository, session: RecordingSession):
+        await repository.add_role(ROLES[1], [1, 2, 3])
+
+        assert_no_cartesian_product(session)
+        sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+        assert 'EXISTS (SELECT * \nFROM role \nWHERE role.id = ' in sql
+
+    @pytest.mark.asyncio
+    async def test_create_many_one_by_one_unless_enabled(
+        self, repository: PsqlUserRepository, session: RecordingSession
+    ):
+        users = [User(username=f'u{i}', email=f'u{i}@example.com', password_hash='x', roles=ROLES) for i in range(3)]
+
+        results = await repository.create_many(users)
+
+        assert [result.id for result in results] == [1, 1, 1]
+        assert len(session.statements) == 3
+        assert_no_cartesian_product(session)
+
+    @pytest.mark.asyncio
+    async def test_bulk_insert_chunk_fits_bind_parameter_limit(
+        self, repository: PsqlUserRepository, session: RecordingSession
+    ):
+        chunk_size = MAX_BIND_PARAMETERS // 6
+        with pytest.raises(ValidationError):
+            Settings(DATABASE_BULK_INSERT_CHUNK_SIZE=chunk_size + 1)
+        users = [User(username=f'u{i}', email=f'u{i}@example.com', password_hash='x') for i in range(chunk_size)]
+
+        with (
+            patch.object(user_dao, 'DATABASE_BULK_INSERT_ENABLED', True),
+            patch.object(user_dao, 'DATABASE_BULK_INSERT_CHUNK_SIZE', chunk_size),
+            patch.object(user_dao, 'DATABASE_BULK_COPY_THRESHOLD', chunk_size + 1),
+        ):
+            results = await repository.create_many(users)
+
+        assert all(isinstance(result, DuplicateError) for result in results)
+        insert_users = session.statements[0].compile(dialect=postgresql.dialect())
+        assert MAX_BIND_PARAMETERS - 6 < len(insert_users.params) <= MAX_BIND_PARAMETERS
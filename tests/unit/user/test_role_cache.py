@@ -0,0 +1,202 @@
+import asyncio
+
+import pytest
+
+from core.constant.user import DEFAULT_ROLE_KEY
+from core.model.user import Role
+from core.protocol.repository.role import RoleRepository
+from core.type import IDType
+from repository.cache.role import CachedRoleRepository, RoleCache
+from repository.memory.role import InMemoryRoleRepository
+from utility.cache import AsyncTTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingRoleRepository(RoleRepository):
+    def __init__(self):
+        self.repository = InMemoryRoleRepository()
+        self.repository.reset()
+        self.data = self.repository.data
+        self.calls: list[tuple[str, object]] = []
+
+    async def get_by_key(self, key: str) -> Role | None:
+        self.calls.append(('get_by_key', key))
+        await asyncio.sleep(0)
+        return await self.repository.get_by_key(key)
+
+    async def get_by_ids(self, ids: list[IDType]) -> list[Role]:
+        self.calls.append(('get_by_ids', sorted(ids)))
+        await asyncio.sleep(0)
+        return await self.repository.get_by_ids(ids)
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def role_cache(clock: FakeClock) -> RoleCache:
+    return AsyncTTLCache(max_size=16, ttl=60, negative_ttl=5, clock=clock)
+
+
+@pytest.fixture
+def role_repository() -> CountingRoleRepository:
+    repo = CountingRoleRepository()
+    repo.data[IDType(2)] = Role(id=IDType(2), key='admin', name='Admin')
+    return repo
+
+
+class TestCachedRoleRepository:
+    @pytest.mark.asyncio
+    async def test_get_by_key_is_cached_until_ttl(
+        self, role_repository: CountingRoleRepository, role_cache: RoleCache, clock: FakeClock
+    ):
+        repo = CachedRoleRepository(role_repository, role_cache)
+
+        first = await repo.get_by_key(DEFAULT_ROLE_KEY)
+        second = await repo.get_by_key(DEFAULT_ROLE_KEY)
+
+        assert first is not None
+        assert first == second
+        assert role_repository.calls == [('get_by_key', DEFAULT_ROLE_KEY)]
+        assert (role_cache.stats().hits, role_cache.stats().misses) == (1, 1)
+
+        clock.now += 61
+        await repo.get_by_key(DEFAULT_ROLE_KEY)
+        assert len(role_repository.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_missing_role_is_negatively_cached(
+        self, role_repository: CountingRoleRepository, role_cache: RoleCache, clock: FakeClock
+    ):
+        repo = CachedRoleRepository(role_repository, role_cache)
+
+        assert await repo.get_by_key('missing') is None
+        assert await repo.get_by_key('missing') is None
+        assert len(role_repository.calls) == 1
+
+        clock.now += 6
+        assert await repo.get_by_key('missing') is None
+        assert len(role_repository.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_load(
+        self, role_repository: CountingRoleRepository, role_cache: RoleCache
+    ):
+        repo = CachedRoleRepository(role_repository, role_cache)
+
+        roles = await asyncio.gather(*(repo.get_by_key(DEFAULT_ROLE_KEY) for _ in range(10)))
+
+        assert all(role is not None and role.key == DEFAULT_ROLE_KEY for role in roles)
+        assert role_repository.calls == [('get_by_key', DEFAULT_ROLE_KEY)]
+
+    @pytest.mark.asyncio
+    async def test_get_by_ids_only_loads_missing_ids(
+        self, role_repository: CountingRoleRepository, role_cache: RoleCache
+    ):
+        repo = CachedRoleRepository(role_repository, role_cache)
+
+        assert [role.id for role in await repo.get_by_ids([IDType(1)])] == [1]
+        assert [role.id for role in await repo.get_by_ids([IDType(1), IDType(2), IDType(999)])] == [1, 2]
+        assert [role.id for role in await repo.get_by_ids([IDType(2), IDType(999)])] == [2]
+        assert await repo.get_by_ids([]) == []
+
+        assert role_repository.calls == [('get_by_ids', [1]), ('get_by_ids', [2, 999])]
+
+    @pytest.mark.asyncio
+    async def test_invalidation(self, role_repository: CountingRoleRepository, role_cache: RoleCache):
+        repo = CachedRoleRepository(role_repository, role_cache)
+
+        default_role = await repo.get_by_key(DEFAULT_ROLE_KEY)
+        assert default_role is not None
+        renamed_role = Role(id=default_role.id, key=default_role.key, name='Renamed')
+        role_repository.data[default_role.id] = renamed_role
+
+        assert await repo.get_by_key(DEFAULT_ROLE_KEY) == default_role
+
+        repo.invalidate(default_role)
+        assert await repo.get_by_key(DEFAULT_ROLE_KEY) == renamed_role
+
+        repo.invalidate_all()
+        assert role_cache.stats().size == 0
+
+
+class TestAsyncTTLCache:
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self, clock: FakeClock):
+        cache: AsyncTTLCache[str, int] = AsyncTTLCache(max_size=2, ttl=60, clock=clock)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == (True, 1)
+
+        cache.set('c', 3)
+
+        assert cache.get('b') == (False, None)
+        assert cache.get('a') == (True, 1)
+        assert cache.get('c') == (True, 3)
+        assert cache.stats().evictions == 1
+
+    @pytest.mark.asyncio
+    async def test_load_racing_an_invalidation_is_not_stored(self):
+        cache: AsyncTTLCache[str, int] = AsyncTTLCache(max_size=2, ttl=60)
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def loader() -> int:
+            started.set()
+            await release.wait()
+            return 1
+
+        task = asyncio.create_task(cache.get_or_load('a', loader))
+        await started.wait()
+        cache.invalidate('a')
+        release.set()
+
+        assert await task == 1
+        assert cache.get('a') == (False, None)
+
+    @pytest.mark.asyncio
+    async def test_failed_load_propagates_to_all_waiters(self):
+        cache: AsyncTTLCache[str, int] = AsyncTTLCache(max_size=2, ttl=60)
+
+        async def loader() -> int:
+            await asyncio.sleep(0)
+            raise RuntimeError('Test exception')
+
+        results = await asyncio.gather(*(cache.get_or_load('a', loader) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert cache.stats().loads == 1
+        assert cache.get('a') == (False, None)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_load_is_taken_over_by_a_waiter(self):
+        cache: AsyncTTLCache[str, int] = AsyncTTLCache(max_size=2, ttl=60)
+        calls = 0
+        started = asyncio.Event()
+
+        async def loader() -> int:
+            nonlocal calls
+            calls += 1
+            started.set()
+            await asyncio.sleep(0.01)
+            return calls
+
+        first = asyncio.create_task(cache.get_or_load('a', loader))
+        await started.wait()
+        waiters = [asyncio.create_task(cache.get_or_load('a', loader)) for _ in range(2)]
+        await asyncio.sleep(0)
+        first.cancel()
+
+        # one of the waiters loads it again, the other one shares that load
+        assert await asyncio.gather(*waiters) == [2, 2]
+        assert first.cancelled()
+        assert cache.get('a') == (True, 2)
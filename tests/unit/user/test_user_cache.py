@@ -0,0 +1,203 @@
+import asyncio
+
+import pytest
+
+from core.error import NotFoundError
+from core.model.user import UpdateUserParams, User
+from core.type import IDType
+from repository.cache.invalidation import LocalInvalidationBus
+from repository.cache.user import CachedUserRepository, UserCache
+from repository.memory.user import InMemoryUserRepository
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_user(index: int) -> User:
+    return User(username=f'user_{index}', email=f'user_{index}@example.com', password_hash='hashed')
+
+
+@pytest.fixture
+def user_repository() -> InMemoryUserRepository:
+    repo = InMemoryUserRepository()
+    repo.reset()
+    return repo
+
+
+@pytest.fixture
+def user_cache() -> UserCache:
+    return UserCache(max_entries=100, max_bytes=1024 * 1024, ttl=60)
+
+
+class TestCachedUserRepository:
+    @pytest.mark.asyncio
+    async def test_reads_are_served_from_all_indexes(
+        self, user_repository: InMemoryUserRepository, user_cache: UserCache
+    ):
+        repo = CachedUserRepository(user_repository, user_cache)
+        created_user = await repo.create(make_user(1))
+        user_repository.data.clear()  # anything returned from now on comes from the cache
+
+        assert await repo.get_by_id(created_user.id) == created_user
+        assert await repo.get_by_username_or_email('user_1', None) == created_user
+        assert await repo.get_by_username_or_email(None, 'user_1@example.com') == created_user
+        assert await repo.get_by_username_or_email('unknown', None) is None
+        assert user_cache.stats().hits == 3
+
+    @pytest.mark.asyncio
+    async def test_username_and_email_of_two_users(
+        self, user_repository: InMemoryUserRepository, user_cache: UserCache
+    ):
+        repo = CachedUserRepository(user_repository, user_cache)
+        first = await user_repository.create(make_user(1))
+        second = await repo.create(make_user(2))
+
+        # only the second user is cached, the repository answers with the first, of lower ID
+        assert await user_repository.get_by_username_or_email('user_2', 'user_1@example.com') == first
+        assert await repo.get_by_username_or_email('user_2', 'user_1@example.com') == first
+        assert await repo.get_by_username_or_email('user_1', 'user_2@example.com') == first
+
+        # once both are cached, or when the cached user has both, the cache answers the same
+        user_repository.data.clear()
+        assert await repo.get_by_username_or_email('user_2', 'user_1@example.com') == first
+        assert await repo.get_by_username_or_email('user_2', 'user_2@example.com') == second
+
+    @pytest.mark.asyncio
+    async def test_read_through_populates_cache(self, user_repository: InMemoryUserRepository, user_cache: UserCache):
+        repo = CachedUserRepository(user_repository, user_cache)
+        created_user = await user_repository.create(make_user(1))
+
+        assert await repo.get_by_username_or_email(None, 'user_1@example.com') == created_user
+        assert user_cache.stats().misses >= 1
+        assert await repo.get_by_id(created_user.id) == created_user
+        assert user_cache.stats().hits == 1
+
+    @pytest.mark.asyncio
+    async def test_update_invalidates_old_index_keys(
+        self, user_repository: InMemoryUserRepository, user_cache: UserCache
+    ):
+        repo = CachedUserRepository(user_repository, user_cache)
+        created_user = await repo.create(make_user(1))
+
+        updated_user = await repo.update(created_user.id, UpdateUserParams(username='renamed'))
+
+        assert user_cache.get_by_id(created_user.id) is None
+        assert await repo.get_by_id(created_user.id) == updated_user
+        assert user_cache.get_by_username('user_1') is None
+        assert user_cache.get_by_username('renamed') == updated_user
+        assert user_cache.get_by_email('user_1@example.com') == updated_user
+        assert await repo.get_by_username_or_email('user_1', None) is None
+
+    @pytest.mark.asyncio
+    async def test_concurrent_updates_leave_no_stale_user(self, user_cache: UserCache):
+        written = asyncio.Event()
+        release = asyncio.Event()
+
+        class SlowToReturnRepository(InMemoryUserRepository):
+            async def update(self, user_id: IDType, params: UpdateUserParams) -> User:
+                updated_user = await super().update(user_id, params)
+                if params.username == 'first':
+                    written.set()
+                    await release.wait()
+                return updated_user
+
+        slow_repository = SlowToReturnRepository()
+        slow_repository.reset()
+        repo = CachedUserRepository(slow_repository, user_cache)
+        created_user = await repo.create(make_user(1))
+
+        first = asyncio.create_task(repo.update(created_user.id, UpdateUserParams(username='first')))
+        await written.wait()
+        await repo.update(created_user.id, UpdateUserParams(username='second'))
+        release.set()
+        await first
+
+        # the first update finished last, but wrote first
+        assert (await repo.get_by_id(created_user.id)).username == 'second'
+
+    @pytest.mark.asyncio
+    async def test_failed_write_still_invalidates(self, user_repository: InMemoryUserRepository, user_cache: UserCache):
+        repo = CachedUserRepository(user_repository, user_cache)
+        created_user = await repo.create(make_user(1))
+        del user_repository.data[created_user.id]
+
+        with pytest.raises(NotFoundError):
+            await repo.update(created_user.id, UpdateUserParams(username='renamed'))
+
+        assert await repo.get_by_id(created_user.id) is None
+
+    @pytest.mark.asyncio
+    async def test_delete_invalidates(self, user_repository: InMemoryUserRepository, user_cache: UserCache):
+        repo = CachedUserRepository(user_repository, user_cache)
+        created_user = await repo.create(make_user(1))
+
+        await repo.delete(created_user.id)
+
+        assert await repo.get_by_id(created_user.id) is None
+        assert user_cache.get_by_email('user_1@example.com') is None
+        assert user_cache.stats().entries == 0
+
+    @pytest.mark.asyncio
+    async def test_invalidation_bus_keeps_workers_coherent(self, user_repository: InMemoryUserRepository):
+        bus = LocalInvalidationBus()
+        worker_1 = CachedUserRepository(user_repository, UserCache(max_entries=10, max_bytes=1 << 20, ttl=60, bus=bus))
+        worker_2 = CachedUserRepository(user_repository, UserCache(max_entries=10, max_bytes=1 << 20, ttl=60, bus=bus))
+        created_user = await worker_1.create(make_user(1))
+        assert await worker_2.get_by_id(created_user.id) == created_user
+
+        await worker_1.update(created_user.id, UpdateUserParams(is_verified=True))
+
+        refreshed_user = await worker_2.get_by_id(created_user.id)
+        assert refreshed_user is not None
+        assert refreshed_user.is_verified
+
+
+class TestUserCache:
+    def test_lru_eviction_by_entry_count(self):
+        cache = UserCache(max_entries=2, max_bytes=1 << 20, ttl=60)
+        users = [User(id=IDType(i), username=f'u{i}', email=f'u{i}@example.com', password_hash='h') for i in range(3)]
+        cache.put(users[0])
+        cache.put(users[1])
+        assert cache.get_by_id(IDType(0)) == users[0]
+
+        cache.put(users[2])
+
+        assert cache.get_by_id(IDType(1)) is None
+        assert cache.get_by_username('u1') is None
+        assert cache.get_by_id(IDType(0)) == users[0]
+        assert cache.stats().evictions == 1
+
+    def test_lru_eviction_by_bytes(self):
+        user = User(id=IDType(1), username='u1', email='u1@example.com', password_hash='h')
+        cache = UserCache(max_entries=100, max_bytes=1, ttl=60)
+
+        cache.put(user)
+
+        assert cache.stats().entries == 0
+        assert cache.stats().bytes == 0
+
+    def test_entries_expire(self):
+        clock = FakeClock()
+        cache = UserCache(max_entries=10, max_bytes=1 << 20, ttl=30, clock=clock)
+        user = User(id=IDType(1), username='u1', email='u1@example.com', password_hash='h')
+        cache.put(user)
+
+        clock.now += 31
+
+        assert cache.get_by_email('u1@example.com') is None
+        assert cache.stats().entries == 0
+
+    def test_put_after_invalidation_is_ignored(self):
+        cache = UserCache(max_entries=10, max_bytes=1 << 20, ttl=60)
+        user = User(id=IDType(1), username='u1', email='u1@example.com', password_hash='h')
+
+        generation = cache.generation  # taken before a slow read
+        cache.invalidate(user.id)  # a concurrent write
+        cache.put(user, generation)
+
+        assert cache.get_by_id(user.id) is None
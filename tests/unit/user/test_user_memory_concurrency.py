@@ -0,0 +1,161 @@
+import asyncio
+import sys
+import threading
+from collections.abc import Iterator
+
+import pytest
+
+from core.error import DuplicateError
+from core.model.user import Role, UpdateUserParams, User
+from core.type import IDType
+from repository.memory.user import InMemoryUserRepository
+
+THREADS = 8
+USERS_PER_THREAD = 200
+
+
+@pytest.fixture
+def user_repository() -> InMemoryUserRepository:
+    repo = InMemoryUserRepository()
+    repo.reset()
+    return repo
+
+
+@pytest.fixture(autouse=True)
+def frequent_thread_switches() -> Iterator[None]:
+    # switch threads as often as possible, so that unguarded check-then-write sequences interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def run_in_threads(*targets) -> None:
+    errors: list[BaseException] = []
+    barrier = threading.Barrier(len(targets))
+
+    def run(target):
+        try:
+            barrier.wait()
+            asyncio.run(target())
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors
+
+
+async def assert_consistent(repo: InMemoryUserRepository) -> None:
+    users = repo.data.snapshot()
+    assert len({user.id for user in users}) == len(users)
+    for user in users:
+        assert await repo.get_by_username_or_email(user.username, None) == user
+        assert await repo.get_by_username_or_email(None, user.email) == user
+
+
+class TestMemoryRepositoryConcurrency:
+    @pytest.mark.asyncio
+    async def test_concurrent_tasks_create_each_username_once(self, user_repository: InMemoryUserRepository):
+        async def create(attempt: int) -> User | DuplicateError:
+            await asyncio.sleep(0)
+            try:
+                return await user_repository.create(
+                    User(username=f'user-{attempt % 20}', email=f'attempt-{attempt}@example.com', password_hash='x')
+                )
+            except DuplicateError as e:
+                return e
+
+        results = await asyncio.gather(*(create(attempt) for attempt in range(200)))
+
+        created = [result for result in results if isinstance(result, User)]
+        assert sorted(user.username for user in created) == sorted(f'user-{i}' for i in range(20))
+        assert sorted(user.id for user in created) == list(range(1, 21))
+        assert all(result.field == 'username' for result in results if isinstance(result, DuplicateError))
+        await assert_consistent(user_repository)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_threads_create_each_username_once(self, user_repository: InMemoryUserRepository):
+        created: list[User] = []
+        duplicates: list[DuplicateError] = []
+
+        def creator(thread: int):
+            async def create_all():
+                for i in range(USERS_PER_THREAD):
+                    user = User(username=f'user-{i}', email=f'thread-{thread}-{i}@example.com', password_hash='x')
+                    try:
+                        created.append(await user_repository.create(user))
+                    except DuplicateError as e:
+                        duplicates.append(e)
+
+            return create_all
+
+        run_in_threads(*(creator(thread) for thread in range(THREADS)))
+
+        assert len(created) == USERS_PER_THREAD
+        assert len(duplicates) == USERS_PER_THREAD * (THREADS - 1)
+        assert sorted(user.id for user in created) == list(range(1, USERS_PER_THREAD + 1))
+        assert len(user_repository.data) == USERS_PER_THREAD
+        await assert_consistent(user_repository)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_threads_do_not_lose_updates(self, user_repository: InMemoryUserRepository):
+        user = await user_repository.create(User(username='user', email='user@example.com', password_hash='x'))
+        admin_role = Role(id=IDType(2), key='admin', name='Admin')
+        updates = 300
+
+        async def rename():
+            for i in range(updates):
+                await user_repository.update(user.id, UpdateUserParams(username=f'user-{i}'))
+
+        async def move():
+            for i in range(updates):
+                await user_repository.update(user.id, UpdateUserParams(email=f'user-{i}@example.com'))
+
+        async def verify():
+            for i in range(updates):
+                await user_repository.update(user.id, UpdateUserParams(is_verified=i % 2 == 1))
+
+        async def grant():
+            for _ in range(updates):
+                await user_repository.add_role(admin_role, [user.id])
+
+        run_in_threads(rename, move, verify, grant)
+
+        updated_user = await user_repository.get_by_id(user.id)
+        assert updated_user is not None
+        assert updated_user.username == f'user-{updates - 1}'
+        assert updated_user.email == f'user-{updates - 1}@example.com'
+        assert updated_user.is_verified
+        assert updated_user.roles == (admin_role,)
+        await assert_consistent(user_repository)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_threads_mixed_writes(self, user_repository: InMemoryUserRepository):
+        def worker(thread: int):
+            async def work():
+                for i in range(USERS_PER_THREAD):
+                    user = await user_repository.create(
+                        User(username=f'{thread}-{i}', email=f'{thread}-{i}@example.com', password_hash='x')
+                    )
+                    try:
+                        # every thread tries to take the same usernames, only one rename may win each
+                        await user_repository.update(user.id, UpdateUserParams(username=f'shared-{i}'))
+                    except DuplicateError:
+                        pass
+                    if i % 3 == 0:
+                        await user_repository.delete(user.id)
+                    await user_repository.get_all(limit=10)
+
+            return work
+
+        run_in_threads(*(worker(thread) for thread in range(THREADS)))
+
+        users = user_repository.data.snapshot()
+        assert len(users) == THREADS * USERS_PER_THREAD - THREADS * len(range(0, USERS_PER_THREAD, 3))
+        shared_usernames = [user.username for user in users if user.username.startswith('shared-')]
+        assert len(shared_usernames) == len(set(shared_usernames))
+        await assert_consistent(user_repository)
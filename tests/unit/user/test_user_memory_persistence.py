@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from core.model.user import Role, UpdateUserParams, User
+from core.type import IDType
+from repository.memory.persistence import StoreFormatError
+from repository.memory.role import InMemoryRoleRepository
+from repository.memory.user import InMemoryUserRepository, _UserCodec
+
+
+@pytest.fixture
+def user_repository() -> Iterator[InMemoryUserRepository]:
+    repo = InMemoryUserRepository()
+    repo.reset()
+    yield repo
+    repo.reset()
+
+
+def reloaded(repo: InMemoryUserRepository, directory: Path) -> dict[IDType, User]:
+    """The users `directory` holds, as a restarted process would load them"""
+    repo.reset()
+    repo.persist(directory)
+    return dict(repo.data)
+
+
+class TestMemoryRepositoryPersistence:
+    @pytest.mark.asyncio
+    async def test_user_writes_survive_restart(self, user_repository: InMemoryUserRepository, tmp_path: Path):
+        user_repository.persist(tmp_path)
+        admin_role = Role(id=IDType(2), key='admin', name='Admin')
+
+        alice = await user_repository.create(User(username='alice', email='alice@example.com', password_hash='x'))
+        bob = await user_repository.create(User(username='bob', email='bob@example.com', password_hash='x'))
+        carol = await user_repository.create(User(username='carol', email='carol@example.com', password_hash='x'))
+        await user_repository.update(alice.id, UpdateUserParams(email='alice@example.org', is_verified=True))
+        await user_repository.add_role(admin_role, [alice.id, bob.id])
+        await user_repository.delete(carol.id)
+        expected = dict(user_repository.data)
+
+        assert reloaded(user_repository, tmp_path) == expected
+        assert user_repository.next_id == carol.id + 1
+        assert (await user_repository.get_by_username_or_email(None, 'alice@example.org')).roles == (admin_role,)
+        assert await user_repository.get_by_username_or_email('carol', None) is None
+        dave = await user_repository.create(User(username='dave', email='dave@example.com', password_hash='x'))
+        assert dave.id == carol.id + 1
+
+    @pytest.mark.asyncio
+    async def test_snapshot_and_log_tail(self, user_repository: InMemoryUserRepository, tmp_path: Path):
+        user_repository.persist(tmp_path, snapshot_every=7)
+        for i in range(10):
+            await user_repository.create(User(username=f'user-{i}', email=f'user-{i}@example.com', password_hash='x'))
+        expected = dict(user_repository.data)
+
+        # each create logs the user and the ID counter, so the last 3 creates are only in the log
+        snapshot_size = (tmp_path / 'users.snapshot').stat().st_size
+        assert (tmp_path / 'users.log').stat().st_size > 0
+        assert reloaded(user_repository, tmp_path) == expected
+
+        user_repository.save_snapshot()
+        assert (tmp_path / 'users.snapshot').stat().st_size > snapshot_size
+        assert reloaded(user_repository, tmp_path) == expected
+        assert user_repository.next_id == 11
+
+    @pytest.mark.asyncio
+    async def test_periodic_snapshots_are_written_in_the_background(
+        self, user_repository: InMemoryUserRepository, tmp_path: Path
+    ):
+        user_repository.persist(tmp_path, snapshot_every=7, fsync=True)
+        encode_rows = _UserCodec.encode_rows
+        encoding_threads = []
+
+        def recording_encode_rows(codec, users):
+            encoding_threads.append(threading.current_thread())
+            return encode_rows(codec, users)
+
+        with patch.object(_UserCodec, 'encode_rows', recording_encode_rows):
+            for i in range(4):
+                await user_repository.create(User(username=f'u{i}', email=f'u{i}@example.com', password_hash='x'))
+            expected = dict(user_repository.data)
+            assert reloaded(user_repository, tmp_path) == expected
+
+        # the snapshot taken once the 7th record was logged, which the reload found complete
+        assert len(encoding_threads) == 1
+        assert encoding_threads[0] is not threading.current_thread()
+        assert not (tmp_path / 'users.log.1').exists()
+
+    @pytest.mark.asyncio
+    async def test_log_hand_off_while_syncing(self, user_repository: InMemoryUserRepository, tmp_path: Path):
+        user_repository.persist(tmp_path, snapshot_every=1, fsync=True)
+        replace = os.replace
+
+        def slow_replace(source, destination):
+            # leaves the background thread, woken by the flush just before, time to sync the log being handed off
+            time.sleep(0.01)
+            replace(source, destination)
+
+        with patch.object(os, 'replace', slow_replace):
+            for i in range(5):
+                await user_repository.create(User(username=f'u{i}', email=f'u{i}@example.com', password_hash='x'))
+        expected = dict(user_repository.data)
+
+        assert user_repository._store._worker.is_alive()
+        saving = threading.Thread(target=user_repository.save_snapshot, daemon=True)
+        saving.start()
+        saving.join(timeout=10)
+        assert not saving.is_alive()
+        assert reloaded(user_repository, tmp_path) == expected
+
+    @pytest.mark.asyncio
+    async def test_interrupted_periodic_snapshot(self, user_repository: InMemoryUserRepository, tmp_path: Path):
+        user_repository.persist(tmp_path, snapshot_every=3)
+        with patch.object(_UserCodec, 'encode_rows', side_effect=OSError('disk full')):
+            for i in range(4):
+                await user_repository.create(User(username=f'u{i}', email=f'u{i}@example.com', password_hash='x'))
+            expected = dict(user_repository.data)
+            user_repository.close()
+
+        # the log handed off to the failed snapshot is kept, and replayed before the current one
+        assert (tmp_path / 'users.log.1').exists()
+        assert reloaded(user_repository, tmp_path) == expected
+        assert not (tmp_path / 'users.log.1').exists()
+        assert user_repository.next_id == 5
+
+    @pytest.mark.asyncio
+    async def test_torn_log_record_is_dropped(self, user_repository: InMemoryUserRepository, tmp_path: Path):
+        user_repository.persist(tmp_path)
+        log_path = tmp_path / 'users.log'
+        await user_repository.create(User(username='kept', email='kept@example.com', password_hash='x'))
+        kept_size = log_path.stat().st_size
+        await user_repository.create(User(username='torn', email='torn@example.com', password_hash='x'))
+        user_repository.close()
+
+        # cut through the records of the second create
+        log_path.write_bytes(log_path.read_bytes()[: kept_size + 10])
+
+        assert [user.username for user in reloaded(user_repository, tmp_path).values()] == ['kept']
+        # writes continue after the last intact record
+        await user_repository.create(User(username='torn', email='torn@example.com', password_hash='x'))
+        assert [user.username for user in reloaded(user_repository, tmp_path).values()] == ['kept', 'torn']
+
+    @pytest.mark.asyncio
+    async def test_direct_data_writes_are_persisted(self, user_repository: InMemoryUserRepository, tmp_path: Path):
+        user_repository.persist(tmp_path)
+        users = {IDType(i): User(username=f'u{i}', email=f'u{i}@example.com', password_hash='x', id=i) for i in (1, 2)}
+        user_repository.data = users
+        del user_repository.data[IDType(1)]
+
+        assert reloaded(user_repository, tmp_path) == {IDType(2): users[IDType(2)]}
+
+    def test_corrupt_snapshot_is_rejected(self, user_repository: InMemoryUserRepository, tmp_path: Path):
+        user_repository.persist(tmp_path)
+        user_repository.save_snapshot()
+        user_repository.reset()
+
+        snapshot_path = tmp_path / 'users.snapshot'
+        data = bytearray(snapshot_path.read_bytes())
+        data[-1] ^= 0xFF
+        snapshot_path.write_bytes(bytes(data))
+
+        with pytest.raises(StoreFormatError):
+            user_repository.persist(tmp_path)
+
+    @pytest.mark.asyncio
+    async def test_roles_survive_restart(self, tmp_path: Path):
+        repo = InMemoryRoleRepository()
+        repo.reset()
+        try:
+            repo.persist(tmp_path)
+            repo.data[IDType(2)] = Role(id=IDType(2), key='admin', name='Admin')
+            expected = dict(repo.data)
+
+            repo.reset()
+            repo.persist(tmp_path)
+            assert dict(repo.data) == expected
+            assert (await repo.get_by_key('admin')).id == IDType(2)
+        finally:
+            repo.reset()
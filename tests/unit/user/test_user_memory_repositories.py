@@ -1,7 +1,8 @@
 import pytest
 
 from core.constant.user import DEFAULT_ROLE_KEY
-from core.model.user import User
+from core.error import DuplicateError, NotFoundError
+from core.model.user import Role, UpdateUserParams, User, UserSummary, intern_role
 from core.type import IDType
 from repository.memory.role import InMemoryRoleRepository
 from repository.memory.user import InMemoryUserRepository
@@ -38,17 +39,14 @@ class TestMemoryRepositories:
         assert user_by_email is not None
         assert user_by_email.email == 'test_memory@example.com'
 
-        updated_user = User(
-            id=created_user.id,
-            username='updated_memory_user',
-            email='updated_memory@example.com',
-            password_hash='hashed_password',
-            is_verified=True,
-            roles=[],
+        result = await repo.update(
+            created_user.id,
+            UpdateUserParams(username='updated_memory_user', email='updated_memory@example.com', is_verified=True),
         )
-        result = await repo.update(updated_user)
         assert result.username == 'updated_memory_user'
         assert result.email == 'updated_memory@example.com'
+        assert result.is_verified
+        assert result.password_hash == 'hashed_password'
 
         await repo.delete(created_user.id)
         deleted_user = await repo.get_by_id(created_user.id)
@@ -65,6 +63,91 @@ class TestMemoryRepositories:
         result = await repo.get_by_username_or_email('nonexistent', 'nonexistent@example.com')
         assert result is None
 
+        with pytest.raises(NotFoundError):
+            await repo.update(IDType(999), UpdateUserParams(username='nonexistent'))
+
+        await repo.create(User(username='taken', email='taken@example.com', password_hash='hashed'))
+        other_user = await repo.create(User(username='other', email='other@example.com', password_hash='hashed'))
+
+        with pytest.raises(DuplicateError) as exc_info:
+            await repo.create(User(username='taken', email='new@example.com', password_hash='hashed'))
+        assert exc_info.value.field == 'username'
+
+        with pytest.raises(DuplicateError) as exc_info:
+            await repo.update(other_user.id, UpdateUserParams(email='taken@example.com'))
+        assert exc_info.value.field == 'email'
+
+    @pytest.mark.asyncio
+    async def test_memory_user_repository_pagination(self):
+        repo = InMemoryUserRepository()
+        repo.reset()
+
+        for i in range(5):
+            await repo.create(User(username=f'user_{i}', email=f'user_{i}@example.com', password_hash='hashed'))
+
+        first_page = await repo.get_all(limit=2)
+        assert [u.username for u in first_page] == ['user_0', 'user_1']
+
+        second_page = await repo.get_all(after_id=first_page[-1].id, limit=2)
+        assert [u.username for u in second_page] == ['user_2', 'user_3']
+
+        last_page = await repo.get_all(after_id=second_page[-1].id, limit=2)
+        assert [u.username for u in last_page] == ['user_4']
+
+        assert await repo.get_all(after_id=last_page[-1].id, limit=2) == []
+
+        streamed = [user async for user in repo.stream_all(batch_size=2)]
+        assert [u.username for u in streamed] == [f'user_{i}' for i in range(5)]
+
+        summaries = await repo.get_all_summaries(after_id=first_page[-1].id, limit=2)
+        assert summaries == [UserSummary.from_user(user) for user in second_page]
+        assert summaries[0] == (second_page[0].id, 'user_2', 'user_2@example.com', False)
+
+    @pytest.mark.asyncio
+    async def test_memory_user_repository_pagination_after_writes(self):
+        repo = InMemoryUserRepository()
+        repo.reset()
+        users = [
+            await repo.create(User(username=f'user_{i}', email=f'user_{i}@example.com', password_hash='hashed'))
+            for i in range(10)
+        ]
+        # enough deletes for the removed IDs to be dropped from the sorted keys, then one put back
+        for user in users[1:7]:
+            await repo.delete(user.id)
+        repo.data[users[3].id] = users[3]
+        repo.data[IDType(100)] = User(username='user_100', email='user_100@example.com', password_hash='x', id=100)
+        repo.data[IDType(50)] = User(username='user_50', email='user_50@example.com', password_hash='x', id=50)
+        expected = sorted(repo.data.values(), key=lambda user: user.id)
+
+        pages = []
+        after_id = None
+        while page := await repo.get_all(after_id=after_id, limit=2):
+            pages.append(page)
+            after_id = page[-1].id
+
+        assert [user for page in pages for user in page] == expected
+        assert [user.id for user in await repo.get_all(after_id=IDType(4), limit=3)] == [8, 9, 10]
+        assert await repo.get_all(after_id=IDType(100)) == []
+
+    @pytest.mark.asyncio
+    async def test_memory_user_repository_bulk_writes(self):
+        repo = InMemoryUserRepository()
+        repo.reset()
+        users = [
+            await repo.create(User(username=f'user{i}', email=f'user{i}@example.com', password_hash='hashed'))
+            for i in range(3)
+        ]
+        ids = [user.id for user in users]
+
+        # roles are interned like the ones users are loaded with, an equal role is stored as the shared instance
+        role = intern_role(Role(id=IDType(2), key='admin', name='Admin'))
+        assert await repo.add_role(Role(id=IDType(2), key='admin', name='Admin'), [ids[0], ids[0], IDType(999)]) == 1
+        assert (await repo.get_by_id(ids[0])).roles[0] is role
+        assert await repo.add_role(role, ids) == 2
+
+        assert await repo.delete_many([ids[0], ids[0], ids[1], IDType(999)]) == 2
+        assert [user.id for user in await repo.get_all()] == [ids[2]]
+
     @pytest.mark.asyncio
     async def test_memory_role_repository(self):
         repo = InMemoryRoleRepository()
@@ -86,3 +169,47 @@ class TestMemoryRepositories:
 
         non_existent_roles_by_id = await repo.get_by_ids([IDType(999)])
         assert len(non_existent_roles_by_id) == 0
+
+    @pytest.mark.asyncio
+    async def test_memory_user_repository_indexes(self):
+        repo = InMemoryUserRepository()
+        repo.reset()
+
+        user = await repo.create(User(username='before', email='before@example.com', password_hash='hashed'))
+        await repo.update(user.id, UpdateUserParams(username='after'))
+
+        assert await repo.get_by_username_or_email('before', None) is None
+        assert (await repo.get_by_username_or_email('after', None)).id == user.id
+        assert (await repo.get_by_username_or_email(None, 'before@example.com')).id == user.id
+
+        # the old username is free again, the new one is taken
+        await repo.create(User(username='before', email='reuse@example.com', password_hash='hashed'))
+        with pytest.raises(DuplicateError):
+            await repo.create(User(username='after', email='new@example.com', password_hash='hashed'))
+
+        await repo.delete(user.id)
+        assert await repo.get_by_username_or_email('after', 'before@example.com') is None
+
+        # the data can still be replaced or edited directly, the indexes follow
+        repo.data = {user.id: user}
+        assert (await repo.get_by_username_or_email('before', None)).id == user.id
+        repo.data.clear()
+        assert await repo.get_by_username_or_email('before', None) is None
+
+    @pytest.mark.asyncio
+    async def test_memory_role_repository_indexes(self):
+        repo = InMemoryRoleRepository()
+        repo.reset()
+
+        repo.data[IDType(3)] = Role(id=IDType(3), key='editor', name='Editor')
+        repo.data[IDType(2)] = Role(id=IDType(2), key='admin', name='Admin')
+
+        assert [role.key for role in await repo.get_by_ids([IDType(3), IDType(2), IDType(3), IDType(1)])] == [
+            DEFAULT_ROLE_KEY,
+            'admin',
+            'editor',
+        ]
+
+        repo.data[IDType(2)] = Role(id=IDType(2), key='administrator', name='Admin')
+        assert await repo.get_by_key('admin') is None
+        assert (await repo.get_by_key('administrator')).id == IDType(2)
@@ -0,0 +1,46 @@
+import gc
+
+from core.model import user as user_model
+from core.model.user import Role, UpdateUserParams, User, intern_role
+
+
+class TestUserModel:
+    def test_roles_are_stored_as_tuples(self):
+        role = Role(key='admin', name='Admin', id=1)
+
+        user = User(username='alice', email='alice@example.com', password_hash='x', roles=[role])
+        params = UpdateUserParams(roles=[role])
+
+        assert user.roles == (role,)
+        assert params.roles == (role,)
+        assert UpdateUserParams().roles is None
+
+    def test_changes(self):
+        role = Role(key='admin', name='Admin', id=1)
+        user = User(username='alice', email='alice@example.com', password_hash='x', roles=(role,), id=1)
+        params = UpdateUserParams(username='alice', email='bob@example.com', is_verified=False, roles=(role,))
+
+        assert params.changes() == {
+            'username': 'alice',
+            'email': 'bob@example.com',
+            'is_verified': False,
+            'roles': (role,),
+        }
+        # is_verified is False on the user too, only what differs is left
+        assert params.changes(user) == {'email': 'bob@example.com'}
+        assert UpdateUserParams().changes(user) == {}
+
+    def test_intern_role_shares_equal_roles(self):
+        role = intern_role(Role(key='interned', name='Interned', id=1001))
+
+        assert intern_role(Role(key='interned', name='Interned', id=1001)) is role
+        assert intern_role(Role(key='interned', name='Renamed', id=1001)) is not role
+
+    def test_interned_roles_are_freed_once_unreferenced(self):
+        roles = [intern_role(Role(key=f'pooled-{i}', name=f'Pooled {i}', id=2000 + i)) for i in range(1000)]
+        assert sum(key[1].startswith('pooled-') for key in user_model._role_pool) == 1000
+
+        del roles
+        gc.collect()
+
+        assert not any(key[1].startswith('pooled-') for key in user_model._role_pool)
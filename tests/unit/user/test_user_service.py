@@ -6,6 +6,8 @@ from core.constant.user import DEFAULT_ROLE_KEY
 from core.error import DuplicateError, NotFoundError
 from core.model.user import CreateUserPayload, Role, UpdateUserPayload, User
 from core.type import IDType
+from core.utility.hasher import AsyncPasswordHasher
+from core.utility.user import Pbkdf2Sha256Backend, ScryptBackend
 from repository.memory.role import InMemoryRoleRepository
 from repository.memory.user import InMemoryUserRepository
 from service.user import UserService
@@ -345,6 +347,46 @@ class TestUserService:
 
         assert f'User with ID {non_existent_id} not found' in str(exc_info.value)
 
+    @pytest.mark.asyncio
+    async def test_delete_users(
+        self,
+        user_repository: InMemoryUserRepository,
+        role_repository: InMemoryRoleRepository,
+    ):
+        user_service = UserService(user_repository, role_repository)
+        user1 = await insert_user_1(user_service)
+        user2 = await insert_user_2(user_service)
+        user3 = await insert_user_3(user_service)
+
+        assert await user_service.delete_users([user1.id, user3.id, IDType(999)]) == 2
+
+        users = await user_service.get_all_users()
+        assert [user.id for user in users] == [user2.id]
+
+    @pytest.mark.asyncio
+    async def test_add_role_to_users(
+        self,
+        user_repository: InMemoryUserRepository,
+        role_repository: InMemoryRoleRepository,
+        admin_role: Role,
+    ):
+        role_repository.data[admin_role.id] = admin_role
+
+        user_service = UserService(user_repository, role_repository)
+        user1 = await insert_user_1(user_service)
+        user2 = await insert_user_2(user_service)
+
+        assert await user_service.add_role_to_users(admin_role.id, [user1.id, IDType(999)]) == 1
+        assert await user_service.add_role_to_users(admin_role.id, [user1.id, user2.id]) == 1
+
+        for user in await user_service.get_all_users():
+            assert [role.key for role in user.roles] == [DEFAULT_ROLE_KEY, 'admin']
+
+        with pytest.raises(NotFoundError) as exc_info:
+            await user_service.add_role_to_users(IDType(999), [user1.id])
+
+        assert 'Role with ID 999 not found' in str(exc_info.value)
+
     @pytest.mark.asyncio
     async def test_update_user_password(
         self,
@@ -396,6 +438,59 @@ class TestUserService:
         assert updated_user.email == user1.email
         assert updated_user.roles == user1.roles
 
+    @pytest.mark.asyncio
+    async def test_verify_user_password_rehashes_outdated_hash(
+        self,
+        user_repository: InMemoryUserRepository,
+        role_repository: InMemoryRoleRepository,
+    ):
+        old_hasher = AsyncPasswordHasher(backend=Pbkdf2Sha256Backend(iterations=1000))
+        new_hasher = AsyncPasswordHasher(backend=ScryptBackend(n=2**10))
+
+        user1 = await insert_user_1(UserService(user_repository, role_repository, old_hasher))
+        user_service = UserService(user_repository, role_repository, new_hasher)
+
+        assert not await user_service.verify_user_password(user1, 'wrong_password')
+        assert await user_service.get_user_by_id(user1.id) == user1
+
+        assert await user_service.verify_user_password(user1, 'password')
+        rehashed_user = await user_service.get_user_by_id(user1.id)
+        assert rehashed_user is not None
+        assert rehashed_user.password_hash != user1.password_hash
+        assert rehashed_user.password_hash.startswith('$scrypt$n=1024,')
+        assert await user_service.verify_user_password(rehashed_user, 'password')
+
+    @pytest.mark.asyncio
+    async def test_create_users_reports_duplicates(
+        self,
+        user_repository: InMemoryUserRepository,
+        role_repository: InMemoryRoleRepository,
+    ):
+        user_service = UserService(user_repository, role_repository)
+        user1 = await insert_user_1(user_service)
+
+        result = await user_service.create_users(
+            [
+                CreateUserPayload(username=TEST_USER_2_NAME, email='test2@test.com', password='password'),
+                CreateUserPayload(username=TEST_USER_1_NAME, email='other@test.com', password='password'),
+                CreateUserPayload(username=TEST_USER_3_NAME, email='test2@test.com', password='password'),
+                CreateUserPayload(username=TEST_USER_4_NAME, email='test4@test.com', password='password'),
+            ]
+        )
+
+        assert [user.username for user in result.created] == [TEST_USER_2_NAME, TEST_USER_4_NAME]
+        assert all(user.roles[0].key == DEFAULT_ROLE_KEY for user in result.created)
+        assert [(failure.index, failure.username) for failure in result.failed] == [
+            (1, TEST_USER_1_NAME),
+            (2, TEST_USER_3_NAME),
+        ]
+        assert 'username' in result.failed[0].message
+        assert 'email' in result.failed[1].message
+
+        users = await user_service.get_all_users()
+        assert [user.id for user in users] == [user1.id, *(user.id for user in result.created)]
+        assert await user_service.verify_user_password(result.created[0], 'password')
+
     @pytest.mark.asyncio
     async def test_create_user_repository_exception(
         self,
@@ -1,6 +1,22 @@
+import asyncio
+import hashlib
+import threading
+from unittest.mock import patch
+
 import pytest
 
-from core.utility.user import hash_password, verify_password
+from core.enum.password import PasswordHashAlgorithm
+from core.utility.hasher import AsyncPasswordHasher
+from core.utility.user import (
+    PasswordCheck,
+    PasswordHashBackend,
+    Pbkdf2Sha256Backend,
+    ScryptBackend,
+    check_password,
+    get_password_hash_backend,
+    hash_password,
+    verify_password,
+)
 
 
 class TestUserUtility:
@@ -48,3 +64,108 @@ class TestUserUtility:
 
         assert verify_password(password, hashed)
         assert not verify_password(password + 'modified', hashed)
+
+    def test_hash_format_is_versioned(self):
+        hashed = hash_password('test_password', ScryptBackend(n=2**10, r=8, p=1))
+
+        _, algorithm, params, salt, digest = hashed.split('$')
+        assert algorithm == PasswordHashAlgorithm.SCRYPT
+        assert params == 'n=1024,r=8,p=1'
+        assert salt and digest
+
+    @pytest.mark.parametrize(
+        'backend',
+        [ScryptBackend(n=2**10), Pbkdf2Sha256Backend(iterations=1000)],
+    )
+    def test_hash_and_verify_with_backends(self, backend: PasswordHashBackend):
+        hashed = hash_password('test_password', backend)
+
+        assert check_password('test_password', hashed, backend) == PasswordCheck(is_valid=True, needs_rehash=False)
+        assert check_password('wrong_password', hashed, backend) == PasswordCheck(is_valid=False)
+
+    def test_check_password_reports_outdated_parameters(self):
+        old_backend = Pbkdf2Sha256Backend(iterations=1000)
+        new_backend = ScryptBackend(n=2**10)
+        hashed = hash_password('test_password', old_backend)
+
+        assert check_password('test_password', hashed, new_backend) == PasswordCheck(is_valid=True, needs_rehash=True)
+        assert check_password('test_password', hashed, Pbkdf2Sha256Backend(iterations=2000)).needs_rehash
+        assert not check_password('wrong_password', hashed, new_backend).needs_rehash
+
+    def test_check_password_accepts_legacy_hashes(self):
+        salt = '0011223344556677'
+        legacy_hash = salt + hashlib.sha256(('test_password' + salt).encode('utf-8')).hexdigest()
+
+        assert check_password('test_password', legacy_hash) == PasswordCheck(is_valid=True, needs_rehash=True)
+        assert not verify_password('wrong_password', legacy_hash)
+
+    @pytest.mark.parametrize('hashed_password', ['', 'garbage', '$scrypt$n=1024$abc', '$unknown$i=1$abc$def'])
+    def test_verify_password_with_malformed_hash(self, hashed_password: str):
+        assert not verify_password('test_password', hashed_password)
+
+    def test_get_password_hash_backend(self):
+        assert get_password_hash_backend(PasswordHashAlgorithm.SCRYPT, n=2**15) == ScryptBackend(n=2**15)
+        assert get_password_hash_backend(PasswordHashAlgorithm.PBKDF2_SHA256, iterations=10) == Pbkdf2Sha256Backend(10)
+
+
+class TestAsyncPasswordHasher:
+    @pytest.mark.asyncio
+    async def test_hash_and_verify(self):
+        hasher = AsyncPasswordHasher(max_concurrency=2)
+
+        hashed = await hasher.hash('test_password')
+
+        assert await hasher.verify('test_password', hashed)
+        assert not await hasher.verify('wrong_password', hashed)
+        hasher.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit_and_queue_depth(self):
+        hasher = AsyncPasswordHasher(max_workers=4, max_concurrency=1)
+        release = threading.Event()
+        observed: list[tuple[int, int]] = []
+
+        def blocking_hash(password: str, backend: PasswordHashBackend | None = None) -> str:
+            release.wait(timeout=5)
+            return password
+
+        with patch('core.utility.hasher.hash_password', blocking_hash):
+            tasks = [asyncio.create_task(hasher.hash(f'password_{i}')) for i in range(3)]
+            while hasher.in_flight == 0:
+                await asyncio.sleep(0)
+            observed.append((hasher.in_flight, hasher.queue_depth))
+            release.set()
+            results = await asyncio.gather(*tasks)
+
+        assert observed == [(1, 2)]
+        assert results == ['password_0', 'password_1', 'password_2']
+        assert hasher.in_flight == 0
+        assert hasher.queue_depth == 0
+        hasher.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_hash_many_keeps_order_and_bounds_the_calls_in_progress(self):
+        hasher = AsyncPasswordHasher(max_workers=4, max_concurrency=3)
+        in_progress = 0
+        most_in_progress = 0
+        hash_ = hasher.hash
+
+        async def counting_hash(password: str) -> str:
+            nonlocal in_progress, most_in_progress
+            in_progress += 1
+            most_in_progress = max(most_in_progress, in_progress)
+            try:
+                return await hash_(password)
+            finally:
+                in_progress -= 1
+
+        with (
+            patch('core.utility.hasher.hash_password', lambda password, backend=None: password.upper()),
+            patch.object(hasher, 'hash', counting_hash),
+        ):
+            hashes = await hasher.hash_many([f'password_{i}' for i in range(50)])
+
+        assert hashes == [f'PASSWORD_{i}' for i in range(50)]
+        # calls waiting on the concurrency limit would count too
+        assert most_in_progress == 3
+        hasher.shutdown()
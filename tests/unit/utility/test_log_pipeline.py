@@ -0,0 +1,172 @@
+import importlib.util
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from api.http.request_id import RequestIdMiddleware
+from utility.log import (
+    BatchingQueueListener,
+    BatchRotatingFileHandler,
+    BoundedQueueHandler,
+    JsonFormatter,
+    request_id,
+)
+
+# logs once outside of a request and once while handling one, through the pipeline set up by init_logger
+LOG_INSIDE_AND_OUTSIDE_A_REQUEST = """
+import logging
+from config.logger import init_logger
+from utility.log import request_id
+init_logger()
+logging.info('outside')
+request_id.set('request-3')
+logging.info('inside')
+"""
+
+
+class BatchRecorder(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.batches: list[list[str]] = []
+
+    def emit_batch(self, records: list[logging.LogRecord]) -> None:
+        self.batches.append([record.getMessage() for record in records])
+
+
+def _logger(handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(f'test_log_pipeline.{id(handler)}')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+    return logger
+
+
+class TestLogPipeline:
+    def test_records_are_dropped_when_the_queue_is_full_and_reported(self):
+        log_queue: queue.Queue = queue.Queue(maxsize=10)
+        queue_handler = BoundedQueueHandler(log_queue)
+        logger = _logger(queue_handler)
+        recorder = BatchRecorder()
+        listener = BatchingQueueListener(log_queue, recorder, batch_size=4, dropped=lambda: queue_handler.dropped)
+
+        token = request_id.set('request-1')
+        try:
+            for i in range(15):
+                logger.info('record %d', i)
+        finally:
+            request_id.reset(token)
+        assert queue_handler.dropped == 5
+
+        listener.start()
+        listener.stop()
+        listener.stop()  # already stopped
+
+        messages = [message for batch in recorder.batches for message in batch]
+        report = '5 log record(s) dropped, the log queue was full'
+        assert [message for message in messages if message != report] == [f'record {i}' for i in range(10)]
+        # the drop is reported with the first batch written after it
+        assert [len(batch) for batch in recorder.batches] == [5, 4, 2]
+        assert recorder.batches[0][-1] == report
+
+    def test_records_are_prepared_on_the_calling_thread(self):
+        log_queue: queue.Queue = queue.Queue()
+        logger = _logger(BoundedQueueHandler(log_queue))
+        arguments = ['before']
+
+        token = request_id.set('request-2')
+        try:
+            logger.error('arguments: %s', arguments)
+            try:
+                raise ValueError('boom')
+            except ValueError:
+                logger.exception('failed')
+        finally:
+            request_id.reset(token)
+        arguments.append('after')
+
+        logged, failed = log_queue.get_nowait(), log_queue.get_nowait()
+        assert (logged.getMessage(), logged.request_id) == ("arguments: ['before']", 'request-2')
+        assert failed.exc_info is None
+        assert 'ValueError: boom' in failed.exc_text
+
+        entry = json.loads(JsonFormatter().format(failed))
+        assert entry['level'] == 'ERROR'
+        assert entry['message'] == 'failed'
+        assert entry['request_id'] == 'request-2'
+        assert entry['exception'].endswith('ValueError: boom')
+
+    def test_file_rotation(self, tmp_path: Path):
+        path = tmp_path / 'app.log'
+        handler = BatchRotatingFileHandler(str(path), max_bytes=100, interval=3600, backup_count=2)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+
+        def write(*messages: str) -> None:
+            handler.emit_batch([logging.makeLogRecord({'msg': message}) for message in messages])
+
+        write('a' * 60)
+        write('b' * 30)
+        write('c' * 30)  # would be 123 bytes
+        assert (tmp_path / 'app.log.1').read_text() == 'a' * 60 + '\n' + 'b' * 30 + '\n'
+
+        handler.rollover_at = time.time()  # the interval elapsed
+        write('d')
+        handler.close()
+
+        assert (tmp_path / 'app.log.2').exists()
+        assert (tmp_path / 'app.log.1').read_text() == 'c' * 30 + '\n'
+        assert path.read_text() == 'd\n'
+
+    @pytest.mark.parametrize(
+        'development',
+        [
+            'false',
+            pytest.param(
+                'true',
+                marks=pytest.mark.skipif(importlib.util.find_spec('colorlog') is None, reason='colorlog not installed'),
+            ),
+        ],
+    )
+    def test_plain_lines_show_the_request_id(self, development: str, tmp_path: Path):
+        log_file = tmp_path / 'app.log'
+        console = subprocess.run(
+            [sys.executable, '-c', LOG_INSIDE_AND_OUTSIDE_A_REQUEST],
+            env={**os.environ, 'IS_DEVELOPMENT': development, 'LOG_FORMAT': 'plain', 'LOG_FILE': str(log_file)},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stderr
+
+        for output in (console, log_file.read_text()):
+            outside, inside = output.splitlines()
+            assert '[-] outside' in outside
+            assert '[request-3] inside' in inside
+
+
+class TestRequestIdMiddleware:
+    @pytest.mark.asyncio
+    async def test_request_ids(self):
+        app = FastAPI()
+
+        @app.get('/')
+        async def endpoint():
+            return {'request_id': request_id.get()}
+
+        transport = httpx.ASGITransport(RequestIdMiddleware(app))
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            given = await client.get('/', headers={'X-Request-ID': 'abc-123'})
+            invalid = await client.get('/', headers={'X-Request-ID': 'no spaces, please'})
+            generated = await client.get('/')
+
+        assert given.headers['x-request-id'] == given.json()['request_id'] == 'abc-123'
+        assert invalid.headers['x-request-id'] == invalid.json()['request_id'] != 'no spaces, please'
+        assert len(generated.json()['request_id']) == 32
+        assert request_id.get() is None